@@ -0,0 +1,280 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query
+from fastapi.routing import APIRoute
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from app.auth import (
+    Actor,
+    can_access_async,
+    current_actor,
+    require_project_async,
+    visible_project_ids_async,
+)
+from app.bulk import BULK_INSERT_CHUNK_SIZE, UPSERT_KEY, BulkUpdateError, insert_rows, update_rows, upsert_key, upsert_rows
+from app.changes import project_saved, rows_committed, snapshot
+from app.deps import get_async_db, get_async_read_db
+from app.httpcache import (
+    PROJECT_JSON,
+    PROJECTS_JSON,
+    PROJECTS_SCOPE,
+    cached_response_async,
+    json_body,
+    project_version_query,
+    projects_version_query,
+    rows_body,
+)
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, row_fields, rows_page_values
+from app import models, schemas
+
+# Async versions of the project/row endpoints in app/main.py, used when
+# DB_ASYNC=1. Same paths, payloads and responses; shared sync helpers
+# (rows_page_values, insert_rows) run through AsyncSession.run_sync, and post-commit
+# hooks (which write through the sync engine) run in the threadpool: the
+# bulk helpers hand theirs back through `deferred` instead of running them.
+# Actor resolution is the shared (cached) sync dependency from app/auth.py.
+router = APIRouter()
+
+
+async def _get_project(db: AsyncSession, project_id: str) -> models.Project:
+    p = await db.get(models.Project, project_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return p
+
+
+async def _run_deferred(project_id: str, deferred: list) -> None:
+    # rows_committed for what the bulk helpers committed, off the event loop
+    for rows, before in deferred:
+        await run_in_threadpool(rows_committed, project_id, rows, before)
+
+
+async def _project_version(db: AsyncSession, project_id: str) -> tuple[str, object]:
+    row = (await db.execute(project_version_query(project_id))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return str(row[0]), row[1]
+
+
+# -----------------------------
+# Projects
+# -----------------------------
+@router.post("/projects", response_model=schemas.ProjectOut)
+async def create_project(
+    payload: schemas.ProjectCreate,
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_db),
+):
+    p = models.Project(
+        name=payload.name,
+        client_name=payload.client_name,
+        jurisdiction=payload.jurisdiction,
+        created_by=actor.id,
+    )
+    db.add(p)
+    await db.flush()
+    # The creator owns the project
+    db.add(models.ProjectMember(project_id=p.id, user_id=actor.id, role="owner"))
+    await db.commit()
+    await run_in_threadpool(project_saved, p.id)
+    await db.refresh(p)
+    return p
+
+@router.get("/projects", response_model=list[schemas.ProjectOut])
+async def list_projects(
+    request: Request,
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    project_ids = await visible_project_ids_async(db, actor)
+    count, total, updated_at = (await db.execute(projects_version_query(project_ids))).one()
+    viewer = "all" if project_ids is None else actor.id
+
+    async def render():
+        stmt = select(models.Project).order_by(models.Project.updated_at.desc())
+        if project_ids is not None:
+            stmt = stmt.where(models.Project.id.in_(project_ids))
+        return json_body(PROJECTS_JSON, (await db.execute(stmt)).scalars().all())
+
+    return await cached_response_async(request, PROJECTS_SCOPE, f"{viewer}.{count}.{total}", updated_at, render)
+
+@router.get("/projects/{project_id}", response_model=schemas.ProjectOut)
+async def get_project(
+    project_id: str,
+    request: Request,
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    await require_project_async(db, actor, project_id)
+    version, updated_at = await _project_version(db, project_id)
+
+    async def render():
+        return json_body(PROJECT_JSON, await _get_project(db, project_id))
+
+    return await cached_response_async(request, project_id, version, updated_at, render)
+
+# -----------------------------
+# Run sheet rows
+# -----------------------------
+@router.get("/projects/{project_id}/rows", response_model=list[schemas.RunSheetRowOut])
+async def list_rows(
+    project_id: str,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Return rows after this sort_key cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated row fields to return (default: all)"),
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    await require_project_async(db, actor, project_id)
+    try:
+        columns = row_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    version, updated_at = await _project_version(db, project_id)
+
+    async def render():
+        rows, next_after = await db.run_sync(rows_page_values, project_id, limit, after, columns)
+        headers = {"X-Next-After": next_after} if next_after is not None else None
+        return rows_body(rows, headers)
+
+    return await cached_response_async(request, project_id, version, updated_at, render)
+
+@router.post("/projects/{project_id}/rows/bulk", response_model=schemas.BulkRowsResult)
+async def bulk_create_rows(
+    project_id: str,
+    payload: schemas.BulkRowsCreate,
+    chunk_size: int = Query(BULK_INSERT_CHUNK_SIZE, ge=1, le=10000),
+    skip_duplicates: bool = Query(False, description="Leave out rows that duplicate a row already in the project"),
+    upsert: bool = Query(False, description="Update live rows with the same natural key instead of adding new ones"),
+    key: Optional[str] = Query(None, description="Natural key columns for upsert, comma-separated (default UPSERT_KEY)"),
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await require_project_async(db, actor, project_id, "editor")
+    await _get_project(db, project_id)
+
+    rows = [r.model_dump() for r in payload.rows]
+    deferred: list = []
+    if upsert:
+        try:
+            columns = upsert_key(key.split(",")) if key else UPSERT_KEY
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            created, updated, unchanged, failed = await db.run_sync(
+                lambda s: upsert_rows(
+                    s, project_id, rows, actor.id,
+                    key=columns, chunk_size=chunk_size, skip_duplicates=skip_duplicates, deferred=deferred,
+                )
+            )
+        finally:
+            await _run_deferred(project_id, deferred)
+        return {"created": created, "updated": updated, "unchanged": unchanged, "failed": failed}
+
+    try:
+        created, failed = await db.run_sync(
+            lambda s: insert_rows(
+                s, project_id, rows, actor.id, chunk_size=chunk_size, skip_duplicates=skip_duplicates, deferred=deferred
+            )
+        )
+    finally:
+        # Chunks committed before an error still count
+        await _run_deferred(project_id, deferred)
+    return {"created": created, "failed": failed}
+
+@router.patch("/projects/{project_id}/rows", response_model=schemas.BulkRowsPatchResult)
+async def patch_rows(
+    project_id: str,
+    payload: schemas.BulkRowsPatch,
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_db),
+):
+    await require_project_async(db, actor, project_id, "editor")
+    await _get_project(db, project_id)
+
+    changes = [c.model_dump(exclude_unset=True) for c in payload.changes]
+    deferred: list = []
+    try:
+        updated, unchanged, conflicts = await db.run_sync(
+            lambda s: update_rows(s, project_id, changes, actor.id, deferred=deferred)
+        )
+    except BulkUpdateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await _run_deferred(project_id, deferred)
+    return {"updated": updated, "unchanged": unchanged, "conflicts": conflicts}
+
+@router.patch("/rows/{row_id}", response_model=schemas.RunSheetRowOut)
+async def patch_row(
+    row_id: str,
+    payload: schemas.RunSheetRowPatch,
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_db),
+):
+    row = await db.get(models.RunSheetRow, row_id)
+    if not row or not await can_access_async(db, actor, row.project_id):
+        raise HTTPException(status_code=404, detail="Row not found")
+    await require_project_async(db, actor, row.project_id, "editor")
+
+    before = snapshot([row])
+    data = payload.model_dump(exclude_unset=True)
+    for k, v in data.items():
+        setattr(row, k, v)
+
+    row.updated_by = actor.id
+
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
+
+    await db.refresh(row)
+    await run_in_threadpool(rows_committed, row.project_id, [row], before)
+    return row
+
+@router.delete("/rows/{row_id}")
+async def soft_delete_row(
+    row_id: str,
+    actor: Actor = Depends(current_actor),
+    db: AsyncSession = Depends(get_async_db),
+):
+    row = await db.get(models.RunSheetRow, row_id)
+    if not row or not await can_access_async(db, actor, row.project_id):
+        raise HTTPException(status_code=404, detail="Row not found")
+    await require_project_async(db, actor, row.project_id, "editor")
+
+    before = snapshot([row])
+    row.is_deleted = True
+    row.deleted_by = actor.id
+    row.updated_by = actor.id
+
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
+
+    # updated_at is server-generated, so it has to be reloaded explicitly
+    await db.refresh(row)
+    await run_in_threadpool(rows_committed, row.project_id, [row], before)
+    return {"ok": True}
+
+
+def use_async_routes(app: FastAPI) -> None:
+    """Swap the app's sync handlers for the ones above (matched on path + method)."""
+    replaced = {
+        (route.path, method)
+        for route in router.routes
+        for method in route.methods
+    }
+    app.router.routes[:] = [
+        route for route in app.router.routes
+        if not (
+            isinstance(route, APIRoute)
+            and any((route.path, method) in replaced for method in route.methods)
+        )
+    ]
+    app.include_router(router)
@@ -0,0 +1,390 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app import models
+from app.deps import get_db
+
+# Session/token authentication on the users table.
+#
+# Logging in creates an auth_sessions row holding a SHA-256 of a random
+# token; the token goes back as a cookie (UI) or is sent as
+# "Authorization: Bearer <token>" (API). Each request resolves its actor
+# through a bounded TTL cache keyed by token hash, and project access is
+# cached per (user, project), so an authenticated read on a warm worker
+# makes no extra database round trip. Deactivating a user, changing their
+# role or membership, or logging out drops the affected entries here; other
+# worker processes catch up within AUTH_CACHE_TTL seconds.
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "1").lower() in ("1", "true", "yes")
+AUTH_SESSION_HOURS = float(os.getenv("AUTH_SESSION_HOURS", str(14 * 24)))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+SESSION_COOKIE = "landman_session"
+PASSWORD_ITERATIONS = 260_000
+
+# With AUTH_REQUIRED=0, unauthenticated requests act as the seed user (local dev, bench)
+DEV_USER_ID = "11111111-1111-1111-1111-111111111111"
+
+ROLE_RANK = {"viewer": 1, "editor": 2, "owner": 3}
+
+
+class Actor:
+    """The authenticated user, as cached; detached from any session."""
+
+    __slots__ = ("id", "email", "name", "global_role")
+
+    def __init__(self, id: str, email: str, name: str, global_role: str):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.global_role = global_role
+
+    @property
+    def is_admin(self) -> bool:
+        return self.global_role == "admin"
+
+
+class LoginRequired(Exception):
+    """Raised by UI dependencies; app/main.py turns it into a redirect to the login page."""
+
+    def __init__(self, next_url: str):
+        self.next_url = next_url
+
+
+# -----------------------------
+# TTL cache
+# -----------------------------
+class TTLCache:
+    """Bounded LRU whose entries expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[object, tuple[float, object]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return default
+            if item[0] <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value, ttl: float | None = None) -> None:
+        if self.max_entries <= 0:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (expires, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def pop_where(self, predicate) -> None:
+        with self.lock:
+            for key in [k for k, (_, v) in self.entries.items() if predicate(k, v)]:
+                del self.entries[key]
+
+
+# token hash -> Actor
+_actors = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+# (user id, project id) -> role, or "" for no access
+_access = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+
+def invalidate_user(user_id: str) -> None:
+    """Forget everything cached for a user (deactivated, role or password changed)."""
+    _actors.pop_where(lambda _, actor: actor.id == user_id)
+    _access.pop_where(lambda key, _: key[0] == user_id)
+
+
+def invalidate_access(user_id: str, project_id: str) -> None:
+    _access.pop((user_id, project_id))
+
+
+# -----------------------------
+# Passwords and tokens
+# -----------------------------
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii")
+
+
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PASSWORD_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    try:
+        algorithm, iterations, salt, expected = stored.split("$")
+    except ValueError:
+        # Not a hash we wrote (e.g. the seed user's placeholder): never matches
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(_b64(digest), expected)
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _utcnow() -> datetime:
+    # TIMESTAMP columns come back naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def authenticate(db: Session, email: str, password: str) -> models.User | None:
+    user = db.query(models.User).filter(models.User.email == email.strip()).first()
+    if user is None or not user.is_active or not verify_password(password, user.password_hash):
+        return None
+    return user
+
+
+def create_session(db: Session, user: models.User) -> tuple[str, datetime]:
+    """Start a session for `user`; returns (token, expires_at). Only the hash is stored."""
+    token = secrets.token_urlsafe(32)
+    expires_at = _utcnow() + timedelta(hours=AUTH_SESSION_HOURS)
+    db.add(models.AuthSession(token_hash=token_hash(token), user_id=user.id, expires_at=expires_at))
+    db.commit()
+    return token, expires_at
+
+
+def end_session(db: Session, token: str) -> None:
+    hashed = token_hash(token)
+    db.execute(delete(models.AuthSession).where(models.AuthSession.token_hash == hashed))
+    db.commit()
+    _actors.pop(hashed)
+
+
+def end_user_sessions(db: Session, user_id: str) -> None:
+    """Log a user out everywhere; the caller commits."""
+    db.execute(delete(models.AuthSession).where(models.AuthSession.user_id == user_id))
+    invalidate_user(user_id)
+
+
+# -----------------------------
+# Actor resolution
+# -----------------------------
+def request_token(request: Request) -> str | None:
+    header = request.headers.get("authorization", "")
+    scheme, _, value = header.partition(" ")
+    if scheme.lower() == "bearer" and value.strip():
+        return value.strip()
+    return request.cookies.get(SESSION_COOKIE) or None
+
+
+def _actor(user: models.User) -> Actor:
+    return Actor(user.id, user.email, user.name, user.global_role)
+
+
+def resolve_actor(db: Session, token: str) -> Actor | None:
+    hashed = token_hash(token)
+    actor = _actors.get(hashed)
+    if actor is not None:
+        return actor
+
+    row = db.execute(
+        select(models.User, models.AuthSession.expires_at)
+        .join(models.AuthSession, models.AuthSession.user_id == models.User.id)
+        .where(
+            models.AuthSession.token_hash == hashed,
+            models.AuthSession.expires_at > _utcnow(),
+            models.User.is_active == True,
+        )
+    ).first()
+    if row is None:
+        return None
+    user, expires_at = row
+    actor = _actor(user)
+    # Never cache a session past its own expiry
+    _actors.put(hashed, actor, ttl=(expires_at - _utcnow()).total_seconds())
+    return actor
+
+
+def _dev_actor(db: Session) -> Actor | None:
+    actor = _actors.get("dev")
+    if actor is None:
+        user = db.get(models.User, DEV_USER_ID)
+        if user is None or not user.is_active:
+            return None
+        actor = _actor(user)
+        _actors.put("dev", actor)
+    return actor
+
+
+def optional_actor(request: Request, db: Session = Depends(get_db)) -> Actor | None:
+    token = request_token(request)
+    actor = resolve_actor(db, token) if token else None
+    if actor is None and not AUTH_REQUIRED:
+        actor = _dev_actor(db)
+    return actor
+
+
+def current_actor(actor: Actor | None = Depends(optional_actor)) -> Actor:
+    """API dependency: 401 without a valid session or token."""
+    if actor is None:
+        raise HTTPException(
+            status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"}
+        )
+    return actor
+
+
+def ui_actor(request: Request, actor: Actor | None = Depends(optional_actor)) -> Actor:
+    """UI dependency: sends the browser to the login page instead of a 401."""
+    if actor is None:
+        path = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        raise LoginRequired(path)
+    return actor
+
+
+def admin_actor(actor: Actor = Depends(current_actor)) -> Actor:
+    if not actor.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return actor
+
+
+# -----------------------------
+# Project access
+# -----------------------------
+def _member_role_query(user_id: str, project_id: str):
+    return select(models.ProjectMember.role).where(
+        models.ProjectMember.project_id == project_id,
+        models.ProjectMember.user_id == user_id,
+    )
+
+
+def _visible_query(user_id: str):
+    return select(models.ProjectMember.project_id).where(models.ProjectMember.user_id == user_id)
+
+
+def _check(have: str | None, role: str) -> None:
+    if have is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if ROLE_RANK[have] < ROLE_RANK[role]:
+        raise HTTPException(status_code=403, detail=f"Requires {role} access to this project")
+
+
+def project_role(db: Session, actor: Actor, project_id: str) -> str | None:
+    """The actor's role on a project (admins own everything), or None."""
+    if actor.is_admin:
+        return "owner"
+    key = (actor.id, project_id)
+    role = _access.get(key)
+    if role is None:
+        role = db.execute(_member_role_query(actor.id, project_id)).scalar() or ""
+        _access.put(key, role)
+    return role or None
+
+
+def can_access(db: Session, actor: Actor, project_id: str, role: str = "viewer") -> bool:
+    have = project_role(db, actor, project_id)
+    return have is not None and ROLE_RANK[have] >= ROLE_RANK[role]
+
+
+def require_project(db: Session, actor: Actor, project_id: str, role: str = "viewer") -> None:
+    """404 for projects the actor can't see (same as a missing one), 403 if they can't `role`."""
+    _check(project_role(db, actor, project_id), role)
+
+
+def visible_project_ids(db: Session, actor: Actor) -> list[str] | None:
+    """Projects the actor may list or search; None means all (admins)."""
+    if actor.is_admin:
+        return None
+    return list(db.execute(_visible_query(actor.id)).scalars())
+
+
+# Same checks for the DB_ASYNC handlers (app/api_async.py), sharing the cache
+async def project_role_async(db, actor: Actor, project_id: str) -> str | None:
+    if actor.is_admin:
+        return "owner"
+    key = (actor.id, project_id)
+    role = _access.get(key)
+    if role is None:
+        role = (await db.execute(_member_role_query(actor.id, project_id))).scalar() or ""
+        _access.put(key, role)
+    return role or None
+
+
+async def can_access_async(db, actor: Actor, project_id: str, role: str = "viewer") -> bool:
+    have = await project_role_async(db, actor, project_id)
+    return have is not None and ROLE_RANK[have] >= ROLE_RANK[role]
+
+
+async def require_project_async(db, actor: Actor, project_id: str, role: str = "viewer") -> None:
+    _check(await project_role_async(db, actor, project_id), role)
+
+
+async def visible_project_ids_async(db, actor: Actor) -> list[str] | None:
+    if actor.is_admin:
+        return None
+    return list((await db.execute(_visible_query(actor.id))).scalars())
+
+
+def set_member(db: Session, project_id: str, user_id: str, role: str) -> models.ProjectMember:
+    """Add or change a membership; the caller commits."""
+    member = db.get(models.ProjectMember, (project_id, user_id))
+    if member is None:
+        member = models.ProjectMember(project_id=project_id, user_id=user_id, role=role)
+        db.add(member)
+    else:
+        member.role = role
+    invalidate_access(user_id, project_id)
+    return member
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main() -> None:
+    """python -m app.auth set-password boss@local"""
+    from getpass import getpass
+    from app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manage login passwords")
+    parser.add_argument("command", choices=["set-password"])
+    parser.add_argument("email")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == args.email).first()
+        if user is None:
+            sys.exit(f"No user with email {args.email}")
+        password = getpass("New password: ")
+        if len(password) < 8 or password != getpass("Again: "):
+            sys.exit("Passwords must match and be at least 8 characters")
+        user.password_hash = hash_password(password)
+        end_user_sessions(db, user.id)
+        db.commit()
+        print(f"Password set for {user.email}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
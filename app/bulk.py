@@ -0,0 +1,446 @@
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import duplicates, history, models, parties, recording, tracts
+from app.changes import rows_committed, snapshot
+from app.ordering import row_order_key
+
+# Rows per multi-row INSERT / commit. Each chunk is its own transaction, so a
+# conflict late in a large batch doesn't throw away the chunks before it.
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "1000"))
+# Keys per IN (...) lookup
+LOOKUP_CHUNK = 1000
+# Columns that identify "the same instrument" when re-importing (upsert_rows)
+UPSERT_KEY = tuple(c.strip() for c in os.getenv("UPSERT_KEY", "instrument,volume,page,filed_date").split(",") if c.strip())
+
+ROW_COLUMNS = (
+    "row_order",
+    "instrument",
+    "book_type",
+    "volume",
+    "page",
+    "instrument_number",
+    "grantor",
+    "grantee",
+    "exec_date",
+    "filed_date",
+    "legal_description",
+    "notes",
+)
+
+ORDER_TAKEN = "row_order already exists in project"
+ORDER_REPEATED = "row_order repeated in payload"
+DUPLICATE = "duplicate of an existing row"
+KEY_REPEATED = "natural key repeated in payload"
+KEY_AMBIGUOUS = "natural key matches several existing rows"
+
+
+def _committed(project_id: str, rows: list, before: dict | None, deferred: list | None) -> None:
+    # Post-commit hooks now, or handed back to a caller that runs them elsewhere
+    if deferred is None:
+        rows_committed(project_id, rows, before)
+    else:
+        deferred.append((rows, before))
+
+
+def _existing_orders(db: Session, project_id: str, orders: list[int]) -> set[int]:
+    # Live rows only: deleting a row frees its slot in uq_project_row_order
+    if not orders:
+        return set()
+    return set(db.execute(
+        select(models.RunSheetRow.row_order).where(
+            models.RunSheetRow.project_id == project_id,
+            models.RunSheetRow.is_deleted == False,
+            models.RunSheetRow.row_order.in_(orders),
+        )
+    ).scalars())
+
+
+def insert_rows(
+    db: Session,
+    project_id: str,
+    rows: list[dict],
+    actor_id: str,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    skip_duplicates: bool = False,
+    deferred: list | None = None,
+) -> tuple[list[dict], list[dict]]:
+    """Insert run sheet rows with one multi-row INSERT per chunk.
+
+    `rows` are dicts keyed by ROW_COLUMNS. Ids are generated client-side so the
+    inserted values can be returned as-is without reading them back.
+    Returns (created, failed); failed entries carry the payload index,
+    row_order and reason. With `skip_duplicates`, rows that duplicate a live
+    row in the project (or an earlier row in `rows`) are left out and
+    reported with duplicate_of and score.
+
+    With `deferred`, each committed chunk is appended to it as (rows, before)
+    instead of passed to rows_committed; the caller runs those (the async
+    API does, in the threadpool).
+    """
+    created: list[dict] = []
+    failed: list[dict] = []
+
+    # Catch repeats inside the payload and slots already taken in one query,
+    # instead of letting the unique key reject whole chunks.
+    seen: set[int] = set()
+    taken = _existing_orders(db, project_id, [r["row_order"] for r in rows])
+    pending: list[tuple[int, dict]] = []
+    for i, r in enumerate(rows):
+        order = r["row_order"]
+        if order in seen:
+            failed.append({"index": i, "row_order": order, "error": ORDER_REPEATED})
+            continue
+        seen.add(order)
+        if order in taken:
+            failed.append({"index": i, "row_order": order, "error": ORDER_TAKEN})
+            continue
+
+        values = {k: r.get(k) for k in ROW_COLUMNS}
+        values.update(
+            id=models.uuid_str(),
+            project_id=project_id,
+            sort_key=row_order_key(order),
+            version=1,
+            created_by=actor_id,
+            updated_by=actor_id,
+            is_deleted=False,
+        )
+        values["dup_key"] = duplicates.block_key(values)
+        values.update(recording.ref_keys(values))
+        pending.append((i, values))
+
+    if skip_duplicates and pending:
+        matches = duplicates.match_new_rows(db, project_id, [v for _, v in pending])
+        kept = []
+        for n, (i, v) in enumerate(pending):
+            if n in matches:
+                row_id, score = matches[n]
+                failed.append({
+                    "index": i, "row_order": v["row_order"], "error": DUPLICATE,
+                    "duplicate_of": row_id, "score": round(score, 3),
+                })
+            else:
+                kept.append((i, v))
+        pending = kept
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            db.execute(insert(models.RunSheetRow).values([v for _, v in chunk]))
+            history.record_inserts(db, project_id, [v for _, v in chunk], actor_id)
+            parties.link_rows(db, [v for _, v in chunk])
+            tracts.index_rows(db, [v for _, v in chunk])
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # Another writer may have claimed some slots since the pre-check;
+            # drop those and retry the rest of the chunk once.
+            raced = _existing_orders(db, project_id, [v["row_order"] for _, v in chunk])
+            retry = []
+            for i, v in chunk:
+                if v["row_order"] in raced:
+                    failed.append({"index": i, "row_order": v["row_order"], "error": ORDER_TAKEN})
+                else:
+                    retry.append((i, v))
+            if not retry:
+                continue
+            try:
+                db.execute(insert(models.RunSheetRow).values([v for _, v in retry]))
+                history.record_inserts(db, project_id, [v for _, v in retry], actor_id)
+                parties.link_rows(db, [v for _, v in retry])
+                tracts.index_rows(db, [v for _, v in retry])
+                db.commit()
+            except IntegrityError as e:
+                db.rollback()
+                for i, v in retry:
+                    failed.append({"index": i, "row_order": v["row_order"], "error": f"Insert failed: {e.orig}"})
+                continue
+            chunk = retry
+
+        created.extend(v for _, v in chunk)
+        _committed(project_id, [v for _, v in chunk], None, deferred)
+
+    failed.sort(key=lambda f: f["index"])
+    return created, failed
+
+
+# -----------------------------
+# Batch update
+# -----------------------------
+class BulkUpdateError(Exception):
+    pass
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # updated_at comes back naive (UTC); clients may send an offset
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+
+def update_rows(
+    db: Session,
+    project_id: str,
+    changes: list[dict],
+    actor_id: str,
+    deferred: list | None = None,
+) -> tuple[list[models.RunSheetRow], list[str], list[dict]]:
+    """Apply per-row patches in one transaction with one UPDATE statement.
+
+    Each change is {"id", optional "expected_version" / "expected_updated_at",
+    plus the RunSheetRowPatch fields to set}. Rows whose expectation doesn't
+    match the stored row are reported as conflicts and left alone; changes
+    that wouldn't alter a row are skipped, so its version and updated_at stay
+    put. Returns (updated rows, unchanged ids, conflicts). `deferred` is as
+    for insert_rows.
+    """
+    t = models.RunSheetRow
+    ids = [c["id"] for c in changes]
+    # Lock the rows so the versions checked below are the ones we overwrite
+    current = {
+        r.id: r
+        for r in db.execute(
+            select(t).where(t.id.in_(ids), t.project_id == project_id).with_for_update()
+        ).scalars()
+    }
+
+    before = snapshot(current.values())
+    conflicts: list[dict] = []
+    unchanged: list[str] = []
+    diffs: dict[str, dict] = {}
+    for c in changes:
+        row = current.get(c["id"])
+        if row is None:
+            conflicts.append({"id": c["id"], "error": "Row not found in project"})
+            continue
+        expected_version = c.get("expected_version")
+        expected_updated_at = c.get("expected_updated_at")
+        if (expected_version is not None and expected_version != row.version) or (
+            expected_updated_at is not None and _naive_utc(expected_updated_at) != _naive_utc(row.updated_at)
+        ):
+            conflicts.append({"id": row.id, "error": "Row was changed by someone else", "current": row})
+            continue
+
+        diff = {
+            k: v for k, v in c.items()
+            if k not in ("id", "expected_version", "expected_updated_at") and getattr(row, k) != v
+        }
+        if not diff:
+            unchanged.append(row.id)
+            continue
+        if "row_order" in diff:
+            diff["sort_key"] = row_order_key(diff["row_order"])
+        if any(k in diff for k in models.DUP_KEY_COLUMNS):
+            dup_key = duplicates.block_key({k: diff.get(k, getattr(row, k)) for k in models.DUP_KEY_COLUMNS})
+            if dup_key != row.dup_key:
+                diff["dup_key"] = dup_key
+        if any(k in diff for k in models.REF_KEY_COLUMNS):
+            keys = recording.ref_keys({k: diff.get(k, getattr(row, k)) for k in models.REF_KEY_COLUMNS})
+            diff.update((k, v) for k, v in keys.items() if v != getattr(row, k))
+        if "is_deleted" in diff:
+            diff["deleted_at"] = datetime.now(timezone.utc).replace(tzinfo=None) if diff["is_deleted"] else None
+        if diff.get("is_deleted"):
+            diff["deleted_by"] = actor_id
+        diffs[row.id] = diff
+
+    if diffs:
+        # One CASE per touched column; rows that don't set a column keep it
+        columns = sorted({k for d in diffs.values() for k in d})
+        values = {
+            k: case(
+                {row_id: d[k] for row_id, d in diffs.items() if k in d},
+                value=t.id,
+                else_=getattr(t, k),
+            )
+            for k in columns
+        }
+        values.update(version=t.version + 1, updated_by=actor_id)
+        try:
+            result = db.execute(
+                update(t)
+                .where(
+                    t.id.in_(list(diffs)),
+                    t.version == case({row_id: current[row_id].version for row_id in diffs}, value=t.id),
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(diffs):
+                raise BulkUpdateError("Rows changed during the update; reload and retry")
+            history.record_updates(db, project_id, diffs, actor_id)
+            parties.link_rows(db, [
+                {"id": row_id, **{k: d.get(k, getattr(current[row_id], k)) for k in parties.ROLES}}
+                for row_id, d in diffs.items()
+                if any(k in d for k in parties.ROLES)
+            ], replace=True)
+            tracts.index_rows(db, [
+                {"id": row_id, "legal_description": d["legal_description"]}
+                for row_id, d in diffs.items()
+                if "legal_description" in d
+            ], replace=True)
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            raise BulkUpdateError(f"Update failed: {e.orig}")
+        except BulkUpdateError:
+            db.rollback()
+            raise
+    else:
+        db.rollback()
+
+    updated: list[models.RunSheetRow] = []
+    if diffs:
+        # populate_existing: sessions that keep objects loaded across commits
+        # (the async one) would otherwise hand back the pre-update values
+        updated = db.execute(
+            select(t)
+            .where(t.id.in_(list(diffs)))
+            .order_by(t.sort_key.asc())
+            .execution_options(populate_existing=True)
+        ).scalars().all()
+        _committed(project_id, updated, before, deferred)
+
+    # Reload what the client lost to, after our own commit
+    for conflict in conflicts:
+        if "current" in conflict:
+            db.refresh(conflict["current"])
+    return updated, unchanged, conflicts
+
+
+# -----------------------------
+# Upsert (re-import)
+# -----------------------------
+def upsert_key(columns) -> tuple[str, ...]:
+    """Validated natural key columns; ValueError for unknown ones."""
+    key = tuple(dict.fromkeys(c.strip() for c in columns if c.strip()))
+    unknown = [c for c in key if c not in ROW_COLUMNS]
+    if unknown or not key:
+        raise ValueError(f"Unknown key column(s): {', '.join(unknown)}" if unknown else "Empty key")
+    return key
+
+
+def _key_value(column: str, value):
+    # Compared the way duplicates/recording compare them: "Vol. 0045" = "45", "WD" = "Warranty Deed"
+    if column == "instrument":
+        return duplicates.normalize_instrument(value) or None
+    if column in models.REF_KEY_COLUMNS:
+        return recording.ref_key(value)
+    if column == "book_type":
+        return recording.normalize_book_type(value)
+    if isinstance(value, str):
+        return " ".join(value.upper().split()) or None
+    return value
+
+
+def natural_key(row, key: tuple[str, ...]) -> tuple | None:
+    """A row's natural key (None when every part is blank: nothing to match on)."""
+    values = tuple(_key_value(c, row.get(c)) for c in key)
+    return values if any(v is not None for v in values) else None
+
+
+def _existing_by_key(db: Session, project_id: str, key: tuple[str, ...], incoming: dict[tuple, dict]) -> dict[tuple, list[str]]:
+    # Live rows' ids for each natural key in `incoming` (natural key -> payload row)
+    t = models.RunSheetRow
+    stmt = select(t.id, *(getattr(t, c) for c in key)).where(t.project_id == project_id, t.is_deleted == False)
+    blocks = {duplicates.block_key(r) for r in incoming.values()}
+    if set(models.DUP_KEY_COLUMNS) <= set(key) and None not in blocks:
+        # Equal keys mean equal dup_key, so candidates come from rows_project_dup_idx
+        blocks = sorted(blocks)
+        found = (
+            r
+            for start in range(0, len(blocks), LOOKUP_CHUNK)
+            for r in db.execute(stmt.where(t.dup_key.in_(blocks[start:start + LOOKUP_CHUNK]))).mappings()
+        )
+    else:
+        found = db.execute(stmt).mappings()
+    ids: dict[tuple, list[str]] = {}
+    for r in found:
+        k = natural_key(r, key)
+        if k in incoming:
+            ids.setdefault(k, []).append(r["id"])
+    return ids
+
+
+def upsert_rows(
+    db: Session,
+    project_id: str,
+    rows: list[dict],
+    actor_id: str,
+    key: tuple[str, ...] = UPSERT_KEY,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    skip_duplicates: bool = False,
+    next_order: int | None = None,
+    deferred: list | None = None,
+) -> tuple[list[dict], list[models.RunSheetRow], list[str], list[dict]]:
+    """Re-import rows: update the live rows they match on `key`, insert the rest.
+
+    A matched row takes the payload's values for every column but row_order
+    (it stays where it is in the run sheet) through update_rows, so rows the
+    payload doesn't change are left alone: no write, no version bump, no
+    history entry. Unmatched rows go through insert_rows; those without a
+    row_order are numbered from `next_order` by 10s. Payload rows repeating
+    a key, or whose key matches several live rows, are reported as failed.
+    Returns (inserted, updated, unchanged ids, failed). `deferred` is as for
+    insert_rows.
+    """
+    failed: list[dict] = []
+    incoming: dict[tuple, dict] = {}
+    keyed: list[tuple[int, tuple | None]] = []
+    for i, r in enumerate(rows):
+        k = natural_key(r, key)
+        if k is not None and k in incoming:
+            failed.append({"index": i, "row_order": r.get("row_order"), "error": KEY_REPEATED})
+            continue
+        if k is not None:
+            incoming[k] = r
+        keyed.append((i, k))
+    existing = _existing_by_key(db, project_id, key, incoming) if incoming else {}
+
+    changes: list[tuple[int, dict]] = []
+    inserts: list[tuple[int, dict]] = []
+    for i, k in keyed:
+        r = rows[i]
+        ids = existing.get(k, []) if k is not None else []
+        if len(ids) > 1:
+            failed.append({"index": i, "row_order": r.get("row_order"), "error": KEY_AMBIGUOUS})
+        elif ids:
+            changes.append((i, {"id": ids[0], **{c: r.get(c) for c in ROW_COLUMNS if c != "row_order"}}))
+        else:
+            if r.get("row_order") is None:
+                r = {**r, "row_order": next_order}
+                next_order += 10
+            inserts.append((i, r))
+
+    updated: list[models.RunSheetRow] = []
+    unchanged: list[str] = []
+    # Same chunking as inserts: each chunk is its own transaction
+    for start in range(0, len(changes), chunk_size):
+        chunk = changes[start:start + chunk_size]
+        try:
+            done, same, conflicts = update_rows(db, project_id, [c for _, c in chunk], actor_id, deferred=deferred)
+        except BulkUpdateError as e:
+            failed.extend({"index": i, "row_order": rows[i].get("row_order"), "error": str(e)} for i, _ in chunk)
+            continue
+        updated.extend(done)
+        unchanged.extend(same)
+        lost = {c["id"]: c["error"] for c in conflicts}
+        failed.extend(
+            {"index": i, "row_order": rows[i].get("row_order"), "error": lost[c["id"]]}
+            for i, c in chunk if c["id"] in lost
+        )
+
+    created, insert_failed = insert_rows(
+        db, project_id, [r for _, r in inserts], actor_id,
+        chunk_size=chunk_size, skip_duplicates=skip_duplicates, deferred=deferred,
+    )
+    # insert_rows indexes into what it was given
+    for f in insert_failed:
+        f["index"] = inserts[f["index"]][0]
+    failed.extend(insert_failed)
+    failed.sort(key=lambda f: f["index"])
+    return created, updated, unchanged, failed
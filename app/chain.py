@@ -0,0 +1,333 @@
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Per-project chain-of-title graphs, cached in-process and patched as rows
+# change. Each worker process keeps its own cache, so a graph remembers the
+# projects.version it reflects (as built, plus one per write patched in
+# here); any other version means another process wrote, and it's rebuilt.
+CHAIN_CACHE_SIZE = int(os.getenv("CHAIN_CACHE_SIZE", "64"))
+
+_NON_WORD_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def party_key(name: str) -> str:
+    """Loose identity for matching a grantee to a later grantor."""
+    return _SPACE_RE.sub(" ", _NON_WORD_RE.sub(" ", (name or "").upper())).strip()
+
+
+def conveyance_key(r) -> tuple:
+    # Record order: filed date, else exec date, then run sheet position. Undated rows sort last.
+    return (r["filed_date"] or r["exec_date"] or date.max, r["sort_key"])
+
+
+class ChainGraph:
+    """Grantor -> grantee conveyance graph for one project.
+
+    Break status is kept per row and re-evaluated only for rows whose grantor
+    is touched by a change, so applying a few edited rows doesn't walk the
+    whole run sheet. The analysis dict is cached until the next change.
+    """
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.lock = threading.Lock()
+        self.version: int | None = None
+        self.rows: dict[str, dict] = {}
+        self.order: list[tuple] = []                 # sorted (key, row_id)
+        self.acquired: dict[str, list[tuple]] = {}   # party -> sorted keys where party is grantee
+        self.conveys: dict[str, set[str]] = {}       # party -> row ids where party is grantor
+        self.edges: Counter = Counter()              # (grantor, grantee) -> rows
+        self.names: dict[str, str] = {}              # party -> first spelling seen
+        self.breaks: set[str] = set()
+        self._cycles: list[dict] | None = None
+        self._result: dict | None = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # -- mutation --
+    def _remove(self, row_id: str, dirty: set[str]) -> None:
+        old = self.rows.pop(row_id, None)
+        if old is None:
+            return
+        key = old["key"]
+        del self.order[bisect_left(self.order, (key, row_id))]
+
+        keys = self.acquired[old["grantee_key"]]
+        del keys[bisect_left(keys, key)]
+        if not keys:
+            del self.acquired[old["grantee_key"]]
+
+        self.conveys[old["grantor_key"]].discard(row_id)
+        edge = (old["grantor_key"], old["grantee_key"])
+        self.edges[edge] -= 1
+        if not self.edges[edge]:
+            del self.edges[edge]
+            self._cycles = None
+
+        self.breaks.discard(row_id)
+        dirty.add(old["grantee_key"])
+
+    def _add(self, r, dirty: set[str]) -> None:
+        row = {
+            "id": r["id"],
+            "row_order": r["row_order"],
+            "sort_key": r["sort_key"],
+            "instrument": r["instrument"],
+            "grantor": r["grantor"],
+            "grantee": r["grantee"],
+            "filed_date": r["filed_date"],
+            "exec_date": r["exec_date"],
+            "key": conveyance_key(r),
+            "grantor_key": party_key(r["grantor"]),
+            "grantee_key": party_key(r["grantee"]),
+        }
+        self.rows[row["id"]] = row
+        insort(self.order, (row["key"], row["id"]))
+        insort(self.acquired.setdefault(row["grantee_key"], []), row["key"])
+        self.conveys.setdefault(row["grantor_key"], set()).add(row["id"])
+
+        edge = (row["grantor_key"], row["grantee_key"])
+        if edge not in self.edges:
+            self._cycles = None
+        self.edges[edge] += 1
+
+        self.names.setdefault(row["grantor_key"], row["grantor"])
+        self.names.setdefault(row["grantee_key"], row["grantee"])
+        self._evaluate(row["id"])
+        dirty.add(row["grantee_key"])
+
+    def _evaluate(self, row_id: str) -> None:
+        # A conveyance breaks the chain when its grantor hadn't acquired
+        # anything earlier in record order.
+        row = self.rows[row_id]
+        keys = self.acquired.get(row["grantor_key"])
+        if keys and keys[0] < row["key"]:
+            self.breaks.discard(row_id)
+        else:
+            self.breaks.add(row_id)
+
+    def apply(self, rows: list, removed: list[str] = ()) -> None:
+        """Upsert live rows (mappings with run sheet columns) and drop `removed` row ids."""
+        dirty: set[str] = set()
+        for row_id in removed:
+            self._remove(row_id, dirty)
+        for r in rows:
+            self._remove(r["id"], dirty)
+            self._add(r, dirty)
+        for party in dirty:
+            for row_id in self.conveys.get(party, ()):
+                self._evaluate(row_id)
+        self._result = None
+
+    # -- analysis --
+    def _find_cycles(self) -> list[dict]:
+        # Tarjan's SCC over the party graph; any component with more than one
+        # party, or a party conveying to itself, is a circular conveyance.
+        graph: dict[str, list[str]] = {}
+        for a, b in self.edges:
+            graph.setdefault(a, []).append(b)
+            graph.setdefault(b, [])
+
+        index: dict[str, int] = {}
+        low: dict[str, int] = {}
+        stack: list[str] = []
+        on_stack: set[str] = set()
+        components: list[list[str]] = []
+        counter = 0
+
+        for root in graph:
+            if root in index:
+                continue
+            work = [(root, iter(graph[root]))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                advanced = False
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(graph[child])))
+                        advanced = True
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or (node, node) in self.edges:
+                        components.append(component)
+
+        cycles = []
+        for component in components:
+            members = set(component)
+            row_ids = [
+                row_id for _, row_id in self.order
+                if self.rows[row_id]["grantor_key"] in members and self.rows[row_id]["grantee_key"] in members
+            ]
+            cycles.append({
+                "parties": sorted(self.names[p] for p in members),
+                "row_ids": row_ids,
+            })
+        return cycles
+
+    def _row_out(self, row_id: str) -> dict:
+        r = self.rows[row_id]
+        return {k: r[k] for k in ("id", "row_order", "instrument", "grantor", "grantee", "filed_date", "exec_date")}
+
+    def analysis(self) -> dict:
+        if self._result is not None:
+            return self._result
+
+        if self._cycles is None:
+            self._cycles = self._find_cycles()
+
+        # The earliest conveyance's grantor is the root of title, not a break
+        roots: set[str] = set()
+        if self.order:
+            first_key = self.order[0][0]
+            for key, row_id in self.order:
+                if key[0] != first_key[0]:
+                    break
+                roots.add(row_id)
+
+        breaks = sorted(
+            (self.rows[row_id] for row_id in self.breaks - roots),
+            key=lambda r: r["key"],
+        )
+
+        # Grantees who never convey on, other than the current owner(s) from
+        # the latest conveyance
+        latest = set()
+        if self.order:
+            last_key = self.order[-1][0]
+            latest = {self.rows[row_id]["grantee_key"] for key, row_id in reversed(self.order) if key[0] == last_key[0]}
+        orphaned = {party for party in self.acquired if not self.conveys.get(party) and party not in latest}
+        orphan_rows: dict[str, list[str]] = {party: [] for party in orphaned}
+        for _, row_id in self.order:
+            party = self.rows[row_id]["grantee_key"]
+            if party in orphaned:
+                orphan_rows[party].append(row_id)
+        orphans = [{"party": self.names[party], "row_ids": row_ids} for party, row_ids in orphan_rows.items()]
+
+        self._result = {
+            "project_id": self.project_id,
+            "conveyances": len(self.rows),
+            "root_grantors": sorted({self.rows[row_id]["grantor"] for row_id in roots}),
+            "breaks": [self._row_out(r["id"]) for r in breaks],
+            "orphan_grantees": sorted(orphans, key=lambda o: o["party"]),
+            "cycles": self._cycles,
+        }
+        return self._result
+
+
+_graphs: "OrderedDict[str, ChainGraph]" = OrderedDict()
+_graphs_lock = threading.Lock()
+# project_id -> True once a write lands while its graph is being built
+_building: dict[str, bool] = {}
+
+_CHAIN_COLUMNS = (
+    models.RunSheetRow.id,
+    models.RunSheetRow.row_order,
+    models.RunSheetRow.sort_key,
+    models.RunSheetRow.instrument,
+    models.RunSheetRow.grantor,
+    models.RunSheetRow.grantee,
+    models.RunSheetRow.filed_date,
+    models.RunSheetRow.exec_date,
+)
+
+
+def _build(db: Session, project_id: str) -> ChainGraph:
+    graph = ChainGraph(project_id)
+    rows = db.execute(
+        select(*_CHAIN_COLUMNS).where(
+            models.RunSheetRow.project_id == project_id,
+            models.RunSheetRow.is_deleted == False,
+        )
+    ).mappings().all()
+    graph.apply(rows)
+    return graph
+
+
+def project_chain(db: Session, project_id: str) -> dict:
+    # Read before the rows, so a write landing during the build leaves the graph stale, not wrong
+    version = db.execute(select(models.Project.version).where(models.Project.id == project_id)).scalar()
+    with _graphs_lock:
+        graph = _graphs.get(project_id)
+        if graph is not None and graph.version != version:
+            del _graphs[project_id]
+            graph = None
+        elif graph is not None:
+            _graphs.move_to_end(project_id)
+
+    if graph is None:
+        with _graphs_lock:
+            _building[project_id] = False
+        try:
+            graph = _build(db, project_id)
+            graph.version = version
+        finally:
+            with _graphs_lock:
+                stale = _building.pop(project_id, True)
+        # Don't cache a graph that may have missed a concurrent write
+        if not stale:
+            with _graphs_lock:
+                _graphs[project_id] = graph
+                while len(_graphs) > CHAIN_CACHE_SIZE:
+                    _graphs.popitem(last=False)
+
+    with graph.lock:
+        return graph.analysis()
+
+
+def forget(project_id: str) -> None:
+    """Drop a project's cached graph; the next request rebuilds it."""
+    with _graphs_lock:
+        _graphs.pop(project_id, None)
+        if project_id in _building:
+            _building[project_id] = True
+
+
+def rows_written(project_id: str, rows: list[dict]) -> None:
+    """Patch a cached project graph with committed row values (deleted rows are dropped)."""
+    with _graphs_lock:
+        graph = _graphs.get(project_id)
+        if project_id in _building:
+            _building[project_id] = True
+    if graph is None:
+        return
+
+    live = [r for r in rows if not r.get("is_deleted")]
+    removed = [r["id"] for r in rows if r.get("is_deleted")]
+    with graph.lock:
+        graph.apply(live, removed)
+        # rows_committed bumps projects.version once for this write
+        graph.version += 1
@@ -0,0 +1,99 @@
+from sqlalchemy import and_, case, func, or_, select, update
+
+from app import chain, history, httpcache, models
+from app.db import engine
+
+# Post-commit notifications for run sheet row writes.
+# Every path that writes run_sheet_rows calls rows_committed() once its
+# transaction has committed, so derived per-project state stays current
+# without each handler knowing who depends on it.
+
+ROW_COLUMNS = tuple(c.key for c in models.RunSheetRow.__table__.columns if c.computed is None)
+
+
+def row_values(row) -> dict:
+    if isinstance(row, dict):
+        return row
+    return {k: getattr(row, k) for k in ROW_COLUMNS}
+
+
+def snapshot(rows) -> dict:
+    """Pre-write values by id, for rows_committed(before=...); take it before mutating."""
+    return {r.id: dict(row_values(r)) for r in rows}
+
+
+def _summary_values(rows: list[dict], before: dict) -> dict:
+    # Incremental row_count / filed-date range / last edit for one batch.
+    # Rows not in `before` are new. A live dated row that disappears (deleted
+    # or re-dated) may have been the min or max, so the range is re-read from
+    # rows_project_live_filed_idx instead.
+    p, t = models.Project, models.RunSheetRow
+    count_delta = 0
+    added: list = []
+    removed = False
+    for r in rows:
+        old = before.get(r["id"])
+        was_live = old is not None and not old["is_deleted"]
+        is_live = not r["is_deleted"]
+        count_delta += int(is_live) - int(was_live)
+        if was_live and old["filed_date"] is not None and (not is_live or old["filed_date"] != r["filed_date"]):
+            removed = True
+        if is_live and r["filed_date"] is not None:
+            added.append(r["filed_date"])
+
+    values = {
+        "last_edited_at": func.current_timestamp(),
+        "last_edited_by": rows[-1]["updated_by"],
+    }
+    if count_delta:
+        values["row_count"] = p.row_count + count_delta
+    if removed:
+        live = and_(t.project_id == p.id, t.is_deleted == False)
+        values["min_filed_date"] = select(func.min(t.filed_date)).where(live).scalar_subquery()
+        values["max_filed_date"] = select(func.max(t.filed_date)).where(live).scalar_subquery()
+    elif added:
+        lo, hi = min(added), max(added)
+        values["min_filed_date"] = case(
+            (or_(p.min_filed_date == None, p.min_filed_date > lo), lo), else_=p.min_filed_date
+        )
+        values["max_filed_date"] = case(
+            (or_(p.max_filed_date == None, p.max_filed_date < hi), hi), else_=p.max_filed_date
+        )
+    return values
+
+
+def _bump_version(project_id: str, summary: dict | None = None) -> None:
+    # After the row commit, so a reader that sees the new version also sees
+    # the rows (the reverse only costs a cache miss). Touches updated_at too.
+    with engine.begin() as conn:
+        conn.execute(
+            update(models.Project)
+            .where(models.Project.id == project_id)
+            .values(version=models.Project.version + 1, **(summary or {}))
+        )
+    httpcache.invalidate(project_id)
+
+
+def rows_committed(project_id: str, rows: list, before: dict | None = None) -> None:
+    """`rows` are RunSheetRow objects or dicts of their column values.
+
+    `before` maps row id -> column values before the write, for rows that
+    already existed; anything not in it counts as inserted.
+    """
+    if not rows:
+        return
+    values = [row_values(r) for r in rows]
+    chain.rows_written(project_id, values)
+    _bump_version(project_id, _summary_values(values, before or {}))
+    history.entries_committed(project_id, len(values))
+
+
+def project_rewritten(project_id: str) -> None:
+    """For bulk rewrites (e.g. renumbering) that don't hand back row values: drop derived state."""
+    chain.forget(project_id)
+    _bump_version(project_id)
+
+
+def project_saved(project_id: str) -> None:
+    """A project's own fields changed (or it was just created)."""
+    _bump_version(project_id)
@@ -2,13 +2,76 @@ import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine, pool_options
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set")
 
+# Pool size/overflow/timeout/recycle come from DB_POOL_* env vars
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
+    poolclass=InstrumentedQueuePool,
+    **pool_options(),
 )
+instrument_engine(engine, "primary")
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+# Optional read replica for read-only handlers (app/replica.py decides per
+# request whether it may be used). Unset = every read goes to the primary.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+
+read_engine = None
+ReadSessionLocal = None
+if READ_DATABASE_URL:
+    read_engine = create_engine(
+        READ_DATABASE_URL,
+        pool_pre_ping=True,
+        poolclass=InstrumentedQueuePool,
+        **pool_options(),
+    )
+    instrument_engine(read_engine, "replica")
+    ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
+# Async mode: project/row API handlers run on an AsyncEngine instead of
+# holding a threadpool slot while they wait on MySQL. Opt in with DB_ASYNC=1;
+# the async URL defaults to DATABASE_URL with the aiomysql driver.
+DB_ASYNC = os.getenv("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or DATABASE_URL.replace(
+    "mysql+mysqlconnector://", "mysql+aiomysql://"
+)
+ASYNC_READ_DATABASE_URL = READ_DATABASE_URL and (os.getenv("ASYNC_READ_DATABASE_URL") or READ_DATABASE_URL.replace(
+    "mysql+mysqlconnector://", "mysql+aiomysql://"
+))
+
+async_engine = None
+AsyncSessionLocal = None
+async_read_engine = None
+AsyncReadSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=True,
+        poolclass=InstrumentedAsyncQueuePool,
+        **pool_options(),
+    )
+    instrument_engine(async_engine.sync_engine, "primary_async")
+    # Objects stay loaded after commit; lazy refreshes can't run outside a greenlet
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, autocommit=False, expire_on_commit=False
+    )
+    if ASYNC_READ_DATABASE_URL:
+        async_read_engine = create_async_engine(
+            ASYNC_READ_DATABASE_URL,
+            pool_pre_ping=True,
+            poolclass=InstrumentedAsyncQueuePool,
+            **pool_options(),
+        )
+        instrument_engine(async_read_engine.sync_engine, "replica_async")
+        AsyncReadSessionLocal = async_sessionmaker(
+            bind=async_read_engine, autoflush=False, autocommit=False, expire_on_commit=False
+        )
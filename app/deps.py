@@ -1,4 +1,8 @@
-from app.db import SessionLocal
+from sqlalchemy.exc import DBAPIError
+from starlette.requests import Request
+
+from app.db import AsyncReadSessionLocal, AsyncSessionLocal, SessionLocal
+from app.replica import read_session, use_replica
 
 def get_db():
     db = SessionLocal()
@@ -6,3 +10,28 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db(request: Request):
+    # Read-only handlers: the replica unless app/replica.py sends this request to the primary
+    db = read_session(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db(request: Request):
+    if use_replica(request):
+        async with AsyncReadSessionLocal() as db:
+            try:
+                await db.connection()
+            except DBAPIError:
+                pass
+            else:
+                yield db
+                return
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+
+# Duplicate instrument detection.
+#
+# Rows are blocked on dup_key, a hash of normalized volume, page, instrument
+# type and filed date, stored on run_sheet_rows and indexed. Only rows that
+# share a key are compared, so checking an import against a large project is
+# a few indexed IN lookups instead of a pairwise scan. Within a block,
+# candidates are scored by fuzzy grantor/grantee similarity (trigram Dice
+# coefficient); a score of at least DUPLICATE_MIN_SCORE counts as a duplicate.
+DUPLICATE_MIN_SCORE = float(os.getenv("DUPLICATE_MIN_SCORE", "0.85"))
+# Keys per IN (...) lookup
+LOOKUP_CHUNK = 1000
+
+# Common run sheet abbreviations, so "WD" and "Warranty Deed" share a block
+INSTRUMENT_ALIASES = {
+    "WD": "WARRANTY DEED",
+    "SWD": "SPECIAL WARRANTY DEED",
+    "QCD": "QUITCLAIM DEED",
+    "QC DEED": "QUITCLAIM DEED",
+    "QUIT CLAIM DEED": "QUITCLAIM DEED",
+    "MD": "MINERAL DEED",
+    "RD": "ROYALTY DEED",
+    "OGL": "OIL AND GAS LEASE",
+    "O G LEASE": "OIL AND GAS LEASE",
+    "OIL GAS LEASE": "OIL AND GAS LEASE",
+    "AFF": "AFFIDAVIT",
+    "ASSGN": "ASSIGNMENT",
+    "ASGN": "ASSIGNMENT",
+    "ROW": "RIGHT OF WAY",
+}
+# Words that don't tell two parties apart
+NAME_NOISE = {"ET", "UX", "AL", "VIR", "ETUX", "ETAL", "ETVIR", "AND", "THE"}
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+def _ref(value) -> str:
+    # "0045", "45 ", "45." -> "45"
+    return _NON_ALNUM.sub("", str(value or "").upper()).lstrip("0")
+
+
+def normalize_instrument(value) -> str:
+    words = " ".join(_NON_ALNUM.sub(" ", str(value or "").upper()).split())
+    return INSTRUMENT_ALIASES.get(words, words)
+
+
+def block_key(row: dict) -> str | None:
+    """dup_key for a row's column values; None when there's too little to block on."""
+    volume, page, filed = _ref(row.get("volume")), _ref(row.get("page")), row.get("filed_date")
+    if not (volume or page or filed):
+        return None
+    parts = (volume, page, normalize_instrument(row.get("instrument")), str(filed or ""))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+@lru_cache(maxsize=65536)
+def _trigrams(value) -> frozenset:
+    # Character trigrams of the name's sorted significant words, so word order
+    # ("SMITH, JOHN A" / "John A. Smith") and punctuation don't count
+    name = " ".join(sorted(w for w in _NON_ALNUM.sub(" ", str(value or "").upper()).split() if w not in NAME_NOISE))
+    padded = f"  {name} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _similarity(a, b) -> float:
+    # Dice coefficient over trigrams
+    ta, tb = _trigrams(a), _trigrams(b)
+    if ta == tb:
+        return 1.0
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def score(a: dict, b: dict) -> float:
+    """Grantor/grantee similarity of two rows in the same block, 0..1."""
+    return (_similarity(a.get("grantor"), b.get("grantor")) + _similarity(a.get("grantee"), b.get("grantee"))) / 2
+
+
+def _best(row: dict, candidates, min_score: float) -> tuple[dict, float] | None:
+    best = None
+    for c in candidates:
+        s = score(row, c)
+        if s >= min_score and (best is None or s > best[1]):
+            best = (c, s)
+    return best
+
+
+_CANDIDATE_COLUMNS = ("id", "project_id", "sort_key", "dup_key", "grantor", "grantee")
+
+
+def _candidates(db: Session, keys, project_ids: list[str] | None = None) -> dict[str, list[dict]]:
+    # Live rows sharing any of `keys`, grouped by key
+    t = models.RunSheetRow
+    keys = sorted(keys)
+    by_key: dict[str, list[dict]] = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        q = select(*(getattr(t, c) for c in _CANDIDATE_COLUMNS)).where(
+            t.dup_key.in_(keys[start:start + LOOKUP_CHUNK]), t.is_deleted == False
+        )
+        if project_ids is not None:
+            q = q.where(t.project_id.in_(project_ids))
+        for r in db.execute(q).mappings():
+            by_key.setdefault(r["dup_key"], []).append(dict(r))
+    # Run sheet order within each block
+    for block in by_key.values():
+        block.sort(key=lambda r: (r["project_id"], r["sort_key"]))
+    return by_key
+
+
+def match_new_rows(
+    db: Session,
+    project_id: str,
+    rows: list[dict],
+    min_score: float = DUPLICATE_MIN_SCORE,
+) -> dict[int, tuple[str, float]]:
+    """Which of `rows` (column values with dup_key and id) duplicate a live row
+    in the project or an earlier row in `rows`. Returns {position: (row id, score)}.
+    """
+    existing = _candidates(db, {r["dup_key"] for r in rows if r.get("dup_key")}, [project_id])
+    matches: dict[int, tuple[str, float]] = {}
+    for n, r in enumerate(rows):
+        key = r.get("dup_key")
+        if not key:
+            continue
+        block = existing.setdefault(key, [])
+        best = _best(r, block, min_score)
+        if best is not None:
+            matches[n] = (best[0]["id"], best[1])
+        else:
+            # Later rows in the same payload are checked against it too
+            block.append(r)
+    return matches
+
+
+def project_duplicates(
+    db: Session,
+    project_id: str,
+    other_project_ids: list[str] | None = None,
+    min_score: float = DUPLICATE_MIN_SCORE,
+    limit: int = 500,
+) -> list[tuple[str, str, float]]:
+    """(row id, duplicate-of row id, score) for the project's live rows.
+
+    A row is matched against rows before it in the same project and, when
+    `other_project_ids` is given (None = every project), against rows there.
+    Pass [] to stay within the project.
+    """
+    t = models.RunSheetRow
+    live = (t.project_id == project_id, t.is_deleted == False, t.dup_key != None)
+    if other_project_ids == []:
+        # Only keys that occur more than once in the project can match
+        keys = db.execute(
+            select(t.dup_key).where(*live).group_by(t.dup_key).having(func.count() > 1)
+        ).scalars().all()
+        scope = [project_id]
+    else:
+        keys = db.execute(select(t.dup_key).where(*live).distinct()).scalars().all()
+        scope = None if other_project_ids is None else [project_id, *other_project_ids]
+
+    pairs: list[tuple[str, str, float]] = []
+    for key, block in _candidates(db, keys, scope).items():
+        seen: list[dict] = []
+        others = [c for c in block if c["project_id"] != project_id]
+        for r in (c for c in block if c["project_id"] == project_id):
+            best = _best(r, seen + others, min_score)
+            if best is not None:
+                pairs.append((r["id"], best[0]["id"], best[1]))
+            seen.append(r)
+            if len(pairs) >= limit:
+                return pairs
+    return pairs
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Fill in dup_key for rows written before it existed, batch by batch. Returns rows updated."""
+    t = models.RunSheetRow
+    columns = (t.id, *(getattr(t, k) for k in models.DUP_KEY_COLUMNS))
+    updated, after = 0, ""
+    while True:
+        batch = db.execute(
+            select(*columns).where(t.id > after, t.dup_key == None).order_by(t.id).limit(batch_size)
+        ).mappings().all()
+        if not batch:
+            return updated
+        after = batch[-1]["id"]
+        keys = {r["id"]: block_key(r) for r in batch}
+        keys = {row_id: key for row_id, key in keys.items() if key}
+        if keys:
+            # A derived column: no version bump or history entry
+            db.execute(
+                update(t)
+                .where(t.id.in_(list(keys)))
+                .values(dup_key=case(keys, value=t.id))
+                .execution_options(synchronize_session=False)
+            )
+            updated += len(keys)
+        db.commit()
+
+
+def main() -> None:
+    """python -m app.duplicates backfill   (set dup_key on rows that predate it)"""
+    parser = argparse.ArgumentParser(description="Duplicate detection maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        n = backfill(db)
+    finally:
+        db.close()
+    print(f"{n} row(s) updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import csv
+import os
+import tempfile
+from typing import Iterator
+
+from sqlalchemy import select
+
+from app import models
+from app.db import SessionLocal
+from app.importer import RUN_SHEET_COLUMNS
+
+# Rows fetched per round trip. Batches are keyset pages on sort_key (as in
+# pagination.py), so memory stays flat regardless of project size: the
+# mysqlconnector driver buffers whole results client-side, so yield_per
+# on one big SELECT would not.
+EXPORT_BATCH_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def _join_vol_pg(
+    volume: str | None,
+    page: str | None,
+    book_type: str | None = None,
+    instrument_number: str | None = None,
+) -> str:
+    # Inverse of importer._split_vol_pg
+    if volume and page:
+        cell = f"{volume}/{page}"
+    elif page:
+        cell = f"/{page}"
+    else:
+        cell = volume or ""
+    if book_type and cell:
+        cell = f"{book_type} {cell}"
+    if instrument_number:
+        cell = f"{cell} #{instrument_number}".strip()
+    return cell
+
+
+def _cells(r) -> list:
+    return [
+        r.instrument,
+        _join_vol_pg(r.volume, r.page, r.book_type, r.instrument_number),
+        r.grantor,
+        r.grantee,
+        r.exec_date.isoformat() if r.exec_date else "",
+        r.filed_date.isoformat() if r.filed_date else "",
+        r.legal_description or "",
+        r.notes or "",
+    ]
+
+
+def _iter_cells(project_id: str, session_factory=SessionLocal) -> Iterator[list]:
+    """Yield run sheet rows as cells in the paste/import column order."""
+    t = models.RunSheetRow
+    stmt = (
+        select(
+            t.sort_key,
+            t.instrument,
+            t.book_type,
+            t.volume,
+            t.page,
+            t.instrument_number,
+            t.grantor,
+            t.grantee,
+            t.exec_date,
+            t.filed_date,
+            t.legal_description,
+            t.notes,
+        )
+        .where(t.project_id == project_id, t.is_deleted == False)
+        .order_by(t.sort_key.asc())
+        .limit(EXPORT_BATCH_SIZE)
+    )
+
+    # Own session (the replica, if the request may read from it): the response
+    # body is generated after the request's dependencies have been torn down.
+    db = session_factory()
+    try:
+        after = None
+        while True:
+            batch = db.execute(stmt if after is None else stmt.where(t.sort_key > after)).all()
+            if not batch:
+                return
+            after = batch[-1].sort_key
+            yield from (_cells(r) for r in batch)
+            if len(batch) < EXPORT_BATCH_SIZE:
+                return
+    finally:
+        db.close()
+
+
+class _LineBuffer:
+    # csv.writer target that hands back what was written since the last drain
+    def __init__(self):
+        self.parts: list[str] = []
+
+    def write(self, s: str) -> None:
+        self.parts.append(s)
+
+    def drain(self) -> str:
+        out = "".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+def stream_csv(project_id: str, session_factory=SessionLocal) -> Iterator[bytes]:
+    buf = _LineBuffer()
+    writer = csv.writer(buf)
+    # BOM so Excel opens UTF-8 party names correctly; the importer strips it
+    writer.writerow(RUN_SHEET_COLUMNS)
+    yield ("\ufeff" + buf.drain()).encode("utf-8")
+
+    pending = 0
+    for cells in _iter_cells(project_id, session_factory):
+        writer.writerow(cells)
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buf.drain().encode("utf-8")
+            pending = 0
+    if pending:
+        yield buf.drain().encode("utf-8")
+
+
+def stream_xlsx(project_id: str, session_factory=SessionLocal) -> Iterator[bytes]:
+    # XLSX is a zip, so it can't be emitted row by row. Write-only mode spools
+    # rows to a temp file instead of holding cells in memory; the finished
+    # workbook is then streamed from disk.
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Run sheet")
+    ws.append(RUN_SHEET_COLUMNS)
+    for cells in _iter_cells(project_id, session_factory):
+        ws.append(cells)
+
+    fd, path = tempfile.mkstemp(prefix="landman-export-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(path)
+        with open(path, "rb") as f:
+            while chunk := f.read(FILE_CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", stream_csv),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", stream_xlsx),
+}
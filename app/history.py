@@ -0,0 +1,314 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+
+# Append-only run sheet history and point-in-time reconstruction.
+#
+# Every row write adds a row_history entry in the same transaction: the
+# full row for an insert, only the changed columns otherwise. ORM flushes
+# are recorded by the after_flush hook below; Core writers (bulk insert,
+# batch update, moves, rebalance) call record_inserts()/record_updates()
+# before they commit.
+#
+# Rebuilding a project as of time T starts from the newest snapshot taken
+# at or before T and applies only the entries after it. Snapshots are built
+# in the background from the log itself (previous snapshot + entries) once
+# HISTORY_SNAPSHOT_EVERY entries have accumulated, so they are consistent
+# with it by construction. Entries younger than HISTORY_SNAPSHOT_LAG seconds
+# are left for the next snapshot, so a transaction still in flight can't
+# commit an entry below one already folded in.
+HISTORY_SNAPSHOT_EVERY = int(os.getenv("HISTORY_SNAPSHOT_EVERY", "5000"))
+HISTORY_SNAPSHOT_LAG = float(os.getenv("HISTORY_SNAPSHOT_LAG", "60"))
+SNAPSHOT_CHUNK_ROWS = 5000
+# Reconstructed run sheets kept in-process, so paging through one is cheap
+RECONSTRUCTED_KEPT = 4
+
+log = logging.getLogger("app.history")
+
+ROW_COLUMNS = tuple(c.key for c in models.RunSheetRow.__table__.columns if c.computed is None)
+# Derived on replay rather than stored with each entry
+_IMPLIED = ("version", "updated_at")
+
+
+def _utcnow() -> datetime:
+    # TIMESTAMP columns come back naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def naive_utc(value: datetime) -> datetime:
+    # Clients may send an offset; stored times are naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _jsonable(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _op(changes: dict) -> str:
+    if "is_deleted" in changes:
+        return "delete" if changes["is_deleted"] else "restore"
+    return "update"
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+def _write(db, project_id: str, entries: list[tuple[str, str, dict]], actor_id: str | None) -> None:
+    if not entries:
+        return
+    now = _utcnow()
+    db.execute(insert(models.RowHistory), [
+        {
+            "project_id": project_id,
+            "row_id": row_id,
+            "op": op,
+            "changed_at": now,
+            "changed_by": actor_id,
+            "changes": {k: _jsonable(v) for k, v in changes.items() if k not in _IMPLIED},
+        }
+        for row_id, op, changes in entries
+    ])
+
+
+def record_inserts(db, project_id: str, rows: list[dict], actor_id: str) -> None:
+    """Log newly inserted rows (column values as inserted); before the commit."""
+    _write(db, project_id, [(r["id"], "insert", r) for r in rows], actor_id)
+
+
+def record_updates(db, project_id: str, changes: dict[str, dict], actor_id: str | None) -> None:
+    """Log {row id: changed columns} for rows updated in this transaction; before the commit."""
+    entries = []
+    for row_id, diff in changes.items():
+        diff = dict(diff)
+        if actor_id is not None:
+            diff["updated_by"] = actor_id
+        entries.append((row_id, _op(diff), diff))
+    _write(db, project_id, entries, actor_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flush(session: Session, flush_context) -> None:
+    # ORM writes (single-row edits, soft deletes, UI adds): still inside the
+    # flush's transaction, with the pre-flush change sets available
+    by_project: dict[tuple, list] = {}
+    for obj in session.new:
+        if isinstance(obj, models.RunSheetRow):
+            values = {k: obj.__dict__.get(k) for k in ROW_COLUMNS if k in obj.__dict__}
+            by_project.setdefault((obj.project_id, obj.updated_by), []).append((obj.id, "insert", values))
+    for obj in session.dirty:
+        if not isinstance(obj, models.RunSheetRow):
+            continue
+        state = inspect(obj)
+        diff = {}
+        for k in ROW_COLUMNS:
+            added = state.attrs[k].history.added
+            if added and k not in _IMPLIED:
+                diff[k] = added[0]
+        if diff:
+            by_project.setdefault((obj.project_id, obj.updated_by), []).append((obj.id, _op(diff), diff))
+
+    for (project_id, actor_id), entries in by_project.items():
+        _write(session.connection(), project_id, entries, actor_id)
+
+
+# -----------------------------
+# Reconstruction
+# -----------------------------
+def _apply(state: dict[str, dict], row_id: str, op: str, changed_at, changes: dict) -> None:
+    stamp = _jsonable(changed_at)
+    if op != "insert" and row_id not in state:
+        # A row from before history started that never got a baseline entry
+        # (see schema.sql): its other columns are unknown, so leave it out
+        return
+    if op == "insert":
+        row = dict.fromkeys(ROW_COLUMNS)
+        row.update(changes, id=row_id, version=1, created_at=stamp, updated_at=stamp)
+        state[row_id] = row
+        return
+    row = state[row_id]
+    row.update(changes)
+    row["version"] = (row.get("version") or 0) + 1
+    row["updated_at"] = stamp
+
+
+def _load_snapshot(db: Session, snapshot: models.HistorySnapshot | None) -> dict[str, dict]:
+    state: dict[str, dict] = {}
+    if snapshot is None:
+        return state
+    chunks = db.execute(
+        select(models.HistorySnapshotChunk.data)
+        .where(models.HistorySnapshotChunk.snapshot_id == snapshot.id)
+        .order_by(models.HistorySnapshotChunk.chunk)
+    ).scalars()
+    for data in chunks:
+        for row in json.loads(zlib.decompress(data)):
+            state[row["id"]] = row
+    return state
+
+
+def _latest_snapshot(db: Session, project_id: str, at: datetime | None = None) -> models.HistorySnapshot | None:
+    s = models.HistorySnapshot
+    q = select(s).where(s.project_id == project_id)
+    if at is not None:
+        q = q.where(s.through_at <= at)
+    return db.execute(q.order_by(s.through_id.desc()).limit(1)).scalar()
+
+
+def _entries(db: Session, project_id: str, after_id: int, through_id: int, at: datetime | None = None):
+    h = models.RowHistory
+    q = select(h.row_id, h.op, h.changed_at, h.changes).where(
+        h.project_id == project_id, h.id > after_id, h.id <= through_id
+    )
+    if at is not None:
+        # Ids aren't strictly in time order, so one below through_id can still be later than `at`
+        q = q.where(h.changed_at <= at)
+    return db.execute(q.order_by(h.id).execution_options(yield_per=SNAPSHOT_CHUNK_ROWS))
+
+
+def _state(db: Session, project_id: str, snapshot, through_id: int, at: datetime | None = None) -> dict[str, dict]:
+    state = _load_snapshot(db, snapshot)
+    for row_id, op, changed_at, changes in _entries(db, project_id, snapshot.through_id if snapshot else 0, through_id, at):
+        _apply(state, row_id, op, changed_at, changes)
+    return state
+
+
+_reconstructed: "OrderedDict[tuple, list[dict]]" = OrderedDict()
+_reconstructed_lock = threading.Lock()
+
+
+def rows_as_of(db: Session, project_id: str, at: datetime) -> list[dict]:
+    """The project's live rows as they stood at `at` (naive UTC), in run sheet order.
+
+    Results are kept only once the log up to `at` has settled
+    (HISTORY_SNAPSHOT_LAG), so asking about the last minute or so replays
+    the project from its snapshot on every call.
+    """
+    snapshot = _latest_snapshot(db, project_id, at)
+    h = models.RowHistory
+    since = snapshot.through_id if snapshot else 0
+    through_id = db.execute(
+        select(func.max(h.id)).where(h.project_id == project_id, h.id > since, h.changed_at <= at)
+    ).scalar() or since
+
+    key = (project_id, through_id, at)
+    with _reconstructed_lock:
+        rows = _reconstructed.get(key)
+        if rows is not None:
+            _reconstructed.move_to_end(key)
+            return rows
+
+    state = _state(db, project_id, snapshot, through_id, at)
+    rows = sorted(
+        (r for r in state.values() if not r.get("is_deleted")),
+        key=lambda r: (r.get("sort_key") is None, r.get("sort_key") or ""),
+    )
+    # The log below through_id stops changing once it has settled (entries
+    # can commit out of id order until then), and only then can the result
+    # be reused
+    settled = through_id == since or db.execute(
+        select(h.changed_at).where(h.id == through_id)
+    ).scalar() <= _utcnow() - timedelta(seconds=HISTORY_SNAPSHOT_LAG)
+    if settled:
+        with _reconstructed_lock:
+            _reconstructed[key] = rows
+            while len(_reconstructed) > RECONSTRUCTED_KEPT:
+                _reconstructed.popitem(last=False)
+    return rows
+
+
+def status_changed_at(db: Session, project_id: str, status: str) -> datetime | None:
+    """When the project last moved to `status`."""
+    c = models.ProjectStatusChange
+    return db.execute(
+        select(func.max(c.changed_at)).where(c.project_id == project_id, c.status == status)
+    ).scalar()
+
+
+def record_status(db: Session, project_id: str, status: str, actor_id: str) -> None:
+    """Log a project status change; before the commit."""
+    db.add(models.ProjectStatusChange(project_id=project_id, status=status, changed_at=_utcnow(), changed_by=actor_id))
+
+
+# -----------------------------
+# Snapshots
+# -----------------------------
+def take_snapshot(db: Session, project_id: str) -> models.HistorySnapshot | None:
+    """Fold settled entries since the last snapshot into a new one, if there are enough."""
+    h = models.RowHistory
+    previous = _latest_snapshot(db, project_id)
+    since = previous.through_id if previous else 0
+    settled = _utcnow() - timedelta(seconds=HISTORY_SNAPSHOT_LAG)
+    through_id, count = db.execute(
+        select(func.max(h.id), func.count(h.id))
+        .where(h.project_id == project_id, h.id > since, h.changed_at <= settled)
+    ).one()
+    if not through_id or count < HISTORY_SNAPSHOT_EVERY:
+        return None
+
+    state = _state(db, project_id, previous, through_id)
+    snapshot = models.HistorySnapshot(
+        project_id=project_id,
+        through_id=through_id,
+        through_at=db.execute(select(h.changed_at).where(h.id == through_id)).scalar(),
+        row_count=len(state),
+    )
+    db.add(snapshot)
+    db.flush()
+    rows = list(state.values())
+    db.execute(insert(models.HistorySnapshotChunk), [
+        {
+            "snapshot_id": snapshot.id,
+            "chunk": n,
+            "data": zlib.compress(json.dumps(rows[start:start + SNAPSHOT_CHUNK_ROWS], separators=(",", ":")).encode()),
+        }
+        for n, start in enumerate(range(0, len(rows), SNAPSHOT_CHUNK_ROWS))
+    ] or [{"snapshot_id": snapshot.id, "chunk": 0, "data": zlib.compress(b"[]")}])
+    db.commit()
+    return snapshot
+
+
+def _run_snapshot(project_id: str) -> None:
+    db = SessionLocal()
+    try:
+        snapshot = take_snapshot(db, project_id)
+        if snapshot is not None:
+            log.info("history snapshot of project %s through entry %d", project_id, snapshot.through_id)
+    except Exception:
+        db.rollback()
+        log.exception("history snapshot failed for project %s", project_id)
+    finally:
+        db.close()
+
+
+# One at a time; snapshots of large projects are memory-heavy
+_snapshotter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-snapshot")
+_pending: dict[str, int] = {}
+_pending_lock = threading.Lock()
+
+
+def entries_committed(project_id: str, n: int) -> None:
+    """Count committed entries per project (this process) and snapshot every HISTORY_SNAPSHOT_EVERY."""
+    with _pending_lock:
+        total = _pending.get(project_id, 0) + n
+        due = total >= HISTORY_SNAPSHOT_EVERY
+        _pending[project_id] = 0 if due else total
+    if due:
+        # Once the newest of them have settled (see HISTORY_SNAPSHOT_LAG)
+        timer = threading.Timer(HISTORY_SNAPSHOT_LAG, _snapshotter.submit, (_run_snapshot, project_id))
+        timer.daemon = True
+        timer.start()
@@ -0,0 +1,225 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app import models, schemas
+
+# Conditional GETs and an in-process response cache for project/row reads.
+#
+# Every committed row write bumps projects.version (app/changes.py), so a
+# project's version and updated_at validate everything served for it: the
+# ETag is derived from them, If-None-Match is answered with 304 before any
+# rows are loaded, and cached bodies are keyed by version so a stale entry
+# can never be served. invalidate() additionally frees entries as soon as
+# a write lands. RESPONSE_CACHE_MB=0 turns the body cache off.
+RESPONSE_CACHE_MB = float(os.getenv("RESPONSE_CACHE_MB", "64"))
+RESPONSE_CACHE_BYTES = int(RESPONSE_CACHE_MB * 1024 * 1024)
+# No single response may take more than this share of the cache
+MAX_ENTRY_SHARE = 4
+
+PROJECTS_SCOPE = "projects"
+
+PROJECT_JSON = TypeAdapter(schemas.ProjectOut)
+PROJECTS_JSON = TypeAdapter(list[schemas.ProjectOut])
+ROWS_JSON = TypeAdapter(list[schemas.RunSheetRowOut])
+
+
+class CachedBody:
+    __slots__ = ("body", "media_type", "headers")
+
+    def __init__(self, body: bytes, media_type: str, headers: dict | None = None):
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers or {}
+
+
+class ResponseCache:
+    """Byte-bounded LRU of rendered bodies, keyed (scope, version, path, query)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[tuple, CachedBody]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> CachedBody | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: CachedBody) -> None:
+        if len(entry.body) * MAX_ENTRY_SHARE > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.body)
+            self.entries[key] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+
+    def invalidate(self, scope: str) -> None:
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == scope]:
+                self.size -= len(self.entries.pop(key).body)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+
+
+def json_body(adapter: TypeAdapter, value, headers: dict | None = None) -> CachedBody:
+    # Same bytes FastAPI would produce from the response_model
+    body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return CachedBody(body, "application/json", headers)
+
+
+def rows_body(rows: list[dict], headers: dict | None = None) -> CachedBody:
+    # Row values straight from the database (pagination.rows_page_values),
+    # already the types RunSheetRowOut declares: encoded in one pass with
+    # pydantic's serializer, so the bytes match ROWS_JSON without
+    # validating a model per row
+    return CachedBody(to_json(rows), "application/json", headers)
+
+
+def invalidate(project_id: str | None = None) -> None:
+    """Drop cached responses for a project (and the project list, which shows it)."""
+    if project_id is not None:
+        response_cache.invalidate(project_id)
+    response_cache.invalidate(PROJECTS_SCOPE)
+
+
+# -----------------------------
+# Versions
+# -----------------------------
+def project_version_query(project_id: str):
+    return select(models.Project.version, models.Project.updated_at).where(models.Project.id == project_id)
+
+
+def projects_version_query(project_ids: list[str] | None = None):
+    # Creating a project bumps the count; any row write bumps the sum
+    stmt = select(
+        func.count(models.Project.id),
+        func.coalesce(func.sum(models.Project.version), 0),
+        func.max(models.Project.updated_at),
+    )
+    if project_ids is not None:
+        stmt = stmt.where(models.Project.id.in_(project_ids))
+    return stmt
+
+
+def project_version(db: Session, project_id: str) -> tuple[str, datetime | None] | None:
+    """(version, updated_at) for one project, or None if it doesn't exist."""
+    row = db.execute(project_version_query(project_id)).first()
+    if row is None:
+        return None
+    return str(row[0]), row[1]
+
+
+def projects_version(db: Session, project_ids: list[str] | None = None, viewer: str = "all") -> tuple[str, datetime | None]:
+    """Version of the project list as `viewer` sees it (only `project_ids`, if given).
+
+    Lists differ per user, so the viewer is part of the version and cache key.
+    """
+    count, total, updated_at = db.execute(projects_version_query(project_ids)).one()
+    return f"{viewer}.{count}.{total}", updated_at
+
+
+# -----------------------------
+# Responses
+# -----------------------------
+def _http_date(value: datetime) -> str:
+    # MySQL TIMESTAMPs come back naive in the session time zone (UTC here)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def validators(scope: str, version: str, updated_at: datetime | None) -> dict:
+    headers = {"ETag": f'W/"{scope}-{version}"', "Cache-Control": "no-cache"}
+    if isinstance(updated_at, datetime):
+        headers["Last-Modified"] = _http_date(updated_at)
+    return headers
+
+
+def not_modified(request: Request, headers: dict) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        # Weak comparison, as GET allows
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        return "*" in tags or headers["ETag"].removeprefix("W/") in tags
+
+    ims = request.headers.get("if-modified-since")
+    if ims and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+
+def _cache_key(request: Request, scope: str, version: str) -> tuple:
+    return (scope, version, request.url.path, request.url.query)
+
+
+def _respond(entry: CachedBody, headers: dict) -> Response:
+    return Response(entry.body, media_type=entry.media_type, headers={**entry.headers, **headers})
+
+
+def cached_response(
+    request: Request,
+    scope: str,
+    version: str,
+    updated_at: datetime | None,
+    render: Callable[[], CachedBody],
+) -> Response:
+    """304 if the client's copy is current, else the cached or freshly rendered body.
+
+    The version must be read before anything `render` loads, so a body is
+    never stored under a version newer than its contents.
+    """
+    headers = validators(scope, version, updated_at)
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    key = _cache_key(request, scope, version)
+    entry = response_cache.get(key) if RESPONSE_CACHE_BYTES > 0 else None
+    if entry is None:
+        entry = render()
+        if RESPONSE_CACHE_BYTES > 0:
+            response_cache.put(key, entry)
+    return _respond(entry, headers)
+
+
+async def cached_response_async(
+    request: Request,
+    scope: str,
+    version: str,
+    updated_at: datetime | None,
+    render: Callable[[], Awaitable[CachedBody]],
+) -> Response:
+    headers = validators(scope, version, updated_at)
+    if not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    key = _cache_key(request, scope, version)
+    entry = response_cache.get(key) if RESPONSE_CACHE_BYTES > 0 else None
+    if entry is None:
+        entry = await render()
+        if RESPONSE_CACHE_BYTES > 0:
+            response_cache.put(key, entry)
+    return _respond(entry, headers)
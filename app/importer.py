@@ -0,0 +1,375 @@
+import csv
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Iterator
+
+from sqlalchemy import func
+
+from app import models
+from app.bulk import BULK_INSERT_CHUNK_SIZE, insert_rows
+from app.db import SessionLocal
+from app.recording import BOOK_TYPES, normalize_book_type
+
+# Run sheet column layout shared by the paste box and file uploads:
+# 0 Instrument
+# 1 Vol/Pg
+# 2 Grantor
+# 3 Grantee
+# 4 Exec Date
+# 5 Filed Date
+# 6 Legal Desc
+# 7 Notes
+RUN_SHEET_COLUMNS = (
+    "Instrument",
+    "Vol/Pg",
+    "Grantor",
+    "Grantee",
+    "Exec Date",
+    "Filed Date",
+    "Legal Description",
+    "Notes",
+)
+HEADER_INSTRUMENTS = ("instrument", "instr", "document type")
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y")
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+IMPORT_JOBS_KEPT = 100
+
+
+def _parse_date_loose(s: str) -> date | None:
+    s = (s or "").strip()
+    if not s:
+        return None
+
+    # Try ISO first: YYYY-MM-DD
+    try:
+        return date.fromisoformat(s)
+    except Exception:
+        pass
+
+    # Try common US format: MM/DD/YYYY (or M/D/YYYY)
+    try:
+        return datetime.strptime(s, "%m/%d/%Y").date()
+    except Exception:
+        pass
+
+    # Try MM/DD/YY
+    try:
+        return datetime.strptime(s, "%m/%d/%y").date()
+    except Exception:
+        return None
+
+
+# "Inst. No. 2004-12345", "Instr 12345", "Doc #12345", "No. 12345", "#12345"
+_INSTRUMENT_NO = re.compile(
+    r"(?:\b(?:INST(?:R(?:UMENT)?)?|DOC(?:UMENT)?|NO)\b\.?\s*(?:NO\b\.?|NUMBER\b|#)?|#)\s*([A-Z0-9][A-Z0-9-]*)",
+    re.IGNORECASE,
+)
+# "Vol. 123, Pg. 45", "Bk 12 P 3"
+_LABELED_VOL_PG = re.compile(
+    r"\b(?:VOL(?:UME)?|BK|BOOK)\b\.?\s*([A-Z0-9]+)[\s,;]*\b(?:PGS?|PAGES?|P)\b\.?\s*([A-Z0-9]+)",
+    re.IGNORECASE,
+)
+# Words in front of the numbers: "OPR 1234/567", "Deed Records 45/100", "Vol 12/3"
+_BOOK_PREFIX = re.compile(r"^([A-Z][A-Z .&]*?)\s*(?=\d)", re.IGNORECASE)
+# Volume labels, not book types: "OPR Vol. 12/3", "V123/45"
+_VOLUME_LABEL = re.compile(r"\b(?:VOL(?:UME)?|V|BK|BOOK)\b\.?\s*$", re.IGNORECASE)
+
+
+def _book_type(prefix: str) -> str | None:
+    # Only a known book type (or its spelled-out name) counts as one
+    book_type = normalize_book_type(_VOLUME_LABEL.sub("", prefix.strip()))
+    return book_type if book_type in BOOK_TYPES else None
+
+
+def _split_vol_pg(volpg: str) -> tuple[str | None, str | None, str | None, str | None]:
+    """Split a Vol/Pg cell into (book_type, volume, page, instrument_number)."""
+    volpg = (volpg or "").strip()
+    if not volpg:
+        return None, None, None, None
+
+    instrument_number = None
+    m = _INSTRUMENT_NO.search(volpg)
+    if m:
+        instrument_number = m.group(1)
+        volpg = (volpg[:m.start()] + " " + volpg[m.end():]).strip(" ,;")
+
+    book_type = None
+    m = _LABELED_VOL_PG.search(volpg)
+    if m:
+        return _book_type(volpg[:m.start()]), m.group(1), m.group(2), instrument_number
+
+    m = _BOOK_PREFIX.match(volpg)
+    if m:
+        book_type = _book_type(m.group(1))
+        volpg = volpg[m.end():].strip()
+    if not volpg:
+        return book_type, None, None, instrument_number
+
+    # Allow "123/45", "123 / 45", "123 45", "123-45"
+    normalized = volpg.replace(" ", "").replace("-", "/")
+    if "/" in normalized:
+        parts = normalized.split("/", 1)
+        vol = parts[0].strip() or None
+        pg = parts[1].strip() or None
+        return book_type, vol, pg, instrument_number
+
+    # Fallback: split on whitespace if user pasted "123 45"
+    parts = (volpg or "").strip().split()
+    if len(parts) >= 2:
+        return book_type, parts[0].strip() or None, parts[1].strip() or None, instrument_number
+
+    # If only one token, treat as volume and leave page blank
+    return book_type, volpg.strip() or None, None, instrument_number
+
+
+def parse_recording_ref(volpg: str) -> dict:
+    """A Vol/Pg cell as a dict of book_type, volume, page and instrument_number."""
+    return dict(zip(("book_type", "volume", "page", "instrument_number"), _split_vol_pg(volpg)))
+
+
+class DateColumn:
+    """Parses one date column, settling on a format from the first non-empty cell.
+
+    A spreadsheet column almost always uses a single format, so the remaining
+    cells go through one strptime instead of the try-everything loose parser.
+    Cells that don't match the detected format still fall back to it.
+    """
+
+    def __init__(self):
+        self.fmt: str | None = None
+
+    def parse(self, value) -> date | None:
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+
+        s = (value or "").strip()
+        if not s:
+            return None
+
+        if self.fmt is None:
+            for fmt in DATE_FORMATS:
+                try:
+                    d = datetime.strptime(s, fmt).date()
+                except ValueError:
+                    continue
+                self.fmt = fmt
+                return d
+            return _parse_date_loose(s)
+
+        try:
+            return datetime.strptime(s, self.fmt).date()
+        except ValueError:
+            return _parse_date_loose(s)
+
+
+def _cell_str(value) -> str:
+    if value is None:
+        return ""
+    # Spreadsheets hand back volume/page numbers as floats
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+class RowParser:
+    """Turns run sheet cells into insert_rows() dicts, one DateColumn per date column."""
+
+    def __init__(self):
+        self.exec_dates = DateColumn()
+        self.filed_dates = DateColumn()
+
+    def parse(self, cols) -> dict | None:
+        # Expect at least 4 columns; full is 8
+        if len(cols) < 4:
+            return None
+
+        cells = list(cols[:8]) + [None] * (8 - min(len(cols), 8))
+        instrument = _cell_str(cells[0])
+        grantor = _cell_str(cells[2])
+        grantee = _cell_str(cells[3])
+
+        # Skip header row if user pasted headers
+        if instrument.lower() in HEADER_INSTRUMENTS:
+            return None
+
+        # Minimum required fields
+        if not instrument or not grantor or not grantee:
+            return None
+
+        book_type, volume, page, instrument_number = _split_vol_pg(_cell_str(cells[1]))
+        return {
+            "instrument": instrument,
+            "book_type": book_type,
+            "volume": volume,
+            "page": page,
+            "instrument_number": instrument_number,
+            "grantor": grantor,
+            "grantee": grantee,
+            "exec_date": self.exec_dates.parse(cells[4]),
+            "filed_date": self.filed_dates.parse(cells[5]),
+            "legal_description": _cell_str(cells[6]) or None,
+            "notes": _cell_str(cells[7]) or None,
+        }
+
+
+def next_row_order(db, project_id: str) -> int:
+    # Counts soft-deleted rows too, so restoring one can't land on a reused slot
+    max_order = (
+        db.query(func.max(models.RunSheetRow.row_order))
+        .filter(models.RunSheetRow.project_id == project_id)
+        .scalar()
+    )
+    return 10 if not max_order else int(max_order) + 10
+
+
+# -----------------------------
+# File readers
+# -----------------------------
+def _iter_delimited(raw, delimiter: str) -> Iterator[list[str]]:
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        for cols in csv.reader(text, delimiter=delimiter):
+            if any(c.strip() for c in cols):
+                yield cols
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(path: str) -> Iterator[tuple]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("XLSX import needs openpyxl installed")
+
+    # read_only streams rows from the sheet XML instead of building the workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for cols in wb.active.iter_rows(values_only=True):
+            if any(c not in (None, "") for c in cols):
+                yield cols
+    finally:
+        wb.close()
+
+
+def file_format(filename: str) -> str | None:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return {".csv": "csv", ".tsv": "tsv", ".txt": "tsv", ".xlsx": "xlsx"}.get(ext)
+
+
+# -----------------------------
+# Background jobs
+# -----------------------------
+class ImportJob:
+    def __init__(self, project_id: str, filename: str, fmt: str, path: str, size: int):
+        self.id = models.uuid_str()
+        self.project_id = project_id
+        self.filename = filename
+        self.fmt = fmt
+        self.path = path
+        self.size = size
+        self.status = "queued"
+        self.bytes_read = 0
+        self.processed = 0
+        self.imported = 0
+        self.skipped = 0
+        self.error: str | None = None
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+
+    def progress(self) -> dict:
+        done = self.status in ("done", "failed")
+        fraction = 1.0 if done else (self.bytes_read / self.size if self.size else 0.0)
+        return {
+            "id": self.id,
+            "project_id": self.project_id,
+            "filename": self.filename,
+            "status": self.status,
+            "progress": round(min(fraction, 1.0), 3),
+            "processed": self.processed,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "error": self.error,
+        }
+
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+_jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def get_job(job_id: str) -> ImportJob | None:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def start_import(project_id: str, filename: str, fmt: str, path: str, actor_id: str) -> ImportJob:
+    """Queue an uploaded file (already spooled to `path`) for import; the file is removed afterwards."""
+    job = ImportJob(project_id, filename, fmt, path, os.path.getsize(path))
+    with _jobs_lock:
+        _jobs[job.id] = job
+        while len(_jobs) > IMPORT_JOBS_KEPT:
+            _jobs.popitem(last=False)
+    _executor.submit(_run_import, job, actor_id)
+    return job
+
+
+def _write_batch(db, job: ImportJob, batch: list[dict], order: int, actor_id: str) -> int:
+    for r in batch:
+        r["row_order"] = order
+        order += 10
+    created, failed = insert_rows(db, job.project_id, batch, actor_id)
+    job.imported += len(created)
+    job.skipped += len(failed)
+    return order
+
+
+def _run_import(job: ImportJob, actor_id: str) -> None:
+    job.status = "running"
+    db = SessionLocal()
+    try:
+        order = next_row_order(db, job.project_id)
+        parser = RowParser()
+        batch: list[dict] = []
+
+        with open(job.path, "rb") as raw:
+            if job.fmt == "xlsx":
+                rows = _iter_xlsx(job.path)
+            else:
+                rows = _iter_delimited(raw, "," if job.fmt == "csv" else "\t")
+
+            for cols in rows:
+                job.processed += 1
+                row = parser.parse(cols)
+                if row is None:
+                    job.skipped += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= BULK_INSERT_CHUNK_SIZE:
+                    order = _write_batch(db, job, batch, order, actor_id)
+                    batch = []
+                    if job.fmt != "xlsx":
+                        job.bytes_read = raw.tell()
+
+        if batch:
+            _write_batch(db, job, batch, order, actor_id)
+        job.status = "done"
+    except Exception as e:
+        db.rollback()
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        db.close()
+        job.finished_at = time.time()
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
@@ -1,134 +1,507 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+import os
+from bisect import bisect_right
+from datetime import datetime
+from typing import Optional
+from urllib.parse import quote
+from fastapi import FastAPI, Depends, File, Form, HTTPException, Query, Response, UploadFile
+from fastapi.responses import FileResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from starlette.requests import Request
 from app.ui import router as ui_router
-from app.deps import get_db
-from app import models, schemas
+from app.auth import (
+    Actor,
+    LoginRequired,
+    admin_actor,
+    authenticate,
+    can_access,
+    create_session,
+    current_actor,
+    end_session,
+    end_user_sessions,
+    hash_password,
+    invalidate_access,
+    invalidate_user,
+    request_token,
+    require_project,
+    set_member,
+    visible_project_ids,
+)
+from app.bulk import BULK_INSERT_CHUNK_SIZE, UPSERT_KEY, BulkUpdateError, insert_rows, update_rows, upsert_key, upsert_rows
+from app.chain import project_chain
+from app.changes import project_saved, rows_committed, snapshot
+from app.db import DB_ASYNC
+from app.deps import get_db, get_read_db
+from app.exporter import EXPORT_FORMATS
+from app.httpcache import (
+    PROJECT_JSON,
+    PROJECTS_JSON,
+    PROJECTS_SCOPE,
+    ROWS_JSON,
+    cached_response,
+    json_body,
+    project_version,
+    projects_version,
+    rows_body,
+)
+from app.importer import parse_recording_ref
+from app.metrics import metrics_middleware, render as render_metrics
+from app.ordering import MoveConflict, MoveError, move_rows
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, row_fields, rows_page_values
+from app.scans import (
+    ScanError,
+    ingest as ingest_scan,
+    link as link_scan,
+    scan_project_ids,
+    scan_response,
+    store as scan_store,
+)
+from app.duplicates import DUPLICATE_MIN_SCORE, project_duplicates
+from app.parties import find_parties, party_rows
+from app.purge import schedule_purge
+from app.recording import lookup_refs
+from app.replica import read_session, replica_middleware
+from app.search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, search_rows
+from app.tracts import normalize_key, parse_legal, tract_projects, tract_rows
+from app import history, models, schemas
 
 app = FastAPI(title="Landman MVP API")
 app.include_router(ui_router)
+app.middleware("http")(metrics_middleware)
+# Keeps a client's reads on the primary just after it writes (READ_DATABASE_URL)
+app.middleware("http")(replica_middleware)
 
-# MVP: hard-coded actor for attribution.
-# Replace with real auth later.
-ACTOR_USER_ID = "11111111-1111-1111-1111-111111111111"
+# Archive long-deleted rows in the background, if ROW_PURGE_INTERVAL_HOURS is set
+schedule_purge()
+
+@app.exception_handler(LoginRequired)
+def login_required(request: Request, exc: LoginRequired):
+    return RedirectResponse(url=f"/ui/login?next={quote(exc.next_url, safe='')}", status_code=302)
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# -----------------------------
+# Auth
+# -----------------------------
+@app.post("/auth/login", response_model=schemas.SessionOut)
+def login(payload: schemas.LoginIn, db: Session = Depends(get_db)):
+    user = authenticate(db, payload.email, payload.password)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+
+    token, expires_at = create_session(db, user)
+    return {"token": token, "expires_at": expires_at, "user": user}
+
+@app.post("/auth/logout")
+def logout(request: Request, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    token = request_token(request)
+    if token:
+        end_session(db, token)
+    return {"ok": True}
+
+@app.get("/auth/me", response_model=schemas.UserOut)
+def me(actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    return db.get(models.User, actor.id)
+
+# -----------------------------
+# Users (admin)
+# -----------------------------
+@app.get("/users", response_model=list[schemas.UserOut])
+def list_users(actor: Actor = Depends(admin_actor), db: Session = Depends(get_db)):
+    return db.query(models.User).order_by(models.User.email).all()
+
+@app.post("/users", response_model=schemas.UserOut)
+def create_user(payload: schemas.UserCreate, actor: Actor = Depends(admin_actor), db: Session = Depends(get_db)):
+    if db.query(models.User.id).filter(models.User.email == payload.email).first():
+        raise HTTPException(status_code=409, detail="A user with that email already exists")
+
+    user = models.User(
+        email=payload.email,
+        name=payload.name,
+        global_role=payload.global_role,
+        password_hash=hash_password(payload.password),
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@app.patch("/users/{user_id}", response_model=schemas.UserOut)
+def patch_user(
+    user_id: str,
+    payload: schemas.UserPatch,
+    actor: Actor = Depends(admin_actor),
+    db: Session = Depends(get_db),
+):
+    user = db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    data = payload.model_dump(exclude_unset=True)
+    password = data.pop("password", None)
+    for k, v in data.items():
+        setattr(user, k, v)
+    if password is not None:
+        user.password_hash = hash_password(password)
+
+    # Deactivation and password changes end existing sessions; role changes
+    # only need the cached actor/access entries dropped
+    if password is not None or data.get("is_active") is False:
+        end_user_sessions(db, user_id)
+    db.commit()
+    invalidate_user(user_id)
+    db.refresh(user)
+    return user
+
 # -----------------------------
 # Projects
 # -----------------------------
 @app.post("/projects", response_model=schemas.ProjectOut)
-def create_project(payload: schemas.ProjectCreate, db: Session = Depends(get_db)):
-    # Ensure actor exists (helps catch missing seed)
-    actor = db.query(models.User).filter(models.User.id == ACTOR_USER_ID).first()
-    if not actor:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Seed user missing. Insert user id={ACTOR_USER_ID} into users table."
-        )
-
+def create_project(payload: schemas.ProjectCreate, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
     p = models.Project(
         name=payload.name,
         client_name=payload.client_name,
         jurisdiction=payload.jurisdiction,
-        created_by=ACTOR_USER_ID,
+        created_by=actor.id,
     )
     db.add(p)
+    db.flush()
+    # The creator owns the project
+    set_member(db, p.id, actor.id, "owner")
     db.commit()
+    project_saved(p.id)
     db.refresh(p)
     return p
 
 @app.get("/projects", response_model=list[schemas.ProjectOut])
-def list_projects(db: Session = Depends(get_db)):
-    return db.query(models.Project).order_by(models.Project.updated_at.desc()).all()
+def list_projects(request: Request, actor: Actor = Depends(current_actor), db: Session = Depends(get_read_db)):
+    project_ids = visible_project_ids(db, actor)
+
+    def render():
+        q = db.query(models.Project)
+        if project_ids is not None:
+            q = q.filter(models.Project.id.in_(project_ids))
+        return json_body(PROJECTS_JSON, q.order_by(models.Project.updated_at.desc()).all())
+
+    version = projects_version(db, project_ids, "all" if project_ids is None else actor.id)
+    return cached_response(request, PROJECTS_SCOPE, *version, render)
 
 @app.get("/projects/{project_id}", response_model=schemas.ProjectOut)
-def get_project(project_id: str, db: Session = Depends(get_db)):
+def get_project(project_id: str, request: Request, actor: Actor = Depends(current_actor), db: Session = Depends(get_read_db)):
+    require_project(db, actor, project_id)
+    version = project_version(db, project_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    def render():
+        p = db.query(models.Project).filter(models.Project.id == project_id).first()
+        return json_body(PROJECT_JSON, p)
+
+    return cached_response(request, project_id, *version, render)
+
+@app.patch("/projects/{project_id}", response_model=schemas.ProjectOut)
+def patch_project(
+    project_id: str,
+    payload: schemas.ProjectPatch,
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    data = payload.model_dump(exclude_unset=True)
+    # Moving a project through review/delivery is the owner's call
+    require_project(db, actor, project_id, "owner" if "status" in data else "editor")
     p = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not p:
         raise HTTPException(status_code=404, detail="Project not found")
+
+    if data.get("status") not in (None, p.status):
+        # Lets the run sheet be rebuilt as it stood at e.g. delivery
+        history.record_status(db, project_id, data["status"], actor.id)
+    for k, v in data.items():
+        if k != "status" or v is not None:
+            setattr(p, k, v)
+    db.commit()
+    project_saved(project_id)
+    db.refresh(p)
     return p
 
+@app.get("/projects/{project_id}/members", response_model=list[schemas.MemberOut])
+def list_members(project_id: str, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    require_project(db, actor, project_id)
+    return db.query(models.ProjectMember).filter(models.ProjectMember.project_id == project_id).all()
+
+@app.put("/projects/{project_id}/members/{user_id}", response_model=schemas.MemberOut)
+def put_member(
+    project_id: str,
+    user_id: str,
+    payload: schemas.MemberSet,
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    require_project(db, actor, project_id, "owner")
+    if not db.get(models.Project, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not db.get(models.User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    member = set_member(db, project_id, user_id, payload.role)
+    db.commit()
+    # The member's project list changes
+    project_saved(project_id)
+    db.refresh(member)
+    return member
+
+@app.delete("/projects/{project_id}/members/{user_id}")
+def delete_member(project_id: str, user_id: str, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    require_project(db, actor, project_id, "owner")
+    member = db.get(models.ProjectMember, (project_id, user_id))
+    if not member:
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    db.delete(member)
+    db.commit()
+    invalidate_access(user_id, project_id)
+    project_saved(project_id)
+    return {"ok": True}
+
 # -----------------------------
 # Run sheet rows
 # -----------------------------
 @app.get("/projects/{project_id}/rows", response_model=list[schemas.RunSheetRowOut])
-def list_rows(project_id: str, db: Session = Depends(get_db)):
+def list_rows(
+    project_id: str,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Return rows after this sort_key cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated row fields to return (default: all)"),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    require_project(db, actor, project_id)
+    try:
+        columns = row_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Ensure project exists; its version answers 304s without loading rows
+    version = project_version(db, project_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    def render():
+        rows, next_after = rows_page_values(db, project_id, limit, after, columns)
+        # Pass the cursor back in a header so the body stays a plain list of rows
+        headers = {"X-Next-After": next_after} if next_after is not None else None
+        return rows_body(rows, headers)
+
+    return cached_response(request, project_id, *version, render)
+
+@app.get("/projects/{project_id}/rows/export")
+def export_rows(
+    project_id: str,
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    require_project(db, actor, project_id)
     # Ensure project exists
     p = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not p:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    return (
-        db.query(models.RunSheetRow)
-        .filter(and_(
-            models.RunSheetRow.project_id == project_id,
-            models.RunSheetRow.is_deleted == False
-        ))
-        .order_by(models.RunSheetRow.row_order.asc())
-        .all()
+    # Same column layout as the paste/file importer, so exports re-import cleanly
+    media_type, stream = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        stream(project_id, lambda: read_session(request)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="run-sheet-{project_id}.{format}"'},
     )
 
-@app.post("/projects/{project_id}/rows/bulk", response_model=list[schemas.RunSheetRowOut])
-def bulk_create_rows(project_id: str, payload: schemas.BulkRowsCreate, db: Session = Depends(get_db)):
+@app.get("/projects/{project_id}/rows/as-of", response_model=list[schemas.RunSheetRowOut])
+def list_rows_as_of(
+    project_id: str,
+    at: Optional[datetime] = Query(None, description="Point in time (ISO 8601; UTC unless an offset is given)"),
+    status: Optional[str] = Query(
+        None, pattern="^(draft|in_review|delivered|archived)$",
+        description="Instead of `at`: when the project last moved to this status",
+    ),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Return rows after this sort_key cursor"),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    require_project(db, actor, project_id)
+    if (at is None) == (status is None):
+        raise HTTPException(status_code=400, detail="Give exactly one of at or status")
+    if status is not None:
+        at = history.status_changed_at(db, project_id, status)
+        if at is None:
+            raise HTTPException(status_code=404, detail=f"Project has never been {status}")
+    else:
+        at = history.naive_utc(at)
+
+    # Rebuilt from the nearest snapshot plus later history, then paged like list_rows
+    rows = history.rows_as_of(db, project_id, at)
+    start = bisect_right(rows, after, key=lambda r: r["sort_key"]) if after is not None else 0
+    page = rows[start:start + limit]
+    headers = {"X-As-Of": at.isoformat()}
+    if start + limit < len(rows):
+        headers["X-Next-After"] = page[-1]["sort_key"]
+    entry = json_body(ROWS_JSON, page, headers)
+    return Response(entry.body, media_type=entry.media_type, headers=entry.headers)
+
+@app.get("/rows/{row_id}/history", response_model=list[schemas.RowHistoryOut])
+def row_history(row_id: str, actor: Actor = Depends(current_actor), db: Session = Depends(get_read_db)):
+    h = models.RowHistory
+    entries = db.query(h).filter(h.row_id == row_id).order_by(h.id).all()
+    if not entries or not can_access(db, actor, entries[0].project_id):
+        raise HTTPException(status_code=404, detail="Row not found")
+    return entries
+
+@app.get("/projects/{project_id}/duplicates", response_model=list[schemas.DuplicateRow])
+def list_duplicates(
+    project_id: str,
+    across_projects: bool = Query(False, description="Also match rows in other projects you can see"),
+    min_score: float = Query(DUPLICATE_MIN_SCORE, ge=0, le=1),
+    limit: int = Query(500, ge=1, le=5000),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    require_project(db, actor, project_id)
+    others = visible_project_ids(db, actor) if across_projects else []
+    pairs = project_duplicates(db, project_id, others, min_score, limit)
+    rows = {
+        r.id: r
+        for r in db.query(models.RunSheetRow).filter(
+            models.RunSheetRow.id.in_({i for a, b, _ in pairs for i in (a, b)})
+        )
+    }
+    return [{"row": rows[a], "duplicate_of": rows[b], "score": round(score, 3)} for a, b, score in pairs]
+
+@app.post("/projects/{project_id}/rows/bulk", response_model=schemas.BulkRowsResult)
+def bulk_create_rows(
+    project_id: str,
+    payload: schemas.BulkRowsCreate,
+    chunk_size: int = Query(BULK_INSERT_CHUNK_SIZE, ge=1, le=10000),
+    skip_duplicates: bool = Query(False, description="Leave out rows that duplicate a row already in the project"),
+    upsert: bool = Query(False, description="Update live rows with the same natural key instead of adding new ones"),
+    key: Optional[str] = Query(None, description="Natural key columns for upsert, comma-separated (default UPSERT_KEY)"),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    require_project(db, actor, project_id, "editor")
     # Ensure project exists
     p = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not p:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    # Ensure actor exists
-    actor = db.query(models.User).filter(models.User.id == ACTOR_USER_ID).first()
-    if not actor:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Seed user missing. Insert user id={ACTOR_USER_ID} into users table."
+    if upsert:
+        try:
+            columns = upsert_key(key.split(",")) if key else UPSERT_KEY
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        created, updated, unchanged, failed = upsert_rows(
+            db,
+            project_id,
+            [r.model_dump() for r in payload.rows],
+            actor.id,
+            key=columns,
+            chunk_size=chunk_size,
+            skip_duplicates=skip_duplicates,
         )
+        return {"created": created, "updated": updated, "unchanged": unchanged, "failed": failed}
+
+    # Multi-row INSERTs committed per chunk; rows that collide on
+    # uq_project_row_order are reported back instead of failing the batch.
+    created, failed = insert_rows(
+        db,
+        project_id,
+        [r.model_dump() for r in payload.rows],
+        actor.id,
+        chunk_size=chunk_size,
+        skip_duplicates=skip_duplicates,
+    )
+    return {"created": created, "failed": failed}
+
+@app.patch("/projects/{project_id}/rows", response_model=schemas.BulkRowsPatchResult)
+def patch_rows(
+    project_id: str,
+    payload: schemas.BulkRowsPatch,
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    require_project(db, actor, project_id, "editor")
+    # Ensure project exists
+    p = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not p:
+        raise HTTPException(status_code=404, detail="Project not found")
 
-    created: list[models.RunSheetRow] = []
-    for r in payload.rows:
-        row = models.RunSheetRow(
-            project_id=project_id,
-            row_order=r.row_order,
-            instrument=r.instrument,
-            volume=r.volume,
-            page=r.page,
-            grantor=r.grantor,
-            grantee=r.grantee,
-            exec_date=r.exec_date,
-            filed_date=r.filed_date,
-            legal_description=r.legal_description,
-            notes=r.notes,
-            created_by=ACTOR_USER_ID,
-            updated_by=ACTOR_USER_ID,
-            is_deleted=False,
+    # One transaction, one UPDATE; stale or missing rows come back as conflicts
+    try:
+        updated, unchanged, conflicts = update_rows(
+            db,
+            project_id,
+            [c.model_dump(exclude_unset=True) for c in payload.changes],
+            actor.id,
         )
-        db.add(row)
-        created.append(row)
+    except BulkUpdateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"updated": updated, "unchanged": unchanged, "conflicts": conflicts}
+
+@app.post("/projects/{project_id}/rows/move", response_model=list[schemas.RunSheetRowOut])
+def move_project_rows(
+    project_id: str,
+    payload: schemas.RowsMove,
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    require_project(db, actor, project_id, "editor")
+    # Ensure project exists
+    p = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not p:
+        raise HTTPException(status_code=404, detail="Project not found")
 
+    # Only the moved rows get new sort keys; neighbours are untouched
     try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        # Most common MVP error: duplicate row_order per project (unique constraint)
-        raise HTTPException(status_code=400, detail=f"Insert failed: {str(e)}")
+        move_rows(db, project_id, payload.row_ids, actor.id, payload.after_id, payload.before_id)
+    except MoveConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except MoveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    for row in created:
-        db.refresh(row)
-    return created
+    rows = (
+        db.query(models.RunSheetRow)
+        .filter(models.RunSheetRow.id.in_(payload.row_ids))
+        .order_by(models.RunSheetRow.sort_key.asc())
+        .all()
+    )
+    # A move changes no summary stat, so the rows are their own "before"
+    rows_committed(project_id, rows, before=snapshot(rows))
+    return rows
 
 @app.patch("/rows/{row_id}", response_model=schemas.RunSheetRowOut)
-def patch_row(row_id: str, payload: schemas.RunSheetRowPatch, db: Session = Depends(get_db)):
+def patch_row(
+    row_id: str,
+    payload: schemas.RunSheetRowPatch,
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
     row = db.query(models.RunSheetRow).filter(models.RunSheetRow.id == row_id).first()
-    if not row:
+    if not row or not can_access(db, actor, row.project_id):
         raise HTTPException(status_code=404, detail="Row not found")
+    require_project(db, actor, row.project_id, "editor")
 
+    before = snapshot([row])
     data = payload.model_dump(exclude_unset=True)
     for k, v in data.items():
         setattr(row, k, v)
 
-    row.updated_by = ACTOR_USER_ID
+    row.updated_by = actor.id
 
     try:
         db.commit()
@@ -137,17 +510,20 @@ def patch_row(row_id: str, payload: schemas.RunSheetRowPatch, db: Session = Depe
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
 
     db.refresh(row)
+    rows_committed(row.project_id, [row], before)
     return row
 
 @app.delete("/rows/{row_id}")
-def soft_delete_row(row_id: str, db: Session = Depends(get_db)):
+def soft_delete_row(row_id: str, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
     row = db.query(models.RunSheetRow).filter(models.RunSheetRow.id == row_id).first()
-    if not row:
+    if not row or not can_access(db, actor, row.project_id):
         raise HTTPException(status_code=404, detail="Row not found")
+    require_project(db, actor, row.project_id, "editor")
 
+    before = snapshot([row])
     row.is_deleted = True
-    row.deleted_by = ACTOR_USER_ID
-    row.updated_by = ACTOR_USER_ID
+    row.deleted_by = actor.id
+    row.updated_by = actor.id
 
     try:
         db.commit()
@@ -155,4 +531,241 @@ def soft_delete_row(row_id: str, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
+    rows_committed(row.project_id, [row], before)
+    return {"ok": True}
+
+@app.get("/projects/{project_id}/chain", response_model=schemas.ChainAnalysis)
+def chain_of_title(project_id: str, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    require_project(db, actor, project_id)
+    # Ensure project exists
+    p = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not p:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    return project_chain(db, project_id)
+
+# -----------------------------
+# Scans
+# -----------------------------
+def _scan_row(db: Session, actor: Actor, row_id: str, role: str = "viewer") -> models.RunSheetRow:
+    row = db.get(models.RunSheetRow, row_id)
+    if not row or not can_access(db, actor, row.project_id):
+        raise HTTPException(status_code=404, detail="Row not found")
+    require_project(db, actor, row.project_id, role)
+    return row
+
+def _readable_scan(db: Session, actor: Actor, sha256: str) -> models.Scan:
+    # Readable through any row that cites it, or by whoever uploaded it
+    scan = db.get(models.Scan, sha256)
+    if scan is None or not (
+        actor.is_admin
+        or scan.created_by == actor.id
+        or any(can_access(db, actor, pid) for pid in scan_project_ids(db, sha256))
+    ):
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return scan
+
+@app.get("/rows/{row_id}/scans", response_model=list[schemas.RowScanOut])
+def list_row_scans(row_id: str, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    _scan_row(db, actor, row_id)
+    return (
+        db.query(models.RowScan)
+        .options(joinedload(models.RowScan.scan))
+        .filter(models.RowScan.row_id == row_id)
+        .order_by(models.RowScan.created_at)
+        .all()
+    )
+
+@app.post("/rows/{row_id}/scans", response_model=schemas.RowScanOut)
+def upload_row_scan(
+    row_id: str,
+    file: UploadFile = File(...),
+    label: str = Form(""),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    row = _scan_row(db, actor, row_id, "editor")
+    # Identical bytes already stored are linked, not stored again
+    try:
+        scan = ingest_scan(db, file.file, file.filename, actor.id)
+    except ScanError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    row_scan = link_scan(db, row, scan, actor.id, label.strip() or file.filename)
+    db.commit()
+    # The run sheet page lists each row's scans
+    project_saved(row.project_id)
+    db.refresh(row_scan)
+    return row_scan
+
+@app.put("/rows/{row_id}/scans/{sha256}", response_model=schemas.RowScanOut)
+def link_row_scan(
+    row_id: str,
+    sha256: str,
+    label: str = Query(""),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    row = _scan_row(db, actor, row_id, "editor")
+    scan = _readable_scan(db, actor, sha256)
+    row_scan = link_scan(db, row, scan, actor.id, label.strip() or None)
+    db.commit()
+    project_saved(row.project_id)
+    db.refresh(row_scan)
+    return row_scan
+
+@app.delete("/rows/{row_id}/scans/{sha256}")
+def unlink_row_scan(row_id: str, sha256: str, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    row = _scan_row(db, actor, row_id, "editor")
+    row_scan = db.get(models.RowScan, (row_id, sha256))
+    if not row_scan:
+        raise HTTPException(status_code=404, detail="Scan not linked to this row")
+
+    # The blob stays; other rows may cite it
+    db.delete(row_scan)
+    db.commit()
+    project_saved(row.project_id)
     return {"ok": True}
+
+@app.get("/scans/{sha256}")
+def get_scan(sha256: str, request: Request, actor: Actor = Depends(current_actor), db: Session = Depends(get_db)):
+    return scan_response(request, _readable_scan(db, actor, sha256))
+
+@app.get("/scans/{sha256}/pages/{page}/thumb")
+def get_scan_thumb(
+    sha256: str,
+    page: int,
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_db),
+):
+    _readable_scan(db, actor, sha256)
+    path = scan_store.thumb_path(sha256, page)
+    if page < 1 or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+# -----------------------------
+# Search
+# -----------------------------
+@app.get("/search/rows", response_model=schemas.SearchResults)
+def search(
+    q: str = Query(..., min_length=1, description="Grantor, grantee, legal description or notes terms"),
+    project_id: Optional[str] = None,
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    hits, has_more = search_rows(
+        db, q, limit=limit, offset=offset, project_id=project_id,
+        project_ids=visible_project_ids(db, actor),
+    )
+    return {"hits": hits, "next_offset": offset + limit if has_more else None}
+
+# -----------------------------
+# Parties
+# -----------------------------
+@app.get("/parties", response_model=list[schemas.PartyOut])
+def lookup_parties(
+    q: str = Query(..., min_length=1, description="Party name, in any order or spelling"),
+    limit: int = Query(20, ge=1, le=100),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    return [
+        {"id": p.id, "name": p.name, "normalized": p.normalized, "score": round(score, 3)}
+        for p, score in find_parties(db, q, limit, project_ids=visible_project_ids(db, actor))
+    ]
+
+@app.get("/parties/{party_id}/rows", response_model=schemas.PartyRows)
+def list_party_rows(
+    party_id: str,
+    role: Optional[str] = Query(None, pattern="^(grantor|grantee)$"),
+    limit: int = Query(100, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    party = db.get(models.Party, party_id)
+    if not party:
+        raise HTTPException(status_code=404, detail="Party not found")
+    project_ids = visible_project_ids(db, actor)
+    rows, has_more = party_rows(db, party_id, project_ids=project_ids, role=role, limit=limit, offset=offset)
+    if not rows and offset == 0 and project_ids is not None and not party_rows(db, party_id, project_ids, limit=1)[0]:
+        # Named only in projects the caller can't see
+        raise HTTPException(status_code=404, detail="Party not found")
+    return {"party": party, "rows": rows, "next_offset": offset + limit if has_more else None}
+
+# -----------------------------
+# Recording references
+# -----------------------------
+@app.post("/recording-refs/lookup", response_model=list[schemas.RecordingRefMatches])
+def lookup_recording_refs(
+    payload: schemas.RecordingRefLookup,
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    refs = []
+    for ref in payload.refs:
+        # Explicit fields win over what's parsed from text
+        parsed = parse_recording_ref(ref.text) if ref.text else {}
+        parsed.update(ref.model_dump(exclude={"text"}, exclude_none=True))
+        refs.append(parsed)
+    matches = lookup_refs(db, refs, project_ids=visible_project_ids(db, actor))
+    return [{"index": n, "matches": hits} for n, hits in enumerate(matches)]
+
+# -----------------------------
+# Tracts
+# -----------------------------
+def tract_query(
+    q: Optional[str] = Query(None, description='Legal description, e.g. "Section 12, Block 4, A-123" (first tract)'),
+    survey: Optional[str] = None,
+    abstract: Optional[str] = None,
+    section: Optional[str] = None,
+    township: Optional[str] = Query(None, description='e.g. "4N"'),
+    range_: Optional[str] = Query(None, alias="range", description='e.g. "5W"'),
+    block: Optional[str] = None,
+    lot: Optional[str] = None,
+) -> dict:
+    # Normalized tract keys from q and/or the fields; the fields win
+    keys = {}
+    tracts = parse_legal(q) if q else []
+    if tracts:
+        keys = {k: v for k, v in tracts[0].items() if v is not None and k != "acres"}
+    given = {"survey": survey, "abstract": abstract, "section": section, "township": township,
+             "rge": range_, "block": block, "lot": lot}
+    for k, v in given.items():
+        v = normalize_key(k, v)
+        if v:
+            keys[k] = v
+    if not keys:
+        raise HTTPException(status_code=400, detail="Give q or at least one tract field")
+    return keys
+
+def _tract_out(keys: dict) -> dict:
+    return {("range" if k == "rge" else k): v for k, v in keys.items()}
+
+@app.get("/tracts/rows", response_model=schemas.TractRows)
+def list_tract_rows(
+    keys: dict = Depends(tract_query),
+    limit: int = Query(100, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    rows, has_more = tract_rows(db, keys, project_ids=visible_project_ids(db, actor), limit=limit, offset=offset)
+    return {"tract": _tract_out(keys), "rows": rows, "next_offset": offset + limit if has_more else None}
+
+@app.get("/tracts/projects", response_model=schemas.TractProjects)
+def list_tract_projects(
+    keys: dict = Depends(tract_query),
+    actor: Actor = Depends(current_actor),
+    db: Session = Depends(get_read_db),
+):
+    projects = tract_projects(db, keys, project_ids=visible_project_ids(db, actor))
+    return {"tract": _tract_out(keys), "projects": projects}
+
+# Async handlers replace the project/row endpoints above when DB_ASYNC=1
+if DB_ASYNC:
+    from app.api_async import use_async_routes
+    use_async_routes(app)
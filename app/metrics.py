@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.requests import Request
+
+# Query timing, pool and per-route metrics, rendered in Prometheus text
+# format by GET /metrics. Kept in-process with no client library; each
+# worker process reports its own numbers.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+REQUEST_QUERY_WARN = int(os.getenv("REQUEST_QUERY_WARN", "50"))
+
+slow_log = logging.getLogger("app.sql.slow")
+log = logging.getLogger("app.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000, 5000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.values: dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.buckets = buckets
+        self.series: dict[tuple, list] = {}   # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        with self.lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, s in sorted(self.series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, s):
+                    cumulative += n
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {s[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {s[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {s[-1]}")
+        return lines
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "SQL statements issued per HTTP request.", ("method", "route"), COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram("db_time_per_request_seconds", "Time spent in SQL per HTTP request.", ("method", "route"))
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency.", ("engine",))
+SLOW_QUERIES = Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.", ("engine",))
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("engine",))
+POOL_OVERFLOW_OPENED = Counter("db_pool_overflow_connections_total", "Connections opened beyond pool_size.", ("engine",))
+
+_engines: dict[str, Engine] = {}
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Set by the middleware; sync handlers run in a copied context, so they see
+# (and mutate) the same RequestStats object.
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+# -----------------------------
+# Pool
+# -----------------------------
+class _TimedCheckout:
+    # QueuePool._do_get blocks while the pool is exhausted; time it.
+    def _do_get(self):
+        t0 = time.perf_counter()
+        overflow_before = self.overflow()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - t0, self._metrics_name)
+            if self.overflow() > overflow_before and self.overflow() > 0:
+                POOL_OVERFLOW_OPENED.inc(self._metrics_name)
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    _metrics_name = "primary"
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    _metrics_name = "primary_async"
+
+
+def pool_options() -> dict:
+    """create_engine() pool settings from DB_POOL_* environment variables."""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Time every statement on `engine` and expose its pool gauges under `name`."""
+    _engines[name] = engine
+    if isinstance(engine.pool, _TimedCheckout):
+        engine.pool._metrics_name = name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        QUERY_LATENCY.observe(elapsed, name)
+
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc(name)
+            slow_log.warning("slow query (%.1f ms) on %s: %s", elapsed * 1000, name, " ".join(statement.split())[:1000])
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        # Keep the start-time stack balanced when a statement fails
+        starts = ctx.connection.info.get("query_start") if ctx.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+async def metrics_middleware(request: Request, call_next):
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - t0
+        _request_stats.reset(token)
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.inc(request.method, path, str(status))
+        HTTP_LATENCY.observe(elapsed, request.method, path)
+        REQUEST_QUERIES.observe(stats.queries, request.method, path)
+        REQUEST_DB_TIME.observe(stats.db_seconds, request.method, path)
+        if stats.queries >= REQUEST_QUERY_WARN:
+            log.warning("%s %s issued %d queries (%.1f ms in SQL)", request.method, path, stats.queries, stats.db_seconds * 1000)
+
+    response.headers["Server-Timing"] = f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'
+    return response
+
+
+def _pool_gauges() -> list[str]:
+    gauges = (
+        ("db_pool_size", "Configured pool size.", lambda p: p.size()),
+        ("db_pool_checked_out", "Connections currently checked out.", lambda p: p.checkedout()),
+        ("db_pool_checked_in", "Idle connections in the pool.", lambda p: p.checkedin()),
+        ("db_pool_overflow", "Connections open beyond pool_size (negative while below it).", lambda p: p.overflow()),
+    )
+    lines = []
+    for metric, help, read in gauges:
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} gauge"]
+        for name, engine in _engines.items():
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                lines.append(f'{metric}{{engine="{name}"}} {read(pool)}')
+    return lines
+
+
+def render() -> str:
+    lines: list[str] = []
+    for metric in (
+        HTTP_REQUESTS,
+        HTTP_LATENCY,
+        REQUEST_QUERIES,
+        REQUEST_DB_TIME,
+        QUERY_LATENCY,
+        SLOW_QUERIES,
+        POOL_WAIT,
+        POOL_OVERFLOW_OPENED,
+    ):
+        lines += metric.render()
+    lines += _pool_gauges()
+    return "\n".join(lines) + "\n"
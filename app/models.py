@@ -1,16 +1,24 @@
 import uuid
+from datetime import datetime, timezone
 from sqlalchemy import (
     Column,
     String,
     Enum,
     Boolean,
     Integer,
+    BigInteger,
+    Computed,
     Date,
     Text,
     ForeignKey,
     TIMESTAMP,
+    JSON,
+    LargeBinary,
+    Numeric,
     func,
     UniqueConstraint,
+    event,
+    inspect,
 )
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -37,6 +45,17 @@ class User(Base):
         onupdate=func.current_timestamp(),
     )
 
+class AuthSession(Base):
+    # Login sessions / API tokens; only a SHA-256 of the token is stored (app/auth.py)
+    __tablename__ = "auth_sessions"
+
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+    expires_at = Column(TIMESTAMP, nullable=False)
+
+    user = relationship("User")
+
 class Project(Base):
     __tablename__ = "projects"
 
@@ -45,6 +64,15 @@ class Project(Base):
     client_name = Column(String(255))
     jurisdiction = Column(String(255))
     status = Column(Enum("draft", "in_review", "delivered", "archived"), nullable=False, default="draft")
+    # Bumped after every committed write to the project or its rows (ETags)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    # Summary of live rows, kept current by app/changes.py on every row write
+    row_count = Column(Integer, nullable=False, default=0, server_default="0")
+    min_filed_date = Column(Date)
+    max_filed_date = Column(Date)
+    last_edited_at = Column(TIMESTAMP)
+    last_edited_by = Column(String(36), ForeignKey("users.id"))
 
     created_by = Column(String(36), ForeignKey("users.id"), nullable=False)
 
@@ -57,21 +85,43 @@ class Project(Base):
     )
 
     rows = relationship("RunSheetRow", back_populates="project")
+    members = relationship("ProjectMember", back_populates="project", cascade="all, delete-orphan")
+    last_editor = relationship("User", foreign_keys=[last_edited_by])
+
+class ProjectMember(Base):
+    # Per-project access for non-admin users: viewer < editor < owner
+    __tablename__ = "project_members"
+
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    role = Column(Enum("viewer", "editor", "owner"), nullable=False, default="editor")
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+
+    project = relationship("Project", back_populates="members")
+    user = relationship("User")
 
 class RunSheetRow(Base):
     __tablename__ = "run_sheet_rows"
     __table_args__ = (
-        UniqueConstraint("project_id", "row_order", name="uq_project_row_order"),
+        # Live rows only (is_live is NULL once deleted): deleting frees the slot
+        UniqueConstraint("project_id", "row_order", "is_live", name="uq_project_row_order"),
+        UniqueConstraint("project_id", "sort_key", "is_live", name="uq_project_sort_key"),
     )
 
     id = Column(String(36), primary_key=True, default=uuid_str)
     project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
 
     row_order = Column(Integer, nullable=False)
+    # Position in the run sheet (lexicographic); see app/ordering.py
+    sort_key = Column(String(255), nullable=False)
 
     instrument = Column(String(255), nullable=False)
+    # Recording reference (app/recording.py): book type (OPR, DR...), volume
+    # and page, and/or the clerk's instrument number
+    book_type = Column(String(20))
     volume = Column(String(50))
     page = Column(String(50))
+    instrument_number = Column(String(50))
     grantor = Column(String(255), nullable=False)
     grantee = Column(String(255), nullable=False)
     exec_date = Column(Date)
@@ -89,9 +139,201 @@ class RunSheetRow(Base):
         server_default=func.current_timestamp(),
         onupdate=func.current_timestamp(),
     )
+    # Optimistic concurrency: ORM flushes check and bump it; Core writers bump it themselves
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     is_deleted = Column(Boolean, nullable=False, default=False)
     deleted_by = Column(String(36), ForeignKey("users.id"))
     deleted_at = Column(TIMESTAMP)
+    # Duplicate detection block (app/duplicates.py); kept current on every write
+    dup_key = Column(String(40))
+    # Normalized volume / page / instrument_number for reference lookups; likewise
+    volume_key = Column(String(50))
+    page_key = Column(String(50))
+    instrument_key = Column(String(50))
+    # 1 for live rows, NULL for deleted ones; generated by the database
+    is_live = Column(Integer, Computed("CASE WHEN is_deleted THEN NULL ELSE 1 END"))
 
     project = relationship("Project", back_populates="rows")
+
+    __mapper_args__ = {"version_id_col": version}
+
+@event.listens_for(RunSheetRow.row_order, "set")
+def _place_by_row_order(target, value, oldvalue, initiator):
+    # Setting a new row_order puts the row at that number, as before sort keys
+    if value is not None and value != oldvalue:
+        from app.ordering import row_order_key
+        target.sort_key = row_order_key(value)
+
+@event.listens_for(RunSheetRow.is_deleted, "set")
+def _stamp_deleted_at(target, value, oldvalue, initiator):
+    # deleted_at drives the purge job (app/purge.py)
+    if value != oldvalue:
+        target.deleted_at = datetime.now(timezone.utc).replace(tzinfo=None) if value else None
+
+DUP_KEY_COLUMNS = ("volume", "page", "instrument", "filed_date")
+
+REF_KEY_COLUMNS = ("volume", "page", "instrument_number")
+
+@event.listens_for(RunSheetRow, "before_insert")
+@event.listens_for(RunSheetRow, "before_update")
+def _set_derived_keys(mapper, connection, target):
+    state = inspect(target)
+    new = state.key is None
+    if new or any(state.attrs[k].history.has_changes() for k in DUP_KEY_COLUMNS):
+        from app.duplicates import block_key
+        target.dup_key = block_key({k: getattr(target, k) for k in DUP_KEY_COLUMNS})
+    if new or any(state.attrs[k].history.has_changes() for k in REF_KEY_COLUMNS):
+        from app.recording import ref_keys
+        for k, v in ref_keys({k: getattr(target, k) for k in REF_KEY_COLUMNS}).items():
+            setattr(target, k, v)
+
+class Party(Base):
+    # One per distinct normalized grantor/grantee name (app/parties.py)
+    __tablename__ = "parties"
+
+    id = Column(String(36), primary_key=True, default=uuid_str)
+    # As first seen in a row
+    name = Column(String(255), nullable=False)
+    normalized = Column(String(255), unique=True, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+
+class PartyTrigram(Base):
+    # Inverted trigram index over parties.normalized, for fuzzy lookup
+    __tablename__ = "party_trigrams"
+
+    trigram = Column(String(3), primary_key=True)
+    party_id = Column(String(36), ForeignKey("parties.id", ondelete="CASCADE"), primary_key=True)
+
+class RowParty(Base):
+    __tablename__ = "row_parties"
+
+    row_id = Column(String(36), ForeignKey("run_sheet_rows.id", ondelete="CASCADE"), primary_key=True)
+    role = Column(Enum("grantor", "grantee"), primary_key=True)
+    # Order within the cell when it names several parties (";"-separated)
+    position = Column(Integer, primary_key=True)
+    party_id = Column(String(36), ForeignKey("parties.id"), nullable=False)
+
+class RowTract(Base):
+    # Tract keys parsed from a row's legal description (app/tracts.py), one per tract
+    __tablename__ = "row_tracts"
+
+    row_id = Column(String(36), ForeignKey("run_sheet_rows.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    survey = Column(String(100))
+    abstract = Column(String(20))
+    section = Column(String(20))
+    township = Column(String(10))
+    # Range ("5W"); RANGE is a reserved word in MySQL
+    rge = Column(String(10))
+    block = Column(String(20))
+    lot = Column(String(20))
+    acres = Column(Numeric(12, 4))
+
+class RunSheetRowArchive(Base):
+    # Long-deleted rows moved out of run_sheet_rows by app/purge.py
+    __tablename__ = "run_sheet_rows_archive"
+
+    id = Column(String(36), primary_key=True)
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    row_order = Column(Integer, nullable=False)
+    sort_key = Column(String(255), nullable=False)
+    instrument = Column(String(255), nullable=False)
+    book_type = Column(String(20))
+    volume = Column(String(50))
+    page = Column(String(50))
+    instrument_number = Column(String(50))
+    grantor = Column(String(255), nullable=False)
+    grantee = Column(String(255), nullable=False)
+    exec_date = Column(Date)
+    filed_date = Column(Date)
+    legal_description = Column(Text)
+    notes = Column(Text)
+    created_by = Column(String(36), nullable=False)
+    updated_by = Column(String(36), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False)
+    version = Column(Integer, nullable=False)
+    is_deleted = Column(Boolean, nullable=False)
+    deleted_by = Column(String(36))
+    deleted_at = Column(TIMESTAMP)
+    dup_key = Column(String(40))
+    volume_key = Column(String(50))
+    page_key = Column(String(50))
+    instrument_key = Column(String(50))
+    archived_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+
+# Autoincrement ids; SQLite only autoincrements INTEGER primary keys
+HistoryId = BigInteger().with_variant(Integer, "sqlite")
+
+class RowHistory(Base):
+    # Append-only log of row writes (app/history.py). No FK on row_id: the
+    # log outlives purged rows.
+    __tablename__ = "row_history"
+
+    id = Column(HistoryId, primary_key=True, autoincrement=True)
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    row_id = Column(String(36), nullable=False)
+    op = Column(Enum("insert", "update", "delete", "restore"), nullable=False)
+    changed_at = Column(TIMESTAMP, nullable=False)
+    changed_by = Column(String(36), ForeignKey("users.id"))
+    # Full row for inserts, changed columns otherwise (dates as ISO strings)
+    changes = Column(JSON, nullable=False)
+
+class HistorySnapshot(Base):
+    # Whole run sheet as of row_history entry `through_id`, stored in chunks
+    __tablename__ = "history_snapshots"
+
+    id = Column(HistoryId, primary_key=True, autoincrement=True)
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    through_id = Column(BigInteger, nullable=False)
+    through_at = Column(TIMESTAMP, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+
+class HistorySnapshotChunk(Base):
+    __tablename__ = "history_snapshot_chunks"
+
+    snapshot_id = Column(BigInteger, ForeignKey("history_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    chunk = Column(Integer, primary_key=True)
+    # zlib-compressed JSON list of rows
+    data = Column(LargeBinary, nullable=False)
+
+class ProjectStatusChange(Base):
+    __tablename__ = "project_status_changes"
+
+    id = Column(HistoryId, primary_key=True, autoincrement=True)
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    status = Column(Enum("draft", "in_review", "delivered", "archived"), nullable=False)
+    changed_at = Column(TIMESTAMP, nullable=False)
+    changed_by = Column(String(36), ForeignKey("users.id"), nullable=False)
+
+class Scan(Base):
+    # A stored document scan, keyed by the SHA-256 of its bytes (app/scans.py)
+    __tablename__ = "scans"
+
+    sha256 = Column(String(64), primary_key=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=False)
+    # Name it was first uploaded under; each link has its own label
+    filename = Column(String(255), nullable=False)
+    page_count = Column(Integer)
+    thumb_status = Column(
+        Enum("pending", "done", "failed", "unsupported"), nullable=False, default="pending", server_default="pending"
+    )
+
+    created_by = Column(String(36), ForeignKey("users.id"), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+
+class RowScan(Base):
+    # Many-to-many: a row cites several scans, a scan backs rows in many projects
+    __tablename__ = "row_scans"
+
+    row_id = Column(String(36), ForeignKey("run_sheet_rows.id", ondelete="CASCADE"), primary_key=True)
+    scan_sha256 = Column(String(64), ForeignKey("scans.sha256"), primary_key=True)
+    label = Column(String(255), nullable=False)
+
+    created_by = Column(String(36), ForeignKey("users.id"), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+
+    scan = relationship("Scan")
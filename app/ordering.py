@@ -0,0 +1,305 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import history, models
+from app.changes import project_rewritten
+from app.db import SessionLocal
+
+# Row position is the lexicographic sort_key, not row_order.
+#
+# Rows created or renumbered with an explicit row_order get a fixed-width
+# key, lpad(row_order, 10, '0'), so the 10/20/30 numbering still places rows
+# where it always has. Moves get generated keys strictly between their new
+# neighbours; those are always longer than ROW_ORDER_KEY_WIDTH, so they
+# can't collide with a row_order key. Keys only grow on repeated inserts
+# into the same gap; past REBALANCE_KEY_LENGTH the project is renumbered in
+# the background.
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+ROW_ORDER_KEY_WIDTH = 10
+REBALANCE_KEY_LENGTH = int(os.getenv("REBALANCE_KEY_LENGTH", "40"))
+REBALANCE_BATCH_SIZE = 1000
+# Prefix of keys parked mid-rebalance: the last digit, so staged keys sort
+# after every other key and key_between() still works around them
+REBALANCE_STAGE = DIGITS[-1]
+
+log = logging.getLogger("app.ordering")
+_index = {d: i for i, d in enumerate(DIGITS)}
+_rebalancer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rebalance")
+
+
+def row_order_key(row_order: int) -> str:
+    return str(int(row_order)).rjust(ROW_ORDER_KEY_WIDTH, "0")
+
+
+def key_between(lo: str | None, hi: str | None) -> str:
+    """Return a key strictly between `lo` and `hi` (None = open end).
+
+    Generated keys are longer than ROW_ORDER_KEY_WIDTH and never end in the
+    lowest digit, so there is always room to insert before them.
+    """
+    lo = lo or ""
+    if hi is not None and lo >= hi:
+        raise ValueError(f"no key between {lo!r} and {hi!r}")
+
+    out: list[str] = []
+    if hi is None and lo:
+        # Stay just above lo, below the next row_order key (max row_order + 10)
+        out = list(lo) + [DIGITS[len(DIGITS) // 2]]
+        while len(out) <= ROW_ORDER_KEY_WIDTH:
+            out.append(DIGITS[len(DIGITS) // 2])
+        return "".join(out)
+
+    tie_lo, tie_hi = True, hi is not None
+    i = 0
+    while True:
+        # Exclusive digit bounds at this position; -1 / len(DIGITS) mean unbounded
+        d_lo = _index[lo[i]] if tie_lo and i < len(lo) else -1
+        d_hi = _index[hi[i]] if tie_hi and i < len(hi) else len(DIGITS)
+        if tie_hi and i >= len(hi):
+            raise ValueError(f"no key between {lo!r} and {hi!r}")
+
+        if d_lo == d_hi:
+            out.append(DIGITS[d_lo])
+        else:
+            mid = (d_lo + d_hi + 1) // 2
+            if d_hi - d_lo > 1 and mid > 0:
+                out.append(DIGITS[mid])
+                break
+            # No digit strictly between: follow one bound and free the other
+            if d_lo >= 0:
+                out.append(DIGITS[d_lo])
+                tie_hi = False
+            elif d_hi > 0:
+                out.append(DIGITS[0])
+                tie_lo = tie_hi = False
+            else:
+                out.append(DIGITS[0])
+                tie_lo = False
+        i += 1
+
+    # Pad into the generated-key length range with the middle digit
+    while len(out) <= ROW_ORDER_KEY_WIDTH:
+        out.append(DIGITS[len(DIGITS) // 2])
+    return "".join(out)
+
+
+def keys_between(lo: str | None, hi: str | None, n: int) -> list[str]:
+    """n ascending keys between lo and hi, bisected so lengths grow with log(n)."""
+    if n <= 0:
+        return []
+    mid = key_between(lo, hi)
+    left = (n - 1) // 2
+    return keys_between(lo, mid, left) + [mid] + keys_between(mid, hi, n - 1 - left)
+
+
+# -----------------------------
+# Move
+# -----------------------------
+class MoveError(ValueError):
+    pass
+
+
+class MoveConflict(MoveError):
+    """Another move took the same gap first."""
+
+
+def _neighbour_key(db: Session, project_id: str, key: str, after: bool) -> str | None:
+    # All rows count, deleted ones included, so a restored row can't land on a
+    # moved row's key. Locked, so a concurrent move into the same gap waits
+    # for this one and then sees its keys.
+    t = models.RunSheetRow
+    q = select(t.sort_key).where(t.project_id == project_id)
+    if after:
+        q = q.where(t.sort_key > key).order_by(t.sort_key.asc())
+    else:
+        q = q.where(t.sort_key < key).order_by(t.sort_key.desc())
+    return db.execute(q.limit(1).with_for_update()).scalar()
+
+
+def move_rows(
+    db: Session,
+    project_id: str,
+    row_ids: list[str],
+    actor_id: str,
+    after_id: str | None = None,
+    before_id: str | None = None,
+) -> list[str]:
+    """Place `row_ids`, in the given order, as one block after/before an anchor row.
+
+    Only the moved rows are written, in a single UPDATE. Returns the new keys.
+    """
+    t = models.RunSheetRow
+    if (after_id is None) == (before_id is None):
+        raise MoveError("Give exactly one of after_id or before_id")
+    if len(set(row_ids)) != len(row_ids):
+        raise MoveError("row_ids contains duplicates")
+    anchor_id = after_id or before_id
+    if anchor_id in row_ids:
+        raise MoveError("The anchor row can't be one of the moved rows")
+
+    anchor = db.execute(
+        select(t.sort_key)
+        .where(t.id == anchor_id, t.project_id == project_id, t.is_deleted == False)
+        .with_for_update()
+    ).scalar()
+    if anchor is None:
+        raise MoveError("Anchor row not found in project")
+
+    found = db.execute(
+        select(t.id).where(t.id.in_(row_ids), t.project_id == project_id, t.is_deleted == False).with_for_update()
+    ).scalars().all()
+    if len(found) != len(row_ids):
+        missing = sorted(set(row_ids) - set(found))
+        raise MoveError(f"Rows not found in project: {', '.join(missing)}")
+
+    # New keys sit strictly between the anchor and its current neighbour, so
+    # they can't collide with any key in the table, moved rows included.
+    if after_id:
+        lo, hi = anchor, _neighbour_key(db, project_id, anchor, after=True)
+    else:
+        lo, hi = _neighbour_key(db, project_id, anchor, after=False), anchor
+    if hi is not None and hi >= REBALANCE_STAGE and (lo is None or lo < REBALANCE_STAGE):
+        # A rebalance is running and the gap is where its staged rows begin:
+        # stay on the staged side, so it renumbers these rows in place too
+        lo = REBALANCE_STAGE
+    keys = keys_between(lo, hi, len(row_ids))
+
+    try:
+        db.execute(
+            update(t)
+            .where(t.id.in_(row_ids))
+            .values(sort_key=case(dict(zip(row_ids, keys)), value=t.id), version=t.version + 1, updated_by=actor_id)
+            .execution_options(synchronize_session=False)
+        )
+        history.record_updates(db, project_id, {row_id: {"sort_key": key} for row_id, key in zip(row_ids, keys)}, actor_id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise MoveConflict("Rows were moved into the same place concurrently; reload and retry")
+
+    if max(len(k) for k in keys) > REBALANCE_KEY_LENGTH:
+        schedule_rebalance(project_id)
+    return keys
+
+
+# -----------------------------
+# Rebalance
+# -----------------------------
+def _taken_slots(db: Session, project_id: str, orders: list[int]) -> set[int]:
+    # Slots held by live rows outside the rebalance (inserted while it runs)
+    t = models.RunSheetRow
+    held = db.execute(
+        select(t.row_order, t.sort_key).where(
+            t.project_id == project_id,
+            t.is_deleted == False,
+            t.sort_key < REBALANCE_STAGE,
+            or_(t.row_order.in_(orders), t.sort_key.in_([row_order_key(o) for o in orders])),
+        )
+    ).all()
+    keys = {k for _, k in held}
+    return {o for o, _ in held} | {o for o in orders if row_order_key(o) in keys}
+
+
+def rebalance(db: Session, project_id: str, batch_size: int = REBALANCE_BATCH_SIZE) -> int:
+    """Renumber a project's live rows to row_order 10, 20, 30... in sort_key order, with matching keys.
+
+    Online: each batch is its own short transaction over locked rows, and
+    the run sheet order is the same after every commit. First, from the
+    end backwards, rows are staged on REBALANCE_STAGE + their planned key
+    (after every unstaged key, in order) and a negative row_order; then,
+    from the front, staged rows get their final slots (before every staged
+    key). Rows moved between staged rows meanwhile are renumbered where
+    they now sit; slots taken by rows inserted meanwhile are skipped.
+    Rows already deleted when it starts keep their values. Returns rows renumbered.
+    """
+    t = models.RunSheetRow
+    ids = db.execute(
+        select(t.id).where(t.project_id == project_id, t.is_deleted == False).order_by(t.sort_key.asc())
+    ).scalars().all()
+    db.rollback()
+
+    for end in range(len(ids), 0, -batch_size):
+        start = max(0, end - batch_size)
+        planned = {row_id: (start + i + 1) * 10 for i, row_id in enumerate(ids[start:end])}
+        locked = db.execute(
+            select(t.id).where(
+                t.id.in_(list(planned)), t.is_deleted == False, t.sort_key < REBALANCE_STAGE
+            ).with_for_update()
+        ).scalars().all()
+        if locked:
+            db.execute(
+                update(t)
+                .where(t.id.in_(locked))
+                .values(
+                    row_order=case({row_id: -planned[row_id] for row_id in locked}, value=t.id),
+                    sort_key=case({row_id: REBALANCE_STAGE + row_order_key(planned[row_id]) for row_id in locked}, value=t.id),
+                )
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+
+    done, slot = 0, 0
+    while True:
+        # Rows deleted since they were staged too, so none is left parked
+        batch = db.execute(
+            select(t.id)
+            .where(t.project_id == project_id, t.sort_key >= REBALANCE_STAGE)
+            .order_by(t.sort_key.asc())
+            .limit(batch_size)
+            .with_for_update()
+        ).scalars().all()
+        if not batch:
+            return done
+        candidates = list(range(slot + 10, slot + 10 * (2 * len(batch) + 1), 10))
+        taken = _taken_slots(db, project_id, candidates)
+        while len(candidates) - len(taken.intersection(candidates)) < len(batch):
+            candidates.append(candidates[-1] + 10)
+            taken |= _taken_slots(db, project_id, candidates[-1:])
+        free = iter(o for o in candidates if o not in taken)
+        slots = {}
+        for row_id in batch:
+            order = next(free)
+            slots[row_id] = {"row_order": order, "sort_key": row_order_key(order)}
+        try:
+            db.execute(
+                update(t)
+                .where(t.id.in_(batch))
+                .values(
+                    row_order=case({row_id: v["row_order"] for row_id, v in slots.items()}, value=t.id),
+                    sort_key=case({row_id: v["sort_key"] for row_id, v in slots.items()}, value=t.id),
+                    version=t.version + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            # Staging isn't logged; the entries carry the final slots
+            history.record_updates(db, project_id, slots, None)
+            db.commit()
+        except IntegrityError:
+            # A row inserted since the slot check took one; this batch is still staged, so retry it
+            db.rollback()
+            continue
+        slot = max(v["row_order"] for v in slots.values())
+        done += len(batch)
+
+
+def _run_rebalance(project_id: str) -> None:
+    db = SessionLocal()
+    try:
+        n = rebalance(db, project_id)
+        project_rewritten(project_id)
+        history.entries_committed(project_id, n)
+        log.info("rebalanced %d rows in project %s", n, project_id)
+    except Exception:
+        db.rollback()
+        log.exception("rebalance failed for project %s", project_id)
+    finally:
+        db.close()
+
+
+def schedule_rebalance(project_id: str) -> None:
+    _rebalancer.submit(_run_rebalance, project_id)
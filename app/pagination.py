@@ -0,0 +1,73 @@
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+
+# Keyset pagination over run sheet rows.
+# The cursor is the last sort_key the client has seen; sort_key is unique
+# among a project's live rows, so (project_id, is_deleted, sort_key > after)
+# walks rows_project_live_idx without OFFSET scans.
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+UI_PAGE_SIZE = 200
+
+# Columns of the row listing, in response order
+ROW_FIELDS = tuple(schemas.RunSheetRowOut.model_fields)
+
+
+def rows_page(
+    db: Session,
+    project_id: str,
+    limit: int,
+    after: str | None = None,
+) -> tuple[list[models.RunSheetRow], str | None]:
+    """Return up to `limit` live rows after `after`, plus the next cursor (None on the last page)."""
+    q = db.query(models.RunSheetRow).filter(and_(
+        models.RunSheetRow.project_id == project_id,
+        models.RunSheetRow.is_deleted == False
+    ))
+    if after is not None:
+        q = q.filter(models.RunSheetRow.sort_key > after)
+
+    # Fetch one extra row to know whether another page exists
+    rows = q.order_by(models.RunSheetRow.sort_key.asc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].sort_key
+    return rows, None
+
+
+def row_fields(fields: str | None) -> tuple[str, ...]:
+    """ROW_FIELDS narrowed to a comma-separated `fields=` list (kept in response order)."""
+    if not fields:
+        return ROW_FIELDS
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted.difference(ROW_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return tuple(f for f in ROW_FIELDS if f in wanted)
+
+
+def rows_page_values(
+    db: Session,
+    project_id: str,
+    limit: int,
+    after: str | None = None,
+    fields: tuple[str, ...] = ROW_FIELDS,
+) -> tuple[list[dict], str | None]:
+    """rows_page as plain {field: value} dicts of just `fields`, for JSON listings.
+
+    Selects the columns alone: no ORM objects or identity map, and large
+    text columns aren't read unless asked for.
+    """
+    t = models.RunSheetRow
+    q = select(t.sort_key, *(getattr(t, f) for f in fields)).where(t.project_id == project_id, t.is_deleted == False)
+    if after is not None:
+        q = q.where(t.sort_key > after)
+
+    rows = db.execute(q.order_by(t.sort_key.asc()).limit(limit + 1)).all()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1][0]
+    return [dict(zip(fields, r[1:])) for r in rows], next_after
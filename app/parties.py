@@ -0,0 +1,282 @@
+import argparse
+import re
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+
+# Canonical parties behind the free-text grantor/grantee columns.
+#
+# Each name is normalized (surname first, spouse/"et al" tails and estate
+# wording dropped, punctuation gone), and every distinct normalized name is
+# one parties row. row_parties links rows to their grantor/grantee parties;
+# a ";" in the column separates several. Links are written in the same
+# transaction as the row: in batches by bulk insert (paste, bulk API, file
+# import) and batch patch, and by the after_flush hook below for ORM writes.
+#
+# Fuzzy lookup goes through party_trigrams, an inverted index of each
+# normalized name's character trigrams. Candidates are the parties sharing
+# the most trigrams with the query's leading word (the surname, once
+# normalized; given names are too common to narrow anything down), then
+# ranked by Dice similarity over the whole name.
+ROLES = ("grantor", "grantee")
+# Candidates fetched from the trigram index per lookup, before ranking
+LOOKUP_CANDIDATES = 200
+LOOKUP_CHUNK = 1000
+
+GENERATIONAL = {"JR", "SR", "II", "III", "IV"}
+# Words that mark a company, trust or public body; those keep their word order
+ORGANIZATION_WORDS = {
+    "INC", "LLC", "LP", "LLP", "LTD", "CO", "COMPANY", "CORP", "CORPORATION",
+    "TRUST", "TRUSTEE", "BANK", "PARTNERS", "PARTNERSHIP", "ROYALTY", "ROYALTIES",
+    "OIL", "GAS", "ENERGY", "PETROLEUM", "RESOURCES", "EXPLORATION", "OPERATING",
+    "MINERALS", "HOLDINGS", "FUND", "ASSOCIATION", "CHURCH", "COUNTY", "STATE",
+    "CITY", "UNITED", "FOUNDATION", "RAILROAD", "RAILWAY", "PIPELINE", "UNIVERSITY",
+}
+
+# "et ux Mary", "et al", "and wife, Mary": everything from the marker on
+_SPOUSE_TAIL = re.compile(r"\b(ET\s*UX(OR)?|ET\s*VIR|ET\s*AL|AND\s+(HIS\s+)?WIFE|AND\s+(HER\s+)?HUSBAND|HIS\s+WIFE|HER\s+HUSBAND)\b.*$")
+_ESTATE_PREFIX = re.compile(r"^(THE\s+)?ESTATE\s+OF\s+")
+_ESTATE_SUFFIX = re.compile(r"[\s,]+(ESTATE|DECEASED|DECD|DEC)$")
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize_name(raw) -> str:
+    """Canonical form of one party name: 'John A. Smith et ux' -> 'SMITH JOHN A'."""
+    s = str(raw or "").upper().replace(".", " ").replace("'", "").replace("’", "")
+    s = _SPOUSE_TAIL.sub("", s).strip(" ,")
+    s = _ESTATE_SUFFIX.sub("", _ESTATE_PREFIX.sub("", s)).strip(" ,")
+
+    words = _WORD.findall(s)
+    if not words or ORGANIZATION_WORDS.intersection(words):
+        return " ".join(words)
+
+    if "," in s:
+        # Already surname first: "SMITH, JOHN A"
+        surname, rest = s.split(",", 1)
+        first = _WORD.findall(surname)
+        rest = _WORD.findall(rest)
+    else:
+        first, rest = [], words
+    suffix = [w for w in rest if w in GENERATIONAL]
+    rest = [w for w in rest if w not in GENERATIONAL]
+    if not first and rest:
+        first, rest = rest[-1:], rest[:-1]
+    return " ".join(first + rest + suffix)
+
+
+def split_parties(value) -> list[tuple[str, str]]:
+    """(normalized, display) for each party named in a grantor/grantee cell."""
+    out = []
+    for part in str(value or "").split(";"):
+        normalized = normalize_name(part)
+        if normalized and normalized not in (n for n, _ in out):
+            out.append((normalized, " ".join(part.split())))
+    return out
+
+
+def trigrams(normalized: str) -> set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# -----------------------------
+# Linking
+# -----------------------------
+def _ensure_parties(db, names: dict[str, str]) -> dict[str, str]:
+    # normalized -> party id, creating parties (and their trigrams) that don't exist yet
+    p = models.Party
+    ids: dict[str, str] = {}
+    keys = sorted(names)
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        for party_id, normalized in db.execute(
+            select(p.id, p.normalized).where(p.normalized.in_(keys[start:start + LOOKUP_CHUNK]))
+        ):
+            ids[normalized] = party_id
+
+    new = [{"id": models.uuid_str(), "name": names[n][:255], "normalized": n} for n in keys if n not in ids]
+    if new:
+        db.execute(insert(p), new)
+        db.execute(insert(models.PartyTrigram), [
+            {"trigram": g, "party_id": party["id"]} for party in new for g in trigrams(party["normalized"])
+        ])
+        ids.update((party["normalized"], party["id"]) for party in new)
+    return ids
+
+
+def link_rows(db, rows: list[dict], replace: bool = False) -> None:
+    """Link rows (dicts with id, grantor, grantee) to their parties; before the commit.
+
+    `replace` drops the rows' existing links first (for edits).
+    """
+    entries = []
+    names: dict[str, str] = {}
+    for r in rows:
+        for role in ROLES:
+            for position, (normalized, display) in enumerate(split_parties(r.get(role))):
+                names.setdefault(normalized, display)
+                entries.append((r["id"], role, position, normalized))
+
+    if replace and rows:
+        db.execute(delete(models.RowParty).where(models.RowParty.row_id.in_([r["id"] for r in rows])))
+    if not entries:
+        return
+    ids = _ensure_parties(db, names)
+    db.execute(insert(models.RowParty), [
+        {"row_id": row_id, "role": role, "position": position, "party_id": ids[normalized]}
+        for row_id, role, position, normalized in entries
+    ])
+
+
+@event.listens_for(Session, "after_flush")
+def _link_flush(session: Session, flush_context) -> None:
+    # ORM writes (single-row edits, UI adds), inside the flush's transaction
+    new, changed = [], []
+    for obj in session.new:
+        if isinstance(obj, models.RunSheetRow):
+            new.append({"id": obj.id, "grantor": obj.grantor, "grantee": obj.grantee})
+    for obj in session.dirty:
+        if isinstance(obj, models.RunSheetRow):
+            state = inspect(obj)
+            if any(state.attrs[k].history.has_changes() for k in ROLES):
+                changed.append({"id": obj.id, "grantor": obj.grantor, "grantee": obj.grantee})
+    if new:
+        link_rows(session.connection(), new)
+    if changed:
+        link_rows(session.connection(), changed, replace=True)
+
+
+# -----------------------------
+# Lookup
+# -----------------------------
+def find_parties(
+    db: Session,
+    q: str,
+    limit: int = 20,
+    project_ids: list[str] | None = None,
+) -> list[tuple[models.Party, float]]:
+    """Parties whose normalized name is most like `q`, best first, with Dice similarity.
+
+    `project_ids`, if given, limits hits to parties named by live rows in those projects.
+    """
+    normalized = normalize_name(q)
+    if not normalized:
+        return []
+    grams = trigrams(normalized)
+    # The leading "  X" gram is shared by every name with that initial
+    leading = {t for t in trigrams(normalized.split()[0]) if not t.startswith("  ")} or grams
+    g = models.PartyTrigram
+    shared = func.count().label("shared")
+    candidates = db.execute(
+        select(g.party_id, shared)
+        .where(g.trigram.in_(leading))
+        .group_by(g.party_id)
+        .order_by(shared.desc())
+        .limit(LOOKUP_CANDIDATES)
+    ).all()
+    if not candidates:
+        return []
+
+    counts = dict(candidates)
+    if project_ids is not None:
+        t, rp = models.RunSheetRow, models.RowParty
+        visible = set(db.execute(
+            select(rp.party_id).distinct()
+            .join(t, t.id == rp.row_id)
+            .where(rp.party_id.in_(list(counts)), t.project_id.in_(project_ids), t.is_deleted == False)
+        ).scalars())
+        counts = {party_id: n for party_id, n in counts.items() if party_id in visible}
+    parties = db.execute(select(models.Party).where(models.Party.id.in_(list(counts)))).scalars().all()
+    scored = []
+    for party in parties:
+        theirs = trigrams(party.normalized)
+        scored.append((party, 2 * len(grams & theirs) / (len(grams) + len(theirs))))
+    scored.sort(key=lambda ps: (-ps[1], ps[0].normalized))
+    return scored[:limit]
+
+
+def party_rows(
+    db: Session,
+    party_id: str,
+    project_ids: list[str] | None = None,
+    role: str | None = None,
+    limit: int = 100,
+    offset: int = 0,
+) -> tuple[list, bool]:
+    """(hits, has_more): live rows naming the party, oldest filing first, with their role.
+
+    `project_ids`, if given, limits hits to those projects (what the caller may see).
+    """
+    t, p, rp = models.RunSheetRow, models.Project, models.RowParty
+    stmt = (
+        select(
+            rp.role,
+            t.id,
+            t.project_id,
+            p.name.label("project_name"),
+            t.row_order,
+            t.instrument,
+            t.volume,
+            t.page,
+            t.grantor,
+            t.grantee,
+            t.exec_date,
+            t.filed_date,
+            t.legal_description,
+            t.notes,
+        )
+        .join(t, t.id == rp.row_id)
+        .join(p, p.id == t.project_id)
+        .where(rp.party_id == party_id, t.is_deleted == False)
+    )
+    if role:
+        stmt = stmt.where(rp.role == role)
+    if project_ids is not None:
+        if not project_ids:
+            return [], False
+        stmt = stmt.where(t.project_id.in_(project_ids))
+
+    hits = db.execute(
+        stmt.order_by(t.filed_date, t.id, rp.role).limit(limit + 1).offset(offset)
+    ).all()
+    return hits[:limit], len(hits) > limit
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Link rows written before parties existed, batch by batch. Returns rows linked."""
+    t = models.RunSheetRow
+    linked = select(models.RowParty.row_id).where(models.RowParty.row_id == t.id).exists()
+    done, after = 0, ""
+    while True:
+        batch = db.execute(
+            select(t.id, t.grantor, t.grantee).where(t.id > after, ~linked).order_by(t.id).limit(batch_size)
+        ).mappings().all()
+        if not batch:
+            return done
+        after = batch[-1]["id"]
+        link_rows(db, [dict(r) for r in batch])
+        db.commit()
+        done += len(batch)
+
+
+def main() -> None:
+    """python -m app.parties backfill   (link rows that predate the parties table)"""
+    parser = argparse.ArgumentParser(description="Party index maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        n = backfill(db)
+    finally:
+        db.close()
+    print(f"{n} row(s) linked")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+
+# Moves rows that have been soft-deleted for ROW_PURGE_AFTER_DAYS out of
+# run_sheet_rows into run_sheet_rows_archive, so the live table and its
+# indexes only carry rows someone might still restore.
+#
+# Each batch of ROW_PURGE_BATCH_SIZE rows is its own short transaction
+# (lock the batch, copy it, delete it), with a pause between batches so
+# normal writes and replication keep up. Batches skip rows another purger
+# holds, so running it from several processes is harmless. Their history
+# stays in row_history; scan links go with the row.
+#
+# Run it from cron (python -m app.purge) or in-process every
+# ROW_PURGE_INTERVAL_HOURS (0 = off).
+ROW_PURGE_AFTER_DAYS = int(os.getenv("ROW_PURGE_AFTER_DAYS", "90"))
+ROW_PURGE_BATCH_SIZE = int(os.getenv("ROW_PURGE_BATCH_SIZE", "500"))
+ROW_PURGE_PAUSE = float(os.getenv("ROW_PURGE_PAUSE", "0.2"))
+ROW_PURGE_INTERVAL_HOURS = float(os.getenv("ROW_PURGE_INTERVAL_HOURS", "0"))
+
+log = logging.getLogger("app.purge")
+
+ARCHIVED_COLUMNS = tuple(c.key for c in models.RunSheetRowArchive.__table__.columns if c.key != "archived_at")
+
+
+def purge_batch(db: Session, cutoff: datetime, batch_size: int = ROW_PURGE_BATCH_SIZE) -> int:
+    """Archive up to `batch_size` rows deleted before `cutoff` (naive UTC). Returns the count."""
+    t = models.RunSheetRow
+    ids = db.execute(
+        select(t.id)
+        .where(t.is_deleted == True, t.deleted_at < cutoff)
+        .order_by(t.deleted_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.rollback()
+        return 0
+
+    db.execute(
+        insert(models.RunSheetRowArchive).from_select(
+            ARCHIVED_COLUMNS,
+            select(*(getattr(t, k) for k in ARCHIVED_COLUMNS)).where(t.id.in_(ids)),
+        )
+    )
+    db.execute(delete(t).where(t.id.in_(ids)).execution_options(synchronize_session=False))
+    db.commit()
+    return len(ids)
+
+
+def purge_deleted_rows(
+    after_days: int = ROW_PURGE_AFTER_DAYS,
+    batch_size: int = ROW_PURGE_BATCH_SIZE,
+    pause: float = ROW_PURGE_PAUSE,
+) -> int:
+    """Archive every row deleted more than `after_days` ago, batch by batch. Returns the count."""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=after_days)
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            n = purge_batch(db, cutoff, batch_size)
+            total += n
+            if n < batch_size:
+                return total
+            time.sleep(pause)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _run_purge() -> None:
+    try:
+        n = purge_deleted_rows()
+        if n:
+            log.info("archived %d deleted rows", n)
+    except Exception:
+        log.exception("row purge failed")
+    finally:
+        schedule_purge()
+
+
+def schedule_purge() -> None:
+    """Purge every ROW_PURGE_INTERVAL_HOURS in a background thread (no-op when 0)."""
+    if ROW_PURGE_INTERVAL_HOURS <= 0:
+        return
+    timer = threading.Timer(ROW_PURGE_INTERVAL_HOURS * 3600, _run_purge)
+    timer.daemon = True
+    timer.start()
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main() -> None:
+    """python -m app.purge [--days N] [--batch-size N]"""
+    parser = argparse.ArgumentParser(description="Archive long-deleted run sheet rows")
+    parser.add_argument("--days", type=int, default=ROW_PURGE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ROW_PURGE_BATCH_SIZE)
+    args = parser.parse_args()
+    n = purge_deleted_rows(args.days, args.batch_size)
+    print(f"{n} row(s) archived")
+
+
+if __name__ == "__main__":
+    main()
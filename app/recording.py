@@ -0,0 +1,184 @@
+import argparse
+import re
+
+from sqlalchemy import bindparam, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+
+# Recording references: where an instrument is recorded. A row cites a book
+# (book_type, e.g. OPR or DR), volume and page, and/or the clerk's
+# instrument (document) number. volume_key / page_key / instrument_key are
+# the same values normalized (uppercase, no punctuation, no leading zeros)
+# so "Vol. 0123" and "123" meet in rows_recording_ref_idx; every write path
+# keeps them current.
+LOOKUP_CHUNK = 1000
+REF_COLUMNS = ("book_type", "volume", "page", "instrument_number")
+
+# Spelled-out record series -> the usual abbreviation
+BOOK_TYPE_ALIASES = {
+    "OFFICIAL PUBLIC RECORDS": "OPR",
+    "OFFICIAL RECORDS": "OR",
+    "DEED RECORDS": "DR",
+    "DEED RECORD": "DR",
+    "MISC RECORDS": "MR",
+    "MISCELLANEOUS RECORDS": "MR",
+    "OIL AND GAS RECORDS": "OGR",
+    "OIL GAS RECORDS": "OGR",
+    "PROBATE RECORDS": "PR",
+    "REAL PROPERTY RECORDS": "RPR",
+    "DEED OF TRUST RECORDS": "DTR",
+}
+# What a Vol/Pg cell's leading words may name (importer._split_vol_pg)
+BOOK_TYPES = frozenset(BOOK_TYPE_ALIASES.values())
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+def normalize_book_type(value) -> str | None:
+    words = " ".join(_NON_ALNUM.sub(" ", str(value or "").upper()).split())
+    return BOOK_TYPE_ALIASES.get(words, words) or None
+
+
+def ref_key(value) -> str | None:
+    """'Vol. 0123' -> '123', '2004-012345' -> '2004012345'."""
+    key = _NON_ALNUM.sub("", str(value or "").upper())
+    return (key.lstrip("0") or "0") if key else None
+
+
+def ref_keys(row: dict) -> dict:
+    """The derived *_key columns for a row's volume, page and instrument_number."""
+    return {
+        "volume_key": ref_key(row.get("volume")),
+        "page_key": ref_key(row.get("page")),
+        "instrument_key": ref_key(row.get("instrument_number")),
+    }
+
+
+def lookup_refs(
+    db: Session,
+    refs: list[dict],
+    project_ids: list[str] | None = None,
+) -> list[list]:
+    """Live rows citing each of `refs` (dicts of REF_COLUMNS), in `refs` order.
+
+    A ref matches on volume + page (or volume alone, if it has no page) and
+    on instrument number. With a book type it only matches rows of that
+    type or of no recorded type. `project_ids`, if given, limits hits to
+    those projects (what the caller may see).
+    """
+    t, p = models.RunSheetRow, models.Project
+    by_pair: dict[tuple, list[int]] = {}
+    by_volume: dict[str, list[int]] = {}
+    by_instrument: dict[str, list[int]] = {}
+    for n, ref in enumerate(refs):
+        keys = ref_keys(ref)
+        if keys["volume_key"] and keys["page_key"]:
+            by_pair.setdefault((keys["volume_key"], keys["page_key"]), []).append(n)
+        elif keys["volume_key"]:
+            by_volume.setdefault(keys["volume_key"], []).append(n)
+        if keys["instrument_key"]:
+            by_instrument.setdefault(keys["instrument_key"], []).append(n)
+
+    results: list[list] = [[] for _ in refs]
+    if project_ids is not None and not project_ids:
+        return results
+
+    base = (
+        select(
+            t.id,
+            t.project_id,
+            p.name.label("project_name"),
+            t.row_order,
+            t.instrument,
+            t.book_type,
+            t.volume,
+            t.page,
+            t.instrument_number,
+            t.filed_date,
+            t.volume_key,
+            t.page_key,
+            t.instrument_key,
+        )
+        .join(p, p.id == t.project_id)
+        .where(t.is_deleted == False)
+    )
+    if project_ids is not None:
+        base = base.where(t.project_id.in_(project_ids))
+
+    hits: dict[str, object] = {}
+    for column, keys in (
+        (tuple_(t.volume_key, t.page_key), list(by_pair)),
+        (t.volume_key, list(by_volume)),
+        (t.instrument_key, list(by_instrument)),
+    ):
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            for r in db.execute(base.where(column.in_(keys[start:start + LOOKUP_CHUNK]))):
+                hits[r.id] = r
+
+    for r in sorted(hits.values(), key=lambda r: (r.project_name, r.row_order)):
+        matched = set(by_pair.get((r.volume_key, r.page_key), ()))
+        matched.update(by_volume.get(r.volume_key, ()))
+        matched.update(by_instrument.get(r.instrument_key, ()))
+        for n in sorted(matched):
+            book_type = normalize_book_type(refs[n].get("book_type"))
+            if book_type and r.book_type and book_type != r.book_type:
+                continue
+            results[n].append(r)
+    return results
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Fill in the *_key columns for rows written before they existed, batch by batch. Returns rows updated."""
+    t = models.RunSheetRow
+    missing = or_(
+        (t.volume != None) & (t.volume_key == None),
+        (t.page != None) & (t.page_key == None),
+        (t.instrument_number != None) & (t.instrument_key == None),
+    )
+    updated, after = 0, ""
+    while True:
+        batch = db.execute(
+            select(t.id, t.volume, t.page, t.instrument_number)
+            .where(t.id > after, missing)
+            .order_by(t.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not batch:
+            return updated
+        after = batch[-1]["id"]
+        # A derived column: no version bump or history entry
+        db.connection().execute(
+            update(t.__table__)
+            .where(t.__table__.c.id == bindparam("row_id"))
+            .values(
+                volume_key=bindparam("volume_key"),
+                page_key=bindparam("page_key"),
+                instrument_key=bindparam("instrument_key"),
+            ),
+            [{"row_id": r["id"], **ref_keys(r)} for r in batch],
+        )
+        db.commit()
+        updated += len(batch)
+
+
+def main() -> None:
+    """python -m app.recording backfill   (set the reference keys on rows that predate them)"""
+    parser = argparse.ArgumentParser(description="Recording reference maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        n = backfill(db)
+    finally:
+        db.close()
+    print(f"{n} row(s) updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app.db import ReadSessionLocal, SessionLocal, async_read_engine, read_engine
+
+# Read/write splitting.
+#
+# Read-only handlers get their session from get_read_db (app/deps.py), which
+# uses the READ_DATABASE_URL replica unless
+#   - the client wrote something in the last READ_STICKY_SECONDS, so people
+#     see their own edits despite replication lag, or
+#   - the replica failed its last health check: unreachable, replication
+#     stopped, or more than READ_MAX_LAG_SECONDS behind. A connection error
+#     on the replica marks it unhealthy at once.
+# With READ_MAX_LAG_SECONDS <= READ_STICKY_SECONDS, a writer's reads are
+# back on the replica only once it has their writes.
+#
+# Writes are remembered per client (session token, else address) in this
+# process, and in a cookie that expires with the window so the other
+# worker processes honour it too.
+READ_STICKY_SECONDS = float(os.getenv("READ_STICKY_SECONDS", "5"))
+READ_MAX_LAG_SECONDS = float(os.getenv("READ_MAX_LAG_SECONDS", "5"))
+READ_HEALTH_INTERVAL = float(os.getenv("READ_HEALTH_INTERVAL", "5"))
+
+STICKY_COOKIE = "landman_primary"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+MAX_WRITERS = 10000
+
+log = logging.getLogger("app.replica")
+
+
+# -----------------------------
+# Health
+# -----------------------------
+class _Health:
+    __slots__ = ("healthy", "checked_at", "probing")
+
+    def __init__(self):
+        # Primary only until the first probe says otherwise
+        self.healthy = False
+        self.checked_at = 0.0
+        self.probing = False
+
+
+_health = _Health()
+_health_lock = threading.Lock()
+
+
+def _probe() -> bool:
+    try:
+        with read_engine.connect() as conn:
+            conn.execute(text("select 1"))
+            if conn.dialect.name != "mysql":
+                return True
+            status = conn.execute(text("show replica status")).mappings().first()
+            if status is None:
+                # Not replicating (a plain second server): nothing to lag behind
+                return True
+            lag = status.get("Seconds_Behind_Source")
+            if lag is None or lag > READ_MAX_LAG_SECONDS:
+                log.warning("replica lag %s s; reading from the primary", lag)
+                return False
+            return True
+    except Exception:
+        log.warning("replica health check failed; reading from the primary", exc_info=True)
+        return False
+
+
+def _run_probe() -> None:
+    healthy = _probe()
+    with _health_lock:
+        if healthy and not _health.healthy:
+            log.info("replica healthy; reads go to it again")
+        _health.healthy = healthy
+        _health.checked_at = time.monotonic()
+        _health.probing = False
+
+
+def replica_healthy() -> bool:
+    """The last health check's verdict; starts a new check in the background once it's stale."""
+    with _health_lock:
+        stale = time.monotonic() - _health.checked_at >= READ_HEALTH_INTERVAL
+        if stale and not _health.probing:
+            _health.probing = True
+            threading.Thread(target=_run_probe, name="replica-health", daemon=True).start()
+        return _health.healthy
+
+
+def mark_unhealthy() -> None:
+    with _health_lock:
+        _health.healthy = False
+        _health.checked_at = time.monotonic()
+
+
+def _replica_error(ctx):
+    # Lost or refused connections (a stale pooled one that pre-ping replaces
+    # doesn't count): back to the primary until a probe passes
+    if (ctx.is_disconnect or ctx.connection is None) and not ctx.is_pre_ping:
+        mark_unhealthy()
+
+
+for _engine in (read_engine, async_read_engine and async_read_engine.sync_engine):
+    if _engine is not None:
+        event.listen(_engine, "handle_error", _replica_error)
+
+
+# -----------------------------
+# Stickiness
+# -----------------------------
+_writers: dict[str, float] = {}
+_writers_lock = threading.Lock()
+
+
+def _client_key(request: Request) -> str:
+    from app.auth import request_token
+
+    token = request_token(request)
+    if token:
+        return hashlib.sha256(token.encode()).hexdigest()
+    return request.client.host if request.client else ""
+
+
+def _recent_writer(request: Request) -> bool:
+    cookie = request.cookies.get(STICKY_COOKIE)
+    try:
+        if cookie and float(cookie) > time.time():
+            return True
+    except ValueError:
+        pass
+    with _writers_lock:
+        until = _writers.get(_client_key(request))
+    return until is not None and until > time.monotonic()
+
+
+def note_write(request: Request) -> None:
+    """Send this client's reads to the primary for the next READ_STICKY_SECONDS."""
+    now = time.monotonic()
+    with _writers_lock:
+        _writers[_client_key(request)] = now + READ_STICKY_SECONDS
+        if len(_writers) > MAX_WRITERS:
+            for key in [k for k, until in _writers.items() if until <= now]:
+                del _writers[key]
+
+
+def use_replica(request: Request) -> bool:
+    return ReadSessionLocal is not None and not _recent_writer(request) and replica_healthy()
+
+
+def read_session(request: Request) -> Session:
+    """Session for a read-only handler: the replica when use_replica() allows, else the primary.
+
+    The replica connection is checked out up front, so a replica that just
+    went away costs this request a fallback rather than an error.
+    """
+    if use_replica(request):
+        db = ReadSessionLocal()
+        try:
+            db.connection()
+            return db
+        except DBAPIError:
+            # _replica_error has marked it unhealthy
+            db.close()
+            log.warning("replica unavailable; reading from the primary")
+    return SessionLocal()
+
+
+async def replica_middleware(request: Request, call_next):
+    response = await call_next(request)
+    if ReadSessionLocal is not None and request.method not in SAFE_METHODS and response.status_code < 400:
+        note_write(request)
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(time.time() + READ_STICKY_SECONDS),
+            max_age=math.ceil(READ_STICKY_SECONDS),
+            httponly=True,
+            samesite="lax",
+        )
+    return response
@@ -0,0 +1,391 @@
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterator
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app import models
+from app.db import SessionLocal
+
+# Document scans (deed images, mostly multi-page TIFF and PDF) linked to
+# run sheet rows.
+#
+# Blobs are stored once per SHA-256 of their bytes, so the same scan
+# uploaded against many rows or projects takes space once; row_scans links
+# rows to scans many-to-many. Uploads are hashed while they're spooled to
+# disk and downloads are streamed in chunks with HTTP range support, so
+# neither holds a whole file in memory. Page thumbnails are rendered by a
+# background pool after the upload returns.
+SCAN_STORE_DIR = os.getenv("SCAN_STORE_DIR", "data/scans")
+SCAN_MAX_MB = float(os.getenv("SCAN_MAX_MB", "512"))
+SCAN_THUMB_WORKERS = int(os.getenv("SCAN_THUMB_WORKERS", "2"))
+SCAN_THUMB_WIDTH = int(os.getenv("SCAN_THUMB_WIDTH", "240"))
+# Thumbnails are only rendered for the first pages of very long scans
+SCAN_THUMB_MAX_PAGES = int(os.getenv("SCAN_THUMB_MAX_PAGES", "50"))
+
+CHUNK_SIZE = 256 * 1024
+
+log = logging.getLogger("app.scans")
+
+# Leading bytes -> content type; anything else is refused
+_SIGNATURES = (
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+
+
+class ScanError(ValueError):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_content_type(head: bytes) -> str | None:
+    for magic, content_type in _SIGNATURES:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+
+# -----------------------------
+# Storage
+# -----------------------------
+class LocalScanStore:
+    """Blobs on local disk, sharded by hash prefix: <root>/ab/cd/<sha256>.
+
+    Anything with the same methods (e.g. an object store) can stand in.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def thumb_path(self, sha256: str, page: int) -> str:
+        return os.path.join(self.root, "thumbs", sha256[:2], sha256, f"{page}.jpg")
+
+    def has(self, sha256: str) -> bool:
+        return os.path.exists(self.blob_path(sha256))
+
+    def spool(self) -> tuple[int, str]:
+        # Same filesystem as the blobs, so put() is an atomic rename
+        tmp = os.path.join(self.root, "tmp")
+        os.makedirs(tmp, exist_ok=True)
+        return tempfile.mkstemp(dir=tmp, prefix="upload-")
+
+    def put(self, spooled: str, sha256: str) -> None:
+        path = self.blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(spooled)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(spooled, path)
+
+    def open(self, sha256: str) -> BinaryIO:
+        return open(self.blob_path(sha256), "rb")
+
+    def put_thumb(self, sha256: str, page: int, image) -> None:
+        path = self.thumb_path(sha256, page)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.save(path, "JPEG", quality=80)
+
+
+store = LocalScanStore(SCAN_STORE_DIR)
+
+
+# -----------------------------
+# Upload and links
+# -----------------------------
+def ingest(db: Session, upload: BinaryIO, filename: str, actor_id: str) -> models.Scan:
+    """Store an uploaded file (read in chunks) and return its Scan, new or existing."""
+    max_bytes = int(SCAN_MAX_MB * 1024 * 1024)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    fd, spooled = store.spool()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < 16:
+                    head += chunk[:16]
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ScanError(f"Scans are limited to {SCAN_MAX_MB:g} MB", status_code=413)
+                digest.update(chunk)
+                out.write(chunk)
+
+        content_type = sniff_content_type(head)
+        if content_type is None:
+            raise ScanError("Only TIFF, PDF, JPEG and PNG scans are accepted", status_code=415)
+
+        sha256 = digest.hexdigest()
+        scan = db.get(models.Scan, sha256)
+        store.put(spooled, sha256)
+        if scan is not None:
+            return scan
+
+        scan = models.Scan(
+            sha256=sha256,
+            size_bytes=size,
+            content_type=content_type,
+            filename=os.path.basename(filename or "scan")[:255],
+            created_by=actor_id,
+        )
+        db.add(scan)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Same file uploaded concurrently; theirs won
+            db.rollback()
+            return db.get(models.Scan, sha256)
+        schedule_thumbnails(sha256)
+        return scan
+    finally:
+        if os.path.exists(spooled):
+            os.remove(spooled)
+
+
+def link(db: Session, row: models.RunSheetRow, scan: models.Scan, actor_id: str, label: str | None = None) -> models.RowScan:
+    """Attach a scan to a row (idempotent); the caller commits."""
+    existing = db.get(models.RowScan, (row.id, scan.sha256))
+    if existing is not None:
+        return existing
+    row_scan = models.RowScan(
+        row_id=row.id,
+        scan_sha256=scan.sha256,
+        label=(label or scan.filename)[:255],
+        created_by=actor_id,
+    )
+    db.add(row_scan)
+    return row_scan
+
+
+def row_scans(db: Session, row_ids: list[str]) -> dict[str, list]:
+    """{row id: [(sha256, label), ...]} for a window of rows, in one query."""
+    if not row_ids:
+        return {}
+    rs = models.RowScan
+    links: dict[str, list] = {}
+    for row_id, sha256, label in db.execute(
+        select(rs.row_id, rs.scan_sha256, rs.label)
+        .where(rs.row_id.in_(row_ids))
+        .order_by(rs.row_id, rs.created_at)
+    ):
+        links.setdefault(row_id, []).append((sha256, label))
+    return links
+
+
+def scan_project_ids(db: Session, sha256: str) -> list[str]:
+    """Projects with a row linking this scan; reading it needs access to one of them."""
+    t, rs = models.RunSheetRow, models.RowScan
+    return list(db.execute(
+        select(t.project_id).distinct()
+        .join(rs, rs.row_id == t.id)
+        .where(rs.scan_sha256 == sha256)
+    ).scalars())
+
+
+# -----------------------------
+# Serving
+# -----------------------------
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None | bool:
+    """(start, end) inclusive for a single "bytes=" range, None to send the whole
+    file (no/multiple/unknown ranges), or False if unsatisfiable."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, sep, end_s = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_s == "":
+            # Suffix range: the last N bytes
+            length = int(end_s)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _stream(sha256: str, start: int, length: int) -> Iterator[bytes]:
+    with store.open(sha256) as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def scan_response(request: Request, scan: models.Scan) -> Response:
+    """The scan's bytes, honouring Range / If-Range / If-None-Match."""
+    # Content-addressed: the hash is a strong validator that never changes
+    etag = f'"{scan.sha256}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Disposition": f'inline; filename="{scan.filename.replace(chr(34), "")}"',
+    }
+    inm = request.headers.get("if-none-match")
+    if inm and etag in {t.strip().removeprefix("W/") for t in inm.split(",")}:
+        return Response(status_code=304, headers=headers)
+
+    size = scan.size_bytes
+    byte_range = parse_range(request.headers.get("range"), size)
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        byte_range = None
+
+    if byte_range is False:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_stream(scan.sha256, 0, size), media_type=scan.content_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _stream(scan.sha256, start, end - start + 1),
+        status_code=206,
+        media_type=scan.content_type,
+        headers=headers,
+    )
+
+
+# -----------------------------
+# Thumbnails
+# -----------------------------
+_thumb_executor = ThreadPoolExecutor(max_workers=SCAN_THUMB_WORKERS, thread_name_prefix="scan-thumbs")
+
+
+def schedule_thumbnails(sha256: str) -> None:
+    _thumb_executor.submit(render_thumbnails, sha256)
+
+
+def _image_pages(path: str) -> tuple[int, Iterator]:
+    # TIFF/JPEG/PNG: (page count, frames decoded one at a time)
+    from PIL import Image, ImageSequence
+
+    def frames():
+        with Image.open(path) as img:
+            for i, frame in enumerate(ImageSequence.Iterator(img)):
+                if i >= SCAN_THUMB_MAX_PAGES:
+                    return
+                yield frame
+
+    with Image.open(path) as img:
+        count = getattr(img, "n_frames", 1)
+    return count, frames()
+
+
+def _pdf_pages(path: str) -> tuple[int, Iterator]:
+    # poppler-utils: pdfinfo for the page count, pdftoppm renders one page at a time
+    from PIL import Image
+
+    pdfinfo, pdftoppm = shutil.which("pdfinfo"), shutil.which("pdftoppm")
+    if pdfinfo is None or pdftoppm is None:
+        raise RuntimeError("PDF thumbnails need poppler-utils (pdfinfo, pdftoppm) installed")
+    info = subprocess.run([pdfinfo, path], capture_output=True, text=True, errors="replace")
+    count = next(
+        (int(ln.split(":", 1)[1]) for ln in info.stdout.splitlines() if ln.startswith("Pages:")), 0
+    )
+    if not count:
+        raise RuntimeError(info.stderr[:200] or "unreadable PDF")
+
+    def frames():
+        with tempfile.TemporaryDirectory(prefix="scan-thumbs-") as tmp:
+            out = os.path.join(tmp, "p")
+            for page in range(1, min(count, SCAN_THUMB_MAX_PAGES) + 1):
+                subprocess.run(
+                    [pdftoppm, "-jpeg", "-scale-to", str(SCAN_THUMB_WIDTH * 2),
+                     "-f", str(page), "-l", str(page), "-singlefile", path, out],
+                    capture_output=True, check=True,
+                )
+                with Image.open(out + ".jpg") as img:
+                    yield img
+
+    return count, frames()
+
+
+def render_thumbnails(sha256: str) -> None:
+    """Render page thumbnails for a stored scan and record page_count/thumb_status."""
+    db = SessionLocal()
+    try:
+        scan = db.get(models.Scan, sha256)
+        if scan is None:
+            return
+        try:
+            from PIL import Image  # noqa: F401
+        except ImportError:
+            status, pages = "unsupported", None
+        else:
+            pages, status = None, "done"
+            try:
+                path = store.blob_path(sha256)
+                pages, frames = (_pdf_pages if scan.content_type == "application/pdf" else _image_pages)(path)
+                for n, frame in enumerate(frames, start=1):
+                    image = frame.convert("RGB")
+                    image.thumbnail((SCAN_THUMB_WIDTH, SCAN_THUMB_WIDTH * 4))
+                    store.put_thumb(sha256, n, image)
+            except Exception as e:
+                log.warning("thumbnails failed for scan %s: %s", sha256, e)
+                status = "failed"
+        db.execute(
+            update(models.Scan)
+            .where(models.Scan.sha256 == sha256)
+            .values(thumb_status=status, page_count=pages)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main() -> None:
+    """python -m app.scans rethumb   (re-render pending/failed thumbnails, e.g. after a restart)"""
+    parser = argparse.ArgumentParser(description="Scan store maintenance")
+    parser.add_argument("command", choices=["rethumb"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        pending = list(db.execute(
+            select(models.Scan.sha256).where(models.Scan.thumb_status.in_(("pending", "failed")))
+        ).scalars())
+    finally:
+        db.close()
+    for sha256 in pending:
+        render_thumbnails(sha256)
+    print(f"{len(pending)} scan(s) processed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,51 @@
-from datetime import date
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from datetime import date, datetime
+from typing import Literal, Optional, List
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from app.recording import normalize_book_type
+
+# ---- Auth / users ----
+class LoginIn(BaseModel):
+    email: str = Field(..., min_length=1, max_length=255)
+    password: str = Field(..., min_length=1)
+
+class UserOut(BaseModel):
+    id: str
+    email: str
+    name: str
+    global_role: str
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+class SessionOut(BaseModel):
+    token: str
+    expires_at: datetime
+    user: UserOut
+
+class UserCreate(BaseModel):
+    email: str = Field(..., min_length=3, max_length=255)
+    name: str = Field(..., min_length=1, max_length=255)
+    password: str = Field(..., min_length=8)
+    global_role: Literal["admin", "user"] = "user"
+
+class UserPatch(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=255)
+    global_role: Optional[Literal["admin", "user"]] = None
+    is_active: Optional[bool] = None
+    password: Optional[str] = Field(None, min_length=8)
+
+class MemberSet(BaseModel):
+    role: Literal["viewer", "editor", "owner"] = "editor"
+
+class MemberOut(BaseModel):
+    project_id: str
+    user_id: str
+    role: str
+
+    class Config:
+        from_attributes = True
 
 # ---- Projects ----
 class ProjectCreate(BaseModel):
@@ -8,6 +53,12 @@ class ProjectCreate(BaseModel):
     client_name: Optional[str] = Field(None, max_length=255)
     jurisdiction: Optional[str] = Field(None, max_length=255)
 
+class ProjectPatch(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=255)
+    client_name: Optional[str] = Field(None, max_length=255)
+    jurisdiction: Optional[str] = Field(None, max_length=255)
+    status: Optional[Literal["draft", "in_review", "delivered", "archived"]] = None
+
 class ProjectOut(BaseModel):
     id: str
     name: str
@@ -15,6 +66,11 @@ class ProjectOut(BaseModel):
     jurisdiction: Optional[str] = None
     status: str
     created_by: str
+    row_count: int
+    min_filed_date: Optional[date] = None
+    max_filed_date: Optional[date] = None
+    last_edited_at: Optional[datetime] = None
+    last_edited_by: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -23,8 +79,10 @@ class ProjectOut(BaseModel):
 class RunSheetRowCreate(BaseModel):
     row_order: int = Field(..., ge=1)
     instrument: str = Field(..., min_length=1, max_length=255)
+    book_type: Optional[str] = Field(None, max_length=40)
     volume: Optional[str] = Field(None, max_length=50)
     page: Optional[str] = Field(None, max_length=50)
+    instrument_number: Optional[str] = Field(None, max_length=50)
     grantor: str = Field(..., min_length=1, max_length=255)
     grantee: str = Field(..., min_length=1, max_length=255)
     exec_date: Optional[date] = None
@@ -32,14 +90,25 @@ class RunSheetRowCreate(BaseModel):
     legal_description: Optional[str] = None
     notes: Optional[str] = None
 
+    @field_validator("book_type")
+    @classmethod
+    def canonical_book_type(cls, value):
+        # "Official Public Records" / "opr" -> "OPR"
+        value = normalize_book_type(value) if value is not None else None
+        if value and len(value) > 20:
+            raise ValueError("book_type must be at most 20 characters")
+        return value
+
 class BulkRowsCreate(BaseModel):
     rows: List[RunSheetRowCreate]
 
 class RunSheetRowPatch(BaseModel):
     row_order: Optional[int] = Field(None, ge=1)
     instrument: Optional[str] = Field(None, min_length=1, max_length=255)
+    book_type: Optional[str] = Field(None, max_length=40)
     volume: Optional[str] = Field(None, max_length=50)
     page: Optional[str] = Field(None, max_length=50)
+    instrument_number: Optional[str] = Field(None, max_length=50)
     grantor: Optional[str] = Field(None, min_length=1, max_length=255)
     grantee: Optional[str] = Field(None, min_length=1, max_length=255)
     exec_date: Optional[date] = None
@@ -48,13 +117,25 @@ class RunSheetRowPatch(BaseModel):
     notes: Optional[str] = None
     is_deleted: Optional[bool] = None
 
+    @field_validator("book_type")
+    @classmethod
+    def canonical_book_type(cls, value):
+        # "Official Public Records" / "opr" -> "OPR"
+        value = normalize_book_type(value) if value is not None else None
+        if value and len(value) > 20:
+            raise ValueError("book_type must be at most 20 characters")
+        return value
+
 class RunSheetRowOut(BaseModel):
     id: str
     project_id: str
     row_order: int
+    sort_key: str
     instrument: str
+    book_type: Optional[str] = None
     volume: Optional[str] = None
     page: Optional[str] = None
+    instrument_number: Optional[str] = None
     grantor: str
     grantee: str
     exec_date: Optional[date] = None
@@ -62,6 +143,251 @@ class RunSheetRowOut(BaseModel):
     legal_description: Optional[str] = None
     notes: Optional[str] = None
     is_deleted: bool
+    version: int
+
+    class Config:
+        from_attributes = True
+
+class BulkRowError(BaseModel):
+    index: int
+    row_order: int
+    error: str
+    # Rows skipped as duplicates (skip_duplicates=true)
+    duplicate_of: Optional[str] = None
+    score: Optional[float] = None
+
+class BulkRowsResult(BaseModel):
+    created: List[RunSheetRowOut]
+    failed: List[BulkRowError]
+    # upsert=true: existing rows the payload changed, and ids of those it matched as-is
+    updated: List[RunSheetRowOut] = []
+    unchanged: List[str] = []
+
+class RunSheetRowChange(RunSheetRowPatch):
+    id: str
+    # Either or both; the change is refused if the stored row no longer matches
+    expected_version: Optional[int] = Field(None, ge=1)
+    expected_updated_at: Optional[datetime] = None
+
+class BulkRowsPatch(BaseModel):
+    changes: List[RunSheetRowChange] = Field(..., min_length=1, max_length=5000)
+
+    @model_validator(mode="after")
+    def unique_ids(self):
+        if len({c.id for c in self.changes}) != len(self.changes):
+            raise ValueError("Each row id may appear only once")
+        return self
+
+class RowConflict(BaseModel):
+    id: str
+    error: str
+    current: Optional[RunSheetRowOut] = None
+
+class BulkRowsPatchResult(BaseModel):
+    updated: List[RunSheetRowOut]
+    unchanged: List[str]
+    conflicts: List[RowConflict]
+
+class RowsMove(BaseModel):
+    # Moved rows keep the given order and land next to the anchor row
+    row_ids: List[str] = Field(..., min_length=1, max_length=5000)
+    after_id: Optional[str] = None
+    before_id: Optional[str] = None
+
+class DuplicateRow(BaseModel):
+    row: RunSheetRowOut
+    duplicate_of: RunSheetRowOut
+    score: float
+
+class RowHistoryOut(BaseModel):
+    id: int
+    row_id: str
+    op: str
+    changed_at: datetime
+    changed_by: Optional[str] = None
+    # Full row for an insert, the changed columns otherwise
+    changes: dict
+
+    class Config:
+        from_attributes = True
+
+# ---- Scans ----
+class ScanOut(BaseModel):
+    sha256: str
+    size_bytes: int
+    content_type: str
+    filename: str
+    page_count: Optional[int] = None
+    thumb_status: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class RowScanOut(BaseModel):
+    row_id: str
+    label: str
+    scan: ScanOut
+
+    class Config:
+        from_attributes = True
+
+# ---- Search ----
+class SearchHit(BaseModel):
+    id: str
+    project_id: str
+    project_name: str
+    row_order: int
+    instrument: str
+    volume: Optional[str] = None
+    page: Optional[str] = None
+    grantor: str
+    grantee: str
+    exec_date: Optional[date] = None
+    filed_date: Optional[date] = None
+    legal_description: Optional[str] = None
+    notes: Optional[str] = None
+    score: float
+
+    class Config:
+        from_attributes = True
+
+class SearchResults(BaseModel):
+    hits: List[SearchHit]
+    next_offset: Optional[int] = None
+
+# ---- Recording references ----
+class RecordingRefIn(BaseModel):
+    book_type: Optional[str] = Field(None, max_length=40)
+    volume: Optional[str] = Field(None, max_length=50)
+    page: Optional[str] = Field(None, max_length=50)
+    instrument_number: Optional[str] = Field(None, max_length=50)
+    # Or a Vol/Pg cell as pasted ("OPR 1234/567", "Inst. No. 2004-12345")
+    text: Optional[str] = Field(None, max_length=255)
+
+class RecordingRefLookup(BaseModel):
+    refs: List[RecordingRefIn] = Field(..., min_length=1, max_length=10000)
+
+class RecordingRefHit(BaseModel):
+    id: str
+    project_id: str
+    project_name: str
+    row_order: int
+    instrument: str
+    book_type: Optional[str] = None
+    volume: Optional[str] = None
+    page: Optional[str] = None
+    instrument_number: Optional[str] = None
+    filed_date: Optional[date] = None
 
     class Config:
         from_attributes = True
+
+class RecordingRefMatches(BaseModel):
+    index: int
+    matches: List[RecordingRefHit]
+
+# ---- Parties ----
+class PartyOut(BaseModel):
+    id: str
+    name: str
+    normalized: str
+    # Similarity to the lookup query (GET /parties?q=)
+    score: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+class PartyRow(BaseModel):
+    role: Literal["grantor", "grantee"]
+    id: str
+    project_id: str
+    project_name: str
+    row_order: int
+    instrument: str
+    volume: Optional[str] = None
+    page: Optional[str] = None
+    grantor: str
+    grantee: str
+    exec_date: Optional[date] = None
+    filed_date: Optional[date] = None
+    legal_description: Optional[str] = None
+    notes: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class PartyRows(BaseModel):
+    party: PartyOut
+    rows: List[PartyRow]
+    next_offset: Optional[int] = None
+
+# ---- Tracts ----
+class TractKeys(BaseModel):
+    survey: Optional[str] = None
+    abstract: Optional[str] = None
+    section: Optional[str] = None
+    township: Optional[str] = None
+    range: Optional[str] = None
+    block: Optional[str] = None
+    lot: Optional[str] = None
+
+class TractRow(BaseModel):
+    id: str
+    project_id: str
+    project_name: str
+    row_order: int
+    instrument: str
+    volume: Optional[str] = None
+    page: Optional[str] = None
+    grantor: str
+    grantee: str
+    exec_date: Optional[date] = None
+    filed_date: Optional[date] = None
+    legal_description: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class TractRows(BaseModel):
+    tract: TractKeys
+    rows: List[TractRow]
+    next_offset: Optional[int] = None
+
+class TractProject(BaseModel):
+    project_id: str
+    project_name: str
+    row_count: int
+
+    class Config:
+        from_attributes = True
+
+class TractProjects(BaseModel):
+    tract: TractKeys
+    projects: List[TractProject]
+
+# ---- Chain of title ----
+class ChainRow(BaseModel):
+    id: str
+    row_order: int
+    instrument: str
+    grantor: str
+    grantee: str
+    filed_date: Optional[date] = None
+    exec_date: Optional[date] = None
+
+class ChainOrphan(BaseModel):
+    party: str
+    row_ids: List[str]
+
+class ChainCycle(BaseModel):
+    parties: List[str]
+    row_ids: List[str]
+
+class ChainAnalysis(BaseModel):
+    project_id: str
+    conveyances: int
+    root_grantors: List[str]
+    breaks: List[ChainRow]
+    orphan_grantees: List[ChainOrphan]
+    cycles: List[ChainCycle]
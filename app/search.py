@@ -0,0 +1,101 @@
+import re
+
+from sqlalchemy import and_, literal, or_, select
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Party / legal description search across every project, backed by the
+# rows_fulltext_idx FULLTEXT index in schema.sql. The MATCH column list must
+# be exactly the indexed columns.
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+
+# InnoDB doesn't index words shorter than innodb_ft_min_token_size, so a
+# required short term ("A" in "A-123") would match nothing.
+FT_MIN_TOKEN_SIZE = 3
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _search_columns():
+    t = models.RunSheetRow
+    return (t.grantor, t.grantee, t.legal_description, t.notes)
+
+
+def _tokens(q: str) -> list[str]:
+    return _TOKEN_RE.findall(q or "")
+
+
+def boolean_query(q: str) -> str:
+    """Every indexable term required, prefix-matched: 'smith a-123' -> '+smith* +123*'."""
+    return " ".join(f"+{t}*" for t in _tokens(q) if len(t) >= FT_MIN_TOKEN_SIZE)
+
+
+def search_rows(
+    db: Session,
+    q: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    offset: int = 0,
+    project_id: str | None = None,
+    project_ids: list[str] | None = None,
+) -> tuple[list, bool]:
+    """Return (hits, has_more) for live rows matching `q`, best match first.
+
+    `project_ids`, if given, limits hits to those projects (what the caller may see).
+    """
+    t = models.RunSheetRow
+    p = models.Project
+    tokens = _tokens(q)
+    if not tokens:
+        return [], False
+
+    if db.get_bind().dialect.name == "mysql":
+        against = boolean_query(q)
+        if not against:
+            return [], False
+        score = match(*_search_columns(), against=against).in_boolean_mode()
+        condition = score > 0
+    else:
+        # Local stand-in databases have no FULLTEXT; fall back to unranked LIKE
+        score = literal(0.0)
+        condition = and_(*(
+            or_(*(c.ilike(f"%{tok}%") for c in _search_columns()))
+            for tok in tokens
+        ))
+
+    stmt = (
+        select(
+            t.id,
+            t.project_id,
+            p.name.label("project_name"),
+            t.row_order,
+            t.instrument,
+            t.volume,
+            t.page,
+            t.grantor,
+            t.grantee,
+            t.exec_date,
+            t.filed_date,
+            t.legal_description,
+            t.notes,
+            score.label("score"),
+        )
+        .join(p, p.id == t.project_id)
+        .where(condition, t.is_deleted == False)
+    )
+    if project_id:
+        stmt = stmt.where(t.project_id == project_id)
+    if project_ids is not None:
+        if not project_ids:
+            return [], False
+        stmt = stmt.where(t.project_id.in_(project_ids))
+
+    stmt = (
+        stmt.order_by(score.desc(), t.filed_date.desc(), t.id)
+        .limit(limit + 1)
+        .offset(offset)
+    )
+    hits = db.execute(stmt).all()
+    return hits[:limit], len(hits) > limit
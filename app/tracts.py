@@ -0,0 +1,302 @@
+import argparse
+import re
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+
+# Structured tract keys parsed out of legal descriptions.
+#
+# "All of Section 12, Block 4, H&TC RR Co. Survey, A-123" becomes a
+# row_tracts entry with section 12, block 4, survey HTC RR CO and abstract
+# 123; PLSS calls ("Section 12, Township 4 North, Range 5 West", "S12-T4N-R5W"),
+# lots and acreage are picked up too. A ";" or line break separates tracts,
+# and "Sections 12 and 13" / "Lots 1-3" give one entry per section or lot.
+# Values are normalized (uppercase, no punctuation, no leading zeros) so
+# queries meet them in the row_tracts indexes. Entries are written in the
+# same transaction as the row: in batches by bulk insert and batch patch,
+# and by the after_flush hook below for ORM writes.
+KEYS = ("survey", "abstract", "section", "township", "rge", "block", "lot")
+LOOKUP_CHUNK = 1000
+# "Lots 1-300" is a typo more often than a subdivision
+MAX_EXPANDED = 100
+
+# A list of numbers: "12", "12 and 13", "1, 2 & 3", "1-3", "1 thru 3"
+_LIST = r"(\d+[A-Z]?(?:\s*(?:,|&|AND|-|THRU|THROUGH|TO)\s*\d+[A-Z]?)*)"
+_PLSS = re.compile(
+    r"\bS(?:EC(?:TION)?)?\.?\s*(\d+)\s*[-,]?\s*T(?:WP)?\.?\s*(\d+)\s*([NS])\s*[-,]?\s*R(?:GE)?\.?\s*(\d+)\s*([EW])\b"
+    r"|\b(\d{1,2})-(\d{1,3})([NS])-(\d{1,3})([EW])\b"
+)
+_ABSTRACT = re.compile(r"\bA-\s*(\d+)\b|\bABS(?:TRACT)?\b\.?\s*(?:NO\b\.?\s*|#\s*)?(\d+)\b")
+_SECTION = re.compile(r"\bSEC(?:TIONS?|S)?\b\.?\s*(?:NOS?\b\.?\s*|#\s*)?" + _LIST)
+_TOWNSHIP = re.compile(r"\b(?:TOWNSHIP|TWP|T)\.?[\s-]*(\d+)[\s-]*(NORTH|SOUTH|N|S)\b")
+_RANGE = re.compile(r"\b(?:RANGE|RNG|RGE|R)\.?[\s-]*(\d+)[\s-]*(EAST|WEST|E|W)\b")
+_BLOCK = re.compile(r"\b(?:BLOCK|BLK)\b\.?\s*(?:NO\b\.?\s*|#\s*)?([A-Z0-9]+(?:-[A-Z0-9]+)?)\b")
+_LOT = re.compile(r"\bLOTS?\b\.?\s*(?:NOS?\b\.?\s*|#\s*)?" + _LIST)
+_ACRES = re.compile(r"(\d+(?:\.\d+)?)\s*(?:ACRES?|ACS?)\b\.?")
+# The name before "Survey", back to the previous comma once the keys above are cut out
+_SURVEY = re.compile(r"(?:^|,)\s*([^,]*?)\s*\bSURV(?:EY)?\b\.?")
+# Aliquot calls and filler left in front of the name: "ALL OF", "E 2 OF NW 4 OF"
+_SURVEY_NOISE = re.compile(r"^(?:(?:ALL|PART|[NSEW]{1,2} \d|OF|IN|THE|AND)\b\s*)+")
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+def _number(value: str) -> str:
+    # "012" -> "12", "4-A" -> "4A"
+    key = _NON_ALNUM.sub("", value.upper())
+    return (key.lstrip("0") or "0") if key else ""
+
+
+def _expand(listed: str) -> list[str]:
+    # "12 and 13" -> ["12", "13"], "1-3" -> ["1", "2", "3"]
+    out: list[str] = []
+    parts = re.split(r"\s*(,|&|AND|-|THRU|THROUGH|TO)\s*", listed)
+    values, separators = parts[0::2], parts[1::2]
+    for n, value in enumerate(values):
+        if n and separators[n - 1] in ("-", "THRU", "THROUGH", "TO") and out and value.isdigit() and out[-1].isdigit():
+            start, end = int(out[-1]), int(value)
+            if start < end <= start + MAX_EXPANDED:
+                out.extend(str(i) for i in range(start + 1, end + 1))
+                continue
+        out.append(_number(value))
+    return list(dict.fromkeys(v for v in out if v))
+
+
+def normalize_survey(value) -> str:
+    """'H&TC RR Co.' -> 'HTC RR CO'."""
+    s = re.sub(r"\s*&\s*", "", str(value or "").upper()).replace(".", "").replace("'", "")
+    # "a 10 acre tract out of the John Smith Survey"
+    s = re.split(r"\bOUT OF\b", s)[-1]
+    s = _SURVEY_NOISE.sub("", " ".join(_NON_ALNUM.sub(" ", s).split()))
+    return s.removesuffix(" SURVEY").strip()
+
+
+def normalize_key(key: str, value) -> str | None:
+    """A query value in the form row_tracts stores it."""
+    if value is None or not str(value).strip():
+        return None
+    if key == "survey":
+        return normalize_survey(value) or None
+    value = str(value).upper()
+    if key in ("township", "rge"):
+        m = re.search(r"(\d+)\W*([A-Z])[A-Z]*\W*$", value)
+        return f"{_number(m.group(1))}{m.group(2)}" if m else _number(value) or None
+    if key in ("abstract", "section", "lot"):
+        # "A-0123", "Sec. 12", "Lot 7" -> the number
+        value = re.sub(r"^[^0-9]*(?=\d)", "", value)
+    return _number(value) or None
+
+
+def _cut(text: str, m: re.Match) -> str:
+    # Blank out a match (keeping positions) so the survey name isn't polluted by it
+    return text[:m.start()] + "," + " " * (m.end() - m.start() - 1) + text[m.end():]
+
+
+def _parse_one(text: str) -> list[dict]:
+    s = " " + text.upper() + " "
+    found: dict[str, list[str]] = {}
+
+    for m in list(_PLSS.finditer(s)):
+        g = m.groups()
+        section, twp, ns, rng, ew = g[:5] if g[0] else g[5:]
+        found.setdefault("section", []).append(_number(section))
+        found.setdefault("township", [f"{_number(twp)}{ns}"])
+        found.setdefault("rge", [f"{_number(rng)}{ew}"])
+        s = _cut(s, m)
+    # Blocks first: "Block A-4" is not abstract 4
+    for key, pattern in (("block", _BLOCK), ("abstract", _ABSTRACT), ("township", _TOWNSHIP), ("rge", _RANGE)):
+        for m in list(pattern.finditer(s)):
+            if key == "abstract":
+                value = _number(m.group(1) or m.group(2))
+            elif key in ("township", "rge"):
+                value = f"{_number(m.group(1))}{m.group(2)[0]}"
+            else:
+                value = _number(m.group(1))
+            if value and value not in found.setdefault(key, []):
+                found[key].append(value)
+            s = _cut(s, m)
+    # Acreage before the number lists: "Section 12, 640 acres" is one section
+    acres = None
+    m = _ACRES.search(s)
+    if m:
+        try:
+            acres = Decimal(m.group(1))
+        except InvalidOperation:
+            pass
+        s = _cut(s, m)
+    for key, pattern in (("section", _SECTION), ("lot", _LOT)):
+        for m in list(pattern.finditer(s)):
+            for value in _expand(m.group(1)):
+                if value not in found.setdefault(key, []):
+                    found[key].append(value)
+            s = _cut(s, m)
+    m = _SURVEY.search(s)
+    if m and normalize_survey(m.group(1)):
+        found["survey"] = [normalize_survey(m.group(1))[:100]]
+
+    if not any(found.values()):
+        return []
+    # One entry per section x lot; the other keys are shared
+    base = {k: (found.get(k) or [None])[0] for k in KEYS}
+    tracts = []
+    for section in found.get("section") or [None]:
+        for lot in found.get("lot") or [None]:
+            tracts.append({**base, "section": section, "lot": lot, "acres": acres})
+    return tracts
+
+
+def parse_legal(text) -> list[dict]:
+    """Tract keys (KEYS plus acres) for each tract a legal description names."""
+    tracts: list[dict] = []
+    for part in re.split(r"[;\n]+", str(text or "")):
+        for tract in _parse_one(part):
+            if tract not in tracts:
+                tracts.append(tract)
+    return tracts
+
+
+# -----------------------------
+# Indexing
+# -----------------------------
+def index_rows(db, rows: list[dict], replace: bool = False) -> None:
+    """Write row_tracts for rows (dicts with id, legal_description); before the commit.
+
+    `replace` drops the rows' existing entries first (for edits).
+    """
+    entries = [
+        {"row_id": r["id"], "position": position, **tract}
+        for r in rows
+        for position, tract in enumerate(parse_legal(r.get("legal_description")))
+    ]
+    if replace and rows:
+        ids = [r["id"] for r in rows]
+        for start in range(0, len(ids), LOOKUP_CHUNK):
+            db.execute(delete(models.RowTract).where(models.RowTract.row_id.in_(ids[start:start + LOOKUP_CHUNK])))
+    if entries:
+        db.execute(insert(models.RowTract), entries)
+
+
+@event.listens_for(Session, "after_flush")
+def _index_flush(session: Session, flush_context) -> None:
+    # ORM writes (single-row edits, UI adds), inside the flush's transaction
+    new, changed = [], []
+    for obj in session.new:
+        if isinstance(obj, models.RunSheetRow):
+            new.append({"id": obj.id, "legal_description": obj.legal_description})
+    for obj in session.dirty:
+        if isinstance(obj, models.RunSheetRow) and inspect(obj).attrs.legal_description.history.has_changes():
+            changed.append({"id": obj.id, "legal_description": obj.legal_description})
+    if new:
+        index_rows(session.connection(), new)
+    if changed:
+        index_rows(session.connection(), changed, replace=True)
+
+
+# -----------------------------
+# Lookup
+# -----------------------------
+def _matching_rows(keys: dict):
+    # Row ids with a tract matching every given key, from the row_tracts indexes
+    rt = models.RowTract
+    return select(rt.row_id).where(*(getattr(rt, k) == v for k, v in keys.items()))
+
+
+def tract_rows(
+    db: Session,
+    keys: dict,
+    project_ids: list[str] | None = None,
+    limit: int = 100,
+    offset: int = 0,
+) -> tuple[list, bool]:
+    """(hits, has_more): live rows covering the tract `keys` (normalized KEYS -> value), by project and run sheet order.
+
+    `project_ids`, if given, limits hits to those projects (what the caller may see).
+    """
+    t, p = models.RunSheetRow, models.Project
+    stmt = (
+        select(
+            t.id,
+            t.project_id,
+            p.name.label("project_name"),
+            t.row_order,
+            t.instrument,
+            t.volume,
+            t.page,
+            t.grantor,
+            t.grantee,
+            t.exec_date,
+            t.filed_date,
+            t.legal_description,
+        )
+        .join(p, p.id == t.project_id)
+        .where(t.id.in_(_matching_rows(keys)), t.is_deleted == False)
+    )
+    if project_ids is not None:
+        if not project_ids:
+            return [], False
+        stmt = stmt.where(t.project_id.in_(project_ids))
+
+    hits = db.execute(stmt.order_by(p.name, t.project_id, t.sort_key).limit(limit + 1).offset(offset)).all()
+    return hits[:limit], len(hits) > limit
+
+
+def tract_projects(db: Session, keys: dict, project_ids: list[str] | None = None) -> list:
+    """Projects with live rows covering the tract `keys`, with how many, largest first."""
+    t, p = models.RunSheetRow, models.Project
+    if project_ids is not None and not project_ids:
+        return []
+    rows = func.count().label("row_count")
+    stmt = (
+        select(p.id.label("project_id"), p.name.label("project_name"), rows)
+        .join(t, t.project_id == p.id)
+        .where(t.id.in_(_matching_rows(keys)), t.is_deleted == False)
+        .group_by(p.id, p.name)
+        .order_by(rows.desc(), p.name)
+    )
+    if project_ids is not None:
+        stmt = stmt.where(p.id.in_(project_ids))
+    return db.execute(stmt).all()
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Index rows written before row_tracts existed, batch by batch. Returns rows indexed."""
+    t = models.RunSheetRow
+    indexed = select(models.RowTract.row_id).where(models.RowTract.row_id == t.id).exists()
+    done, after = 0, ""
+    while True:
+        batch = db.execute(
+            select(t.id, t.legal_description)
+            .where(t.id > after, t.legal_description != None, ~indexed)
+            .order_by(t.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not batch:
+            return done
+        after = batch[-1]["id"]
+        index_rows(db, [dict(r) for r in batch])
+        db.commit()
+        done += len(batch)
+
+
+def main() -> None:
+    """python -m app.tracts backfill   (index rows that predate the row_tracts table)"""
+    parser = argparse.ArgumentParser(description="Tract index maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        n = backfill(db)
+    finally:
+        db.close()
+    print(f"{n} row(s) indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,214 @@
-from datetime import date, datetime
-from fastapi import APIRouter, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+import os
+import shutil
+import tempfile
+from datetime import date
+from typing import Optional
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, File, Form, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from starlette.requests import Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy import and_, func
 
-from app.deps import get_db
+from app.auth import (
+    AUTH_SESSION_HOURS,
+    SESSION_COOKIE,
+    Actor,
+    authenticate,
+    can_access,
+    create_session,
+    end_session,
+    request_token,
+    set_member,
+    ui_actor,
+    visible_project_ids,
+)
+from app.bulk import insert_rows, upsert_rows
+from app.changes import project_saved, rows_committed, snapshot
+from app.deps import get_db, get_read_db
+from app.httpcache import CachedBody, cached_response, project_version
+from app.importer import RowParser, file_format, get_job, next_row_order, start_import
+from app.pagination import UI_PAGE_SIZE, rows_page
+from app.recording import normalize_book_type
+from app.scans import ScanError, ingest as ingest_scan, link as link_scan, row_scans
+from app.search import DEFAULT_SEARCH_LIMIT, search_rows
 from app import models
 
 router = APIRouter(prefix="/ui", tags=["ui"])
 templates = Jinja2Templates(directory="templates")
 
-# MVP: hard-coded actor for attribution
-ACTOR_USER_ID = "11111111-1111-1111-1111-111111111111"
+# Set to 1 when served over HTTPS so the session cookie is never sent in the clear
+COOKIE_SECURE = os.getenv("COOKIE_SECURE", "0").lower() in ("1", "true", "yes")
 
 @router.get("", response_class=HTMLResponse)
 def ui_root():
     return RedirectResponse(url="/ui/projects", status_code=302)
 
+def _safe_next(next_url: str) -> str:
+    # Only same-site paths, never another host
+    if not next_url.startswith("/") or next_url.startswith("//"):
+        return "/ui/projects"
+    return next_url
+
+@router.get("/login", response_class=HTMLResponse)
+def login_page(request: Request, next: str = "/ui/projects", error: str = ""):
+    return templates.TemplateResponse(
+        "login.html",
+        {"request": request, "next": _safe_next(next), "error": error, "title": "Log in"},
+    )
+
+@router.post("/login")
+def login(
+    email: str = Form(...),
+    password: str = Form(...),
+    next: str = Form("/ui/projects"),
+    db: Session = Depends(get_db),
+):
+    user = authenticate(db, email, password)
+    if user is None:
+        return RedirectResponse(url=f"/ui/login?error=1&next={quote(_safe_next(next), safe='')}", status_code=302)
+
+    token, _ = create_session(db, user)
+    resp = RedirectResponse(url=_safe_next(next), status_code=302)
+    resp.set_cookie(
+        SESSION_COOKIE,
+        token,
+        max_age=int(AUTH_SESSION_HOURS * 3600),
+        httponly=True,
+        samesite="lax",
+        secure=COOKIE_SECURE,
+    )
+    return resp
+
+@router.post("/logout")
+def logout(request: Request, db: Session = Depends(get_db)):
+    token = request_token(request)
+    if token:
+        end_session(db, token)
+    resp = RedirectResponse(url="/ui/login", status_code=302)
+    resp.delete_cookie(SESSION_COOKIE)
+    return resp
+
 @router.get("/projects", response_class=HTMLResponse)
-def projects_page(request: Request, db: Session = Depends(get_db)):
-    projects = db.query(models.Project).order_by(models.Project.updated_at.desc()).all()
+def projects_page(request: Request, actor: Actor = Depends(ui_actor), db: Session = Depends(get_read_db)):
+    # Stats are columns on projects; the editor's name comes from the same query
+    q = db.query(models.Project).options(joinedload(models.Project.last_editor))
+    project_ids = visible_project_ids(db, actor)
+    if project_ids is not None:
+        q = q.filter(models.Project.id.in_(project_ids))
+    projects = q.order_by(models.Project.updated_at.desc()).all()
     return templates.TemplateResponse(
         "projects.html",
         {"request": request, "projects": projects, "title": "Projects"},
     )
 
+@router.get("/search", response_class=HTMLResponse)
+def search_page(
+    request: Request,
+    q: str = "",
+    offset: int = 0,
+    actor: Actor = Depends(ui_actor),
+    db: Session = Depends(get_read_db),
+):
+    offset = max(offset, 0)
+    hits, has_more = search_rows(
+        db, q, limit=DEFAULT_SEARCH_LIMIT, offset=offset, project_ids=visible_project_ids(db, actor)
+    )
+    return templates.TemplateResponse(
+        "search.html",
+        {
+            "request": request,
+            "q": q,
+            "hits": hits,
+            "prev_offset": max(offset - DEFAULT_SEARCH_LIMIT, 0) if offset else None,
+            "next_offset": offset + DEFAULT_SEARCH_LIMIT if has_more else None,
+            "title": "Search",
+        },
+    )
+
 @router.post("/projects")
 def create_project(
     name: str = Form(...),
     client_name: str = Form(""),
     jurisdiction: str = Form(""),
+    actor: Actor = Depends(ui_actor),
     db: Session = Depends(get_db),
 ):
-    # Ensure actor exists (matches your DB FK constraints)
-    actor = db.query(models.User).filter(models.User.id == ACTOR_USER_ID).first()
-    if not actor:
-        # if you haven't seeded the actor user yet, do that first
-        return RedirectResponse(url="/ui/projects?error=seed_user_missing", status_code=302)
-
     p = models.Project(
         name=name.strip(),
         client_name=(client_name.strip() or None),
         jurisdiction=(jurisdiction.strip() or None),
-        created_by=ACTOR_USER_ID,
+        created_by=actor.id,
     )
     db.add(p)
+    db.flush()
+    set_member(db, p.id, actor.id, "owner")
     db.commit()
-    db.refresh(p)
+    project_saved(p.id)
     return RedirectResponse(url=f"/ui/projects/{p.id}", status_code=302)
 
 @router.get("/projects/{project_id}", response_class=HTMLResponse)
-def project_detail(request: Request, project_id: str, db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
+def project_detail(request: Request, project_id: str, actor: Actor = Depends(ui_actor), db: Session = Depends(get_read_db)):
+    # Access and project version first: unchanged pages are a 304 or a cached body
+    version = project_version(db, project_id) if can_access(db, actor, project_id) else None
+    if version is None:
         return RedirectResponse(url="/ui/projects", status_code=302)
 
-    rows = (
-        db.query(models.RunSheetRow)
-        .filter(and_(models.RunSheetRow.project_id == project_id, models.RunSheetRow.is_deleted == False))
-        .order_by(models.RunSheetRow.row_order.asc())
-        .all()
-    )
+    def render():
+        project = db.query(models.Project).filter(models.Project.id == project_id).first()
 
-    # Suggest next row_order (10,20,30...) based on max
-    max_order = (
-        db.query(func.max(models.RunSheetRow.row_order))
-        .filter(and_(models.RunSheetRow.project_id == project_id, models.RunSheetRow.is_deleted == False))
-        .scalar()
-    )
-    next_row_order = 10 if not max_order else int(max_order) + 10
+        # Only the first window is rendered; the table fetches the rest on scroll
+        rows, next_after = rows_page(db, project_id, UI_PAGE_SIZE)
+
+        # Suggest next row_order (10,20,30...) based on max
+        max_order = (
+            db.query(func.max(models.RunSheetRow.row_order))
+            .filter(and_(models.RunSheetRow.project_id == project_id, models.RunSheetRow.is_deleted == False))
+            .scalar()
+        )
+        next_row_order = 10 if not max_order else int(max_order) + 10
+
+        page = templates.TemplateResponse(
+            "project_detail.html",
+            {
+                "request": request,
+                "project": project,
+                "rows": rows,
+                "scans": row_scans(db, [r.id for r in rows]),
+                "next_after": next_after,
+                "next_row_order": next_row_order,
+                "title": project.name,
+            },
+        )
+        return CachedBody(page.body, page.media_type)
+
+    return cached_response(request, project_id, *version, render)
 
+@router.get("/projects/{project_id}/rows", response_class=HTMLResponse)
+def project_rows_window(
+    request: Request,
+    project_id: str,
+    after: Optional[str] = None,
+    actor: Actor = Depends(ui_actor),
+    db: Session = Depends(get_read_db),
+):
+    # Table body fragment for the next window of rows (keyset on sort_key)
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project or not can_access(db, actor, project_id):
+        return HTMLResponse("", status_code=404)
+
+    rows, next_after = rows_page(db, project_id, UI_PAGE_SIZE, after)
     return templates.TemplateResponse(
-        "project_detail.html",
-        {"request": request, "project": project, "rows": rows, "next_row_order": next_row_order, "title": project.name},
+        "_rows.html",
+        {
+            "request": request,
+            "project": project,
+            "rows": rows,
+            "scans": row_scans(db, [r.id for r in rows]),
+            "next_after": next_after,
+        },
     )
 
 @router.post("/projects/{project_id}/rows")
@@ -82,18 +216,21 @@ def add_row(
     project_id: str,
     row_order: int = Form(...),
     instrument: str = Form(...),
+    book_type: str = Form(""),
     volume: str = Form(""),
     page: str = Form(""),
+    instrument_number: str = Form(""),
     grantor: str = Form(...),
     grantee: str = Form(...),
     exec_date: str = Form(""),
     filed_date: str = Form(""),
     legal_description: str = Form(""),
     notes: str = Form(""),
+    actor: Actor = Depends(ui_actor),
     db: Session = Depends(get_db),
 ):
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
+    if not project or not can_access(db, actor, project_id, "editor"):
         return RedirectResponse(url="/ui/projects", status_code=302)
 
     def parse_date(s: str) -> date | None:
@@ -106,16 +243,18 @@ def add_row(
         project_id=project_id,
         row_order=row_order,
         instrument=instrument.strip(),
+        book_type=normalize_book_type(book_type),
         volume=(volume.strip() or None),
         page=(page.strip() or None),
+        instrument_number=(instrument_number.strip() or None),
         grantor=grantor.strip(),
         grantee=grantee.strip(),
         exec_date=parse_date(exec_date),
         filed_date=parse_date(filed_date),
         legal_description=(legal_description.strip() or None),
         notes=(notes.strip() or None),
-        created_by=ACTOR_USER_ID,
-        updated_by=ACTOR_USER_ID,
+        created_by=actor.id,
+        updated_by=actor.id,
         is_deleted=False,
     )
     db.add(row)
@@ -126,167 +265,145 @@ def add_row(
         # simplest MVP behavior: redirect back; you can add error messages later
         return RedirectResponse(url=f"/ui/projects/{project_id}", status_code=302)
 
+    rows_committed(project_id, [row])
     return RedirectResponse(url=f"/ui/projects/{project_id}", status_code=302)
 
-def _parse_date_loose(s: str) -> date | None:
-    s = (s or "").strip()
-    if not s:
-        return None
-
-    # Try ISO first: YYYY-MM-DD
-    try:
-        return date.fromisoformat(s)
-    except Exception:
-        pass
-
-    # Try common US format: MM/DD/YYYY (or M/D/YYYY)
-    try:
-        return datetime.strptime(s, "%m/%d/%Y").date()
-    except Exception:
-        pass
-
-    # Try MM/DD/YY
-    try:
-        return datetime.strptime(s, "%m/%d/%y").date()
-    except Exception:
-        return None
-
-
-def _split_vol_pg(volpg: str) -> tuple[str | None, str | None]:
-    volpg = (volpg or "").strip()
-    if not volpg:
-        return None, None
-
-    # Allow "123/45", "123 / 45", "123 45", "123-45"
-    normalized = volpg.replace(" ", "").replace("-", "/")
-    if "/" in normalized:
-        parts = normalized.split("/", 1)
-        vol = parts[0].strip() or None
-        pg = parts[1].strip() or None
-        return vol, pg
-
-    # Fallback: split on whitespace if user pasted "123 45"
-    parts = (volpg or "").strip().split()
-    if len(parts) >= 2:
-        return parts[0].strip() or None, parts[1].strip() or None
-
-    # If only one token, treat as volume and leave page blank
-    return volpg.strip() or None, None
-
-
 @router.post("/projects/{project_id}/rows/paste")
 def paste_rows(
     project_id: str,
     tsv: str = Form(""),
+    skip_duplicates: bool = Form(False),
+    upsert: bool = Form(False),
+    actor: Actor = Depends(ui_actor),
     db: Session = Depends(get_db),
 ):
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
+    if not project or not can_access(db, actor, project_id, "editor"):
         return RedirectResponse(url="/ui/projects", status_code=302)
 
-    # Determine starting row_order (10, 20, 30...)
-    max_order = (
-        db.query(func.max(models.RunSheetRow.row_order))
-        .filter(and_(models.RunSheetRow.project_id == project_id, models.RunSheetRow.is_deleted == False))
-        .scalar()
-    )
-    next_order = 10 if not max_order else int(max_order) + 10
-
     raw = (tsv or "").strip("\n")
     if not raw.strip():
         return RedirectResponse(url=f"/ui/projects/{project_id}", status_code=302)
 
-    imported = 0
+    # Determine starting row_order (10, 20, 30...)
+    next_order = next_row_order(db, project_id)
+
+    parser = RowParser()
+    parsed: list[dict] = []
     skipped = 0
 
     lines = [ln for ln in raw.splitlines() if ln.strip()]
     for ln in lines:
         # Excel copy/paste typically produces TSV
-        cols = ln.split("\t")
-
-        # Expect at least 4 columns; full is 8
-        # 0 Instrument
-        # 1 Vol/Pg
-        # 2 Grantor
-        # 3 Grantee
-        # 4 Exec Date
-        # 5 Filed Date
-        # 6 Legal Desc
-        # 7 Notes
-        if len(cols) < 4:
-            skipped += 1
-            continue
-
-        instrument = (cols[0] if len(cols) > 0 else "").strip()
-        volpg = (cols[1] if len(cols) > 1 else "").strip()
-        grantor = (cols[2] if len(cols) > 2 else "").strip()
-        grantee = (cols[3] if len(cols) > 3 else "").strip()
-        exec_date_s = (cols[4] if len(cols) > 4 else "").strip()
-        filed_date_s = (cols[5] if len(cols) > 5 else "").strip()
-        legal = (cols[6] if len(cols) > 6 else "").strip()
-        notes = (cols[7] if len(cols) > 7 else "").strip()
-
-        # Skip header row if user pasted headers
-        header_like = instrument.lower() in ("instrument", "instr", "document type")
-        if header_like:
-            skipped += 1
-            continue
-
-        # Minimum required fields
-        if not instrument or not grantor or not grantee:
+        row = parser.parse(ln.split("\t"))
+        if row is None:
             skipped += 1
             continue
 
-        volume, page = _split_vol_pg(volpg)
-
-        row = models.RunSheetRow(
-            project_id=project_id,
-            row_order=next_order,
-            instrument=instrument,
-            volume=volume,
-            page=page,
-            grantor=grantor,
-            grantee=grantee,
-            exec_date=_parse_date_loose(exec_date_s),
-            filed_date=_parse_date_loose(filed_date_s),
-            legal_description=legal or None,
-            notes=notes or None,
-            created_by=ACTOR_USER_ID,
-            updated_by=ACTOR_USER_ID,
-            is_deleted=False,
-        )
-        db.add(row)
-
-        next_order += 10
-        imported += 1
+        if not upsert:
+            # Re-imported rows keep their place; upsert_rows numbers only the new ones
+            row["row_order"] = next_order
+            next_order += 10
+        parsed.append(row)
 
+    updated, unchanged = [], []
     try:
-        db.commit()
+        if upsert:
+            created, updated, unchanged, failed = upsert_rows(
+                db, project_id, parsed, actor.id, skip_duplicates=skip_duplicates, next_order=next_order
+            )
+        else:
+            created, failed = insert_rows(db, project_id, parsed, actor.id, skip_duplicates=skip_duplicates)
     except Exception:
         db.rollback()
         # On any DB error, go back without crashing the UI
         return RedirectResponse(url=f"/ui/projects/{project_id}?imported=0&skipped={len(lines)}", status_code=302)
 
-    return RedirectResponse(url=f"/ui/projects/{project_id}?imported={imported}&skipped={skipped}", status_code=302)
+    duplicates = sum(1 for f in failed if f.get("duplicate_of"))
+    return RedirectResponse(
+        url=f"/ui/projects/{project_id}?imported={len(created)}&skipped={skipped + len(failed)}"
+        + (f"&duplicates={duplicates}" if duplicates else "")
+        + (f"&updated={len(updated)}&unchanged={len(unchanged)}" if upsert else ""),
+        status_code=302,
+    )
+
+@router.post("/projects/{project_id}/rows/import")
+def import_file(
+    project_id: str,
+    file: UploadFile = File(...),
+    actor: Actor = Depends(ui_actor),
+    db: Session = Depends(get_db),
+):
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project or not can_access(db, actor, project_id, "editor"):
+        return RedirectResponse(url="/ui/projects", status_code=302)
+
+    fmt = file_format(file.filename)
+    if fmt is None:
+        return RedirectResponse(url=f"/ui/projects/{project_id}?import_error=unsupported_file", status_code=302)
+
+    # Spool the upload to disk in chunks; the request's temp file goes away
+    # once we respond, and the import runs after that.
+    fd, path = tempfile.mkstemp(prefix="landman-import-", suffix=f".{fmt}")
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(file.file, out, 1024 * 1024)
+
+    job = start_import(project_id, file.filename, fmt, path, actor.id)
+    return RedirectResponse(url=f"/ui/projects/{project_id}?import_job={job.id}", status_code=302)
+
+@router.get("/imports/{job_id}")
+def import_progress(job_id: str, actor: Actor = Depends(ui_actor), db: Session = Depends(get_db)):
+    job = get_job(job_id)
+    if not job or not can_access(db, actor, job.project_id):
+        return JSONResponse({"detail": "Import job not found"}, status_code=404)
+    return job.progress()
+
+def _wants_fragment(request: Request) -> bool:
+    # Set by the project page's script; plain form posts still get redirects
+    return request.headers.get("x-fragment") == "row"
+
+_ROW_CONFLICT = "Not saved: someone else changed this row meanwhile. It now shows their version."
+
+def _row_fragment(
+    request: Request,
+    db: Session,
+    row: models.RunSheetRow | None,
+    error: str | None = None,
+    status_code: int = 200,
+):
+    # A single <tr>, or an empty body for a row that's gone
+    if row is None or row.is_deleted:
+        return HTMLResponse("", status_code=status_code)
+    return templates.TemplateResponse(
+        "_row.html",
+        {"request": request, "r": row, "scans": row_scans(db, [row.id]), "row_error": error},
+        status_code=status_code,
+    )
 
 @router.post("/rows/{row_id}/update")
 def update_row(
+    request: Request,
     row_id: str,
     project_id: str = Form(...),
     row_order: int = Form(...),
     instrument: str = Form(...),
+    book_type: str = Form(""),
     volume: str = Form(""),
     page: str = Form(""),
+    instrument_number: str = Form(""),
     grantor: str = Form(...),
     grantee: str = Form(...),
     exec_date: str = Form(""),
     filed_date: str = Form(""),
     legal_description: str = Form(""),
     notes: str = Form(""),
+    actor: Actor = Depends(ui_actor),
     db: Session = Depends(get_db),
 ):
     row = db.query(models.RunSheetRow).filter(models.RunSheetRow.id == row_id).first()
-    if not row:
+    if not row or not can_access(db, actor, row.project_id, "editor"):
+        if _wants_fragment(request):
+            return _row_fragment(request, db, None, status_code=404)
         return RedirectResponse(url=f"/ui/projects/{project_id}", status_code=302)
 
     def parse_date(s: str) -> date | None:
@@ -295,32 +412,88 @@ def update_row(
             return None
         return date.fromisoformat(s)
 
+    before = snapshot([row])
     row.row_order = row_order
     row.instrument = instrument.strip()
+    row.book_type = normalize_book_type(book_type)
     row.volume = volume.strip() or None
     row.page = page.strip() or None
+    row.instrument_number = instrument_number.strip() or None
     row.grantor = grantor.strip()
     row.grantee = grantee.strip()
     row.exec_date = parse_date(exec_date)
     row.filed_date = parse_date(filed_date)
     row.legal_description = legal_description.strip() or None
     row.notes = notes.strip() or None
-    row.updated_by = ACTOR_USER_ID
+    row.updated_by = actor.id
 
     try:
         db.commit()
+    except StaleDataError:
+        # Someone else saved the row since it was loaded (version_id_col)
+        db.rollback()
+        if _wants_fragment(request):
+            # The rolled-back row reloads with the other save's values
+            return _row_fragment(request, db, row, _ROW_CONFLICT, status_code=409)
+        return RedirectResponse(url=f"/ui/projects/{project_id}?row_conflict=1", status_code=302)
     except Exception:
         db.rollback()
+        if _wants_fragment(request):
+            return _row_fragment(
+                request, db, row, f"Not saved: row order {row_order} may already be in use.", status_code=409
+            )
+    else:
+        rows_committed(row.project_id, [row], before)
+        if _wants_fragment(request):
+            return _row_fragment(request, db, row)
 
     return RedirectResponse(url=f"/ui/projects/{project_id}", status_code=302)
 
 @router.post("/rows/{row_id}/delete")
-def delete_row(row_id: str, project_id: str = Form(...), db: Session = Depends(get_db)):
+def delete_row(
+    request: Request,
+    row_id: str,
+    project_id: str = Form(...),
+    actor: Actor = Depends(ui_actor),
+    db: Session = Depends(get_db),
+):
     row = db.query(models.RunSheetRow).filter(models.RunSheetRow.id == row_id).first()
-    if row:
+    if row and can_access(db, actor, row.project_id, "editor"):
+        before = snapshot([row])
         row.is_deleted = True
-        row.deleted_by = ACTOR_USER_ID
-        row.updated_by = ACTOR_USER_ID
-        db.commit()
-
+        row.deleted_by = actor.id
+        row.updated_by = actor.id
+        try:
+            db.commit()
+        except StaleDataError:
+            db.rollback()
+            if _wants_fragment(request):
+                return _row_fragment(request, db, row, _ROW_CONFLICT, status_code=409)
+            return RedirectResponse(url=f"/ui/projects/{project_id}?row_conflict=1", status_code=302)
+        rows_committed(row.project_id, [row], before)
+
+    if _wants_fragment(request):
+        return _row_fragment(request, db, None)
     return RedirectResponse(url=f"/ui/projects/{project_id}", status_code=302)
+
+@router.post("/rows/{row_id}/scans")
+def attach_scan(
+    row_id: str,
+    project_id: str = Form(...),
+    file: UploadFile = File(...),
+    actor: Actor = Depends(ui_actor),
+    db: Session = Depends(get_db),
+):
+    row = db.query(models.RunSheetRow).filter(models.RunSheetRow.id == row_id).first()
+    if not row or not can_access(db, actor, row.project_id, "editor"):
+        return RedirectResponse(url=f"/ui/projects/{project_id}", status_code=302)
+
+    try:
+        scan = ingest_scan(db, file.file, file.filename, actor.id)
+    except ScanError:
+        return RedirectResponse(url=f"/ui/projects/{row.project_id}?scan_error=1", status_code=302)
+
+    link_scan(db, row, scan, actor.id, file.filename)
+    db.commit()
+    project_saved(row.project_id)
+    return RedirectResponse(url=f"/ui/projects/{row.project_id}", status_code=302)
@@ -0,0 +1,144 @@
+"""Compare sync and async (DB_ASYNC=1) handler throughput under concurrent load.
+
+Starts the API twice with uvicorn, once per mode, against the database in
+DATABASE_URL (and ASYNC_DATABASE_URL, if the async URL isn't derivable).
+Each run seeds one project and fires GET /projects/{id}/rows at increasing
+concurrency levels.
+
+    docker compose up -d db
+    DATABASE_URL=mysql+mysqlconnector://root@127.0.0.1:3306/landman_mvp \\
+        python bench/concurrency.py --requests 5000 --concurrency 10,50,200,500
+
+Needs httpx (pip install httpx).
+
+No sync vs async numbers are recorded yet. It has only been smoke-run
+against SQLite, where both modes wait on SQLite's single writer and the
+results say nothing about MySQL. Keep DB_ASYNC off until a MySQL run
+shows it pays.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _start_server(port: int, async_mode: bool) -> subprocess.Popen:
+    env = dict(os.environ, DB_ASYNC="1" if async_mode else "0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+def _wait_ready(base: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base}/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {base} did not come up")
+
+
+def _seed(base: str, rows: int) -> str:
+    project = httpx.post(f"{base}/projects", json={"name": "concurrency bench"}).json()
+    payload = [
+        {"row_order": (i + 1) * 10, "instrument": "Deed", "grantor": f"Grantor {i}", "grantee": f"Grantee {i}"}
+        for i in range(rows)
+    ]
+    httpx.post(f"{base}/projects/{project['id']}/rows/bulk", json={"rows": payload}, timeout=120)
+    return project["id"]
+
+
+async def _load(url: str, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def one():
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.get(url)
+                    if resp.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def run_mode(async_mode: bool, port: int, args) -> list[dict]:
+    base = f"http://127.0.0.1:{port}"
+    server = _start_server(port, async_mode)
+    try:
+        _wait_ready(base)
+        project_id = _seed(base, args.rows)
+        url = f"{base}/projects/{project_id}/rows?limit={args.limit}"
+        # Warm the connection pools before measuring
+        asyncio.run(_load(url, min(args.requests, 200), 20))
+        return [asyncio.run(_load(url, args.requests, c)) for c in args.concurrency]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[10, 50, 200])
+    parser.add_argument("--rows", type=int, default=1000, help="rows seeded into the bench project")
+    parser.add_argument("--limit", type=int, default=50, help="page size requested per call")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "sync": run_mode(False, args.port, args),
+        "async": run_mode(True, args.port + 1, args),
+    }
+
+    print(f"{'conc':>6} {'sync rps':>10} {'async rps':>10} {'gain':>7} {'sync p95':>10} {'async p95':>10}")
+    for s, a in zip(results["sync"], results["async"]):
+        gain = a["rps"] / s["rps"] if s["rps"] else 0.0
+        print(
+            f"{s['concurrency']:>6} {s['rps']:>10} {a['rps']:>10} {gain:>6.2f}x "
+            f"{s['p95_ms']:>8}ms {a['p95_ms']:>8}ms"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
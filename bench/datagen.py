@@ -0,0 +1,251 @@
+"""Synthetic run sheet data for benchmarks.
+
+Rows look like an abstract of a Texas tract: a chain of deeds, leases and
+assignments whose grantees usually become the next grantors, with vol/page
+references, exec/filed dates moving forward in time, section/block/survey
+legal descriptions and the odd note. Output is deterministic for a seed.
+
+As a library:
+
+    from bench.datagen import generate_rows, to_tsv
+    rows = list(generate_rows(10_000, seed=1))   # RunSheetRowCreate-shaped dicts
+
+From the command line, seed projects straight into DATABASE_URL (a SQLite
+file works as a stand-in; tables are created there if missing):
+
+    DATABASE_URL=sqlite:///bench.sqlite python bench/datagen.py --rows 500000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+from typing import Iterator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = (
+    "James", "John", "Robert", "William", "Charles", "George", "Thomas", "Joseph", "Henry", "Samuel",
+    "Mary", "Anna", "Margaret", "Elizabeth", "Sarah", "Martha", "Emma", "Ruth", "Clara", "Edna",
+    "J.W.", "W.T.", "R.L.", "C.E.", "Billie", "Ollie", "Jessie", "Lula", "Effie", "Minnie",
+)
+LAST_NAMES = (
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Miller", "Davis", "Garcia", "Rodriguez", "Wilson",
+    "Martinez", "Anderson", "Taylor", "Thomas", "Hernandez", "Moore", "Martin", "Jackson", "Thompson", "White",
+    "McDonald", "O'Neal", "Vaughn", "Kincaid", "Pruitt", "Hargrove", "Stallings", "Whitfield", "Ybarra", "Zapata",
+)
+COMPANY_STEMS = (
+    "Permian", "Pecos Valley", "Delaware Basin", "Toyah", "Red Bluff", "Caprock", "Trans-Pecos", "Llano",
+    "Big Spring", "Comanche", "Mesa", "Salt Flat",
+)
+COMPANY_KINDS = (
+    "Oil & Gas, LLC", "Energy Partners, LP", "Royalty Co.", "Minerals, Inc.", "Resources, LLC",
+    "Exploration Company", "Land & Cattle Co.",
+)
+INSTRUMENTS = (
+    ("Warranty Deed", 30),
+    ("Oil and Gas Lease", 20),
+    ("Assignment", 12),
+    ("Mineral Deed", 10),
+    ("Royalty Deed", 6),
+    ("Release", 6),
+    ("Affidavit of Heirship", 4),
+    ("Right of Way", 4),
+    ("Special Warranty Deed", 4),
+    ("Probate", 2),
+    ("Patent", 1),
+    ("Correction Deed", 1),
+)
+SURVEYS = ("H&TC RR Co.", "T&P RR Co.", "PSL", "GC&SF RR Co.", "CCSD&RGNG RR Co.", "I&GN RR Co.")
+COUNTIES = ("Reeves", "Ward", "Loving", "Pecos", "Culberson", "Winkler")
+NOTES = (
+    "Reserves 1/2 NPRI",
+    "Subject to prior lease",
+    "Recording date illegible",
+    "See also correction deed",
+    "Undivided 1/4 interest",
+    "Metes and bounds attached as Exhibit A",
+    "Life estate reserved",
+    "Paid-up lease, 3 yr primary term",
+)
+
+RECORD_SPAN_DAYS = 100 * 365
+
+_instrument_names = [name for name, _ in INSTRUMENTS]
+_instrument_weights = [w for _, w in INSTRUMENTS]
+
+
+def _person(rng: random.Random) -> str:
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    roll = rng.random()
+    if roll < 0.12:
+        return f"{name} and wife, {rng.choice(FIRST_NAMES)} {name.split()[-1]}"
+    if roll < 0.18:
+        return f"Estate of {name}"
+    if roll < 0.22:
+        return f"{name}, Trustee"
+    return name
+
+
+def _company(rng: random.Random) -> str:
+    return f"{rng.choice(COMPANY_STEMS)} {rng.choice(COMPANY_KINDS)}"
+
+
+def _party(rng: random.Random) -> str:
+    return _company(rng) if rng.random() < 0.25 else _person(rng)
+
+
+def _legal(rng: random.Random, tract: tuple) -> str:
+    section, block, survey, abstract, county = tract
+    part = rng.choice(("All of", "N/2 of", "S/2 of", "NE/4 of", "SW/4 of", "W/2 of", "E/2 of NW/4 of"))
+    return (
+        f"{part} Section {section}, Block {block}, {survey} Survey, A-{abstract}, "
+        f"{county} County, Texas"
+    )
+
+
+def _tract(rng: random.Random) -> tuple:
+    return (
+        rng.randint(1, 48),
+        rng.randint(1, 80),
+        rng.choice(SURVEYS),
+        rng.randint(100, 9999),
+        rng.choice(COUNTIES),
+    )
+
+
+def generate_rows(n: int, seed: int = 0, start_order: int = 10) -> Iterator[dict]:
+    """Yield `n` run sheet rows (RunSheetRowCreate fields), row_order 10, 20, 30..."""
+    rng = random.Random(seed)
+    tracts = [_tract(rng) for _ in range(max(1, n // 2000))]
+    start = date(1880, 1, 1) + timedelta(days=rng.randint(0, 3650))
+    elapsed = 0.0
+    # Most instruments convey from whoever holds title now
+    holders = [_party(rng) for _ in range(4)]
+
+    for i in range(n):
+        instrument = rng.choices(_instrument_names, _instrument_weights)[0]
+        if instrument == "Patent":
+            grantor = "State of Texas"
+        elif rng.random() < 0.8:
+            grantor = rng.choice(holders)
+        else:
+            grantor = _party(rng)
+        grantee = _company(rng) if instrument in ("Oil and Gas Lease", "Assignment") else _party(rng)
+        if instrument not in ("Oil and Gas Lease", "Release", "Right of Way"):
+            holders[rng.randrange(len(holders))] = grantee
+
+        # ~100 years of records across the run sheet, unevenly spaced
+        elapsed += rng.random() * 2 * RECORD_SPAN_DAYS / n
+        day = start + timedelta(days=int(elapsed))
+        exec_date = day if rng.random() < 0.9 else None
+        filed_date = day + timedelta(days=rng.randint(0, 120)) if rng.random() < 0.95 else None
+
+        has_ref = rng.random() < 0.92
+        yield {
+            "row_order": start_order + i * 10,
+            "instrument": instrument,
+            "volume": str(rng.randint(1, 2400)) if has_ref else None,
+            "page": str(rng.randint(1, 999)) if has_ref else None,
+            "grantor": grantor,
+            "grantee": grantee,
+            "exec_date": exec_date,
+            "filed_date": filed_date,
+            "legal_description": _legal(rng, rng.choice(tracts)) if rng.random() < 0.85 else None,
+            "notes": rng.choice(NOTES) if rng.random() < 0.15 else None,
+        }
+
+
+def to_tsv(rows) -> str:
+    """Rows as the tab-separated text the paste box expects (no row_order column)."""
+    lines = []
+    for r in rows:
+        vol_pg = f"{r['volume']}/{r['page']}" if r["volume"] else ""
+        lines.append("\t".join((
+            r["instrument"],
+            vol_pg,
+            r["grantor"],
+            r["grantee"],
+            r["exec_date"].strftime("%m/%d/%Y") if r["exec_date"] else "",
+            r["filed_date"].isoformat() if r["filed_date"] else "",
+            r["legal_description"] or "",
+            r["notes"] or "",
+        )))
+    return "\n".join(lines)
+
+
+def to_json(rows) -> list[dict]:
+    """Rows with dates as ISO strings, ready for POST /projects/{id}/rows/bulk."""
+    return [
+        {k: (v.isoformat() if isinstance(v, date) else v) for k, v in r.items()}
+        for r in rows
+    ]
+
+
+# -----------------------------
+# Seeding
+# -----------------------------
+ACTOR_USER_ID = "11111111-1111-1111-1111-111111111111"
+SEED_BATCH_SIZE = 10_000
+
+
+def ensure_schema() -> None:
+    """Create tables on SQLite stand-ins and make sure the seed actor exists."""
+    from app import models
+    from app.db import SessionLocal, engine
+
+    if engine.dialect.name == "sqlite":
+        models.Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        if db.get(models.User, ACTOR_USER_ID) is None:
+            db.add(models.User(
+                id=ACTOR_USER_ID, email="boss@local", name="Boss", global_role="admin", password_hash="dev"
+            ))
+            db.commit()
+    finally:
+        db.close()
+
+
+def seed_project(n: int, seed: int = 0, name: str | None = None) -> str:
+    """Create a project holding `n` generated rows; returns its id."""
+    from app import models
+    from app.bulk import insert_rows
+    from app.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        project = models.Project(name=name or f"Bench {n} rows (seed {seed})", created_by=ACTOR_USER_ID)
+        db.add(project)
+        db.commit()
+        project_id = project.id
+
+        batch: list[dict] = []
+        for row in generate_rows(n, seed=seed):
+            batch.append(row)
+            if len(batch) == SEED_BATCH_SIZE:
+                insert_rows(db, project_id, batch, ACTOR_USER_ID)
+                batch = []
+        if batch:
+            insert_rows(db, project_id, batch, ACTOR_USER_ID)
+        return project_id
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="rows per project")
+    parser.add_argument("--projects", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    ensure_schema()
+    for i in range(args.projects):
+        project_id = seed_project(args.rows, seed=args.seed + i)
+        print(project_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Benchmark the main read and write paths and write the timings as JSON.
+
+Runs the app in-process (FastAPI TestClient) against DATABASE_URL, seeding
+one project per size with bench/datagen.py. Use the MySQL from
+docker-compose.yml, or leave DATABASE_URL unset for a SQLite stand-in at
+bench/bench.sqlite:
+
+    docker compose up -d db
+    DATABASE_URL=mysql+mysqlconnector://root@127.0.0.1:3306/landman_mvp \\
+        python bench/suite.py --sizes 10,10000,500000 --json bench-$(git rev-parse --short HEAD).json
+
+    python bench/suite.py --sizes 1000,100000 --baseline bench-main.json
+
+Benchmarks, per size:
+  list_rows            GET /projects/{id}/rows, first page
+  list_rows_deep       GET /projects/{id}/rows, a page from the middle (keyset cursor)
+  list_rows_fields     GET /projects/{id}/rows?fields=... (grid columns, no legal/notes text)
+  list_rows_304        GET /projects/{id}/rows with a current If-None-Match
+  project_detail       GET /ui/projects/{id} (first window rendered)
+  bulk_create_rows     POST /projects/{id}/rows/bulk, --batch rows per call
+  paste_parse          RowParser over --batch pasted lines (no database)
+  paste_rows           POST /ui/projects/{id}/rows/paste, --batch lines per call
+  soft_delete          DELETE /rows/{id}
+
+Writes go to a separate scratch project per size so the measured projects
+keep their size. The response cache is off unless --response-cache is given,
+so reads measure the real query and render path. Needs httpx (pip install httpx).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Slower than baseline by more than this is flagged in --baseline output
+REGRESSION_THRESHOLD = 0.10
+
+
+def _git(*args: str) -> str | None:
+    try:
+        return subprocess.check_output(["git", *args], cwd=ROOT, stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(name: str, size: int, samples: list[float], **extra) -> dict:
+    samples = sorted(samples)
+    ms = [s * 1000 for s in samples]
+    return {
+        "name": name,
+        "size": size,
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[max(0, int(len(ms) * 0.95) - 1)], 3),
+        "min_ms": round(ms[0], 3),
+        "max_ms": round(ms[-1], 3),
+        **extra,
+    }
+
+
+def timed(fn, repeat: int, warmup: int = 1) -> list[float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def _check(resp, *ok: int):
+    if resp.status_code not in (ok or (200,)):
+        raise RuntimeError(f"{resp.request.method} {resp.request.url} -> {resp.status_code}: {resp.text[:300]}")
+    return resp
+
+
+def _find_or_seed(size: int, seed: int, reuse: bool) -> str:
+    from app import models
+    from app.db import SessionLocal
+    from bench.datagen import seed_project
+
+    name = f"Bench {size} rows (seed {seed})"
+    if reuse:
+        db = SessionLocal()
+        try:
+            p = db.query(models.Project).filter(models.Project.name == name).first()
+            if p is not None:
+                return p.id
+        finally:
+            db.close()
+    return seed_project(size, seed=seed, name=name)
+
+
+def run_size(client, size: int, args) -> list[dict]:
+    from app.importer import RowParser
+    from app.ordering import row_order_key
+    from bench.datagen import generate_rows, to_json, to_tsv
+
+    results = []
+    t0 = time.perf_counter()
+    project_id = _find_or_seed(size, args.seed, args.reuse)
+    print(f"[{size}] project {project_id} ready in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    # Reads
+    rows_url = f"/projects/{project_id}/rows"
+    page = {"limit": args.page_size}
+    results.append(summarize(
+        "list_rows", size, timed(lambda: _check(client.get(rows_url, params=page)), args.repeat),
+        page_size=args.page_size,
+    ))
+
+    middle = {"limit": args.page_size, "after": row_order_key((size // 2) * 10)}
+    results.append(summarize(
+        "list_rows_deep", size, timed(lambda: _check(client.get(rows_url, params=middle)), args.repeat),
+        page_size=args.page_size,
+    ))
+
+    grid = {"limit": args.page_size, "fields": "id,row_order,instrument,volume,page,grantor,grantee,filed_date"}
+    results.append(summarize(
+        "list_rows_fields", size, timed(lambda: _check(client.get(rows_url, params=grid)), args.repeat),
+        page_size=args.page_size,
+    ))
+
+    etag = _check(client.get(rows_url, params=page)).headers["etag"]
+    results.append(summarize(
+        "list_rows_304", size,
+        timed(lambda: _check(client.get(rows_url, params=page, headers={"If-None-Match": etag}), 304), args.repeat),
+    ))
+
+    detail_url = f"/ui/projects/{project_id}"
+    results.append(summarize(
+        "project_detail", size, timed(lambda: _check(client.get(detail_url)), args.repeat),
+    ))
+
+    # Writes, into a scratch project
+    scratch = _check(client.post("/projects", json={"name": f"Bench scratch ({size})"})).json()["id"]
+    batches = iter(range(1, 1_000_000))
+
+    def bulk():
+        start = next(batches) * args.batch * 10
+        payload = to_json(generate_rows(args.batch, seed=args.seed, start_order=start))
+        _check(client.post(f"/projects/{scratch}/rows/bulk", json={"rows": payload}))
+
+    results.append(summarize("bulk_create_rows", size, timed(bulk, args.repeat), batch=args.batch))
+
+    tsv = to_tsv(generate_rows(args.batch, seed=args.seed))
+    lines = tsv.splitlines()
+
+    def parse():
+        parser = RowParser()
+        for ln in lines:
+            parser.parse(ln.split("\t"))
+
+    results.append(summarize("paste_parse", size, timed(parse, args.repeat), batch=args.batch))
+
+    def paste():
+        _check(client.post(f"/ui/projects/{scratch}/rows/paste", data={"tsv": tsv}, follow_redirects=False), 302)
+
+    results.append(summarize("paste_rows", size, timed(paste, args.repeat), batch=args.batch))
+
+    ids = iter([r["id"] for r in _check(client.get(f"/projects/{scratch}/rows", params={"limit": 5000})).json()])
+    results.append(summarize(
+        "soft_delete", size, timed(lambda: _check(client.delete(f"/rows/{next(ids)}")), args.repeat),
+    ))
+    return results
+
+
+def compare(results: list[dict], baseline_path: str) -> int:
+    """Print current vs baseline p50; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"{'benchmark':<18} {'size':>8} {'base p50':>10} {'now p50':>10} {'change':>8}", file=sys.stderr)
+    for r in results:
+        base = baseline.get((r["name"], r["size"]))
+        if base is None:
+            print(f"{r['name']:<18} {r['size']:>8} {'-':>10} {r['p50_ms']:>10.2f} {'new':>8}", file=sys.stderr)
+            continue
+        change = (r["p50_ms"] - base["p50_ms"]) / base["p50_ms"] if base["p50_ms"] else 0.0
+        flag = ""
+        if change > REGRESSION_THRESHOLD:
+            flag = "  SLOWER"
+            regressions += 1
+        print(f"{r['name']:<18} {r['size']:>8} {base['p50_ms']:>10.2f} {r['p50_ms']:>10.2f} {change:>+7.1%}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10, 1000, 10000],
+                        help="rows per seeded project, comma separated (10 to 500000)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per benchmark")
+    parser.add_argument("--batch", type=int, default=500, help="rows per bulk/paste call")
+    parser.add_argument("--page-size", type=int, default=500, help="limit for list_rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reuse", action="store_true", help="reuse previously seeded projects of the same size")
+    parser.add_argument("--response-cache", action="store_true", help="leave the in-process response cache on")
+    parser.add_argument("--json", help="write results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="compare against an earlier --json file; exit 1 on regressions")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(ROOT, 'bench', 'bench.sqlite')}")
+    if not args.response_cache:
+        os.environ["RESPONSE_CACHE_MB"] = "0"
+    # Requests run as the seed admin; actor/access caches stay on as in production
+    os.environ.setdefault("AUTH_REQUIRED", "0")
+    # Templates are loaded relative to the repo root
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    from fastapi.testclient import TestClient
+    from app.db import engine
+    from app.main import app
+    from bench.datagen import ensure_schema
+
+    ensure_schema()
+    client = TestClient(app)
+
+    results = []
+    for size in args.sizes:
+        results += run_size(client, size, args)
+
+    report = {
+        "meta": {
+            "commit": _git("rev-parse", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        sys.exit(1 if compare(results, args.baseline) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,28 +9,74 @@ create table if not exists users (
   updated_at timestamp not null default current_timestamp on update current_timestamp
 ) engine=InnoDB;
 
+-- Login sessions / API tokens (app/auth.py); only a SHA-256 of the token is kept
+create table if not exists auth_sessions (
+  token_hash char(64) character set ascii primary key,
+  user_id char(36) not null,
+  created_at timestamp not null default current_timestamp,
+  expires_at timestamp not null,
+  constraint fk_auth_sessions_user foreign key (user_id) references users(id) on delete cascade
+) engine=InnoDB;
+
+create index auth_sessions_user_idx on auth_sessions(user_id);
+
 create table if not exists projects (
   id char(36) primary key,
   name varchar(255) not null,
   client_name varchar(255),
   jurisdiction varchar(255),
   status enum('draft','in_review','delivered','archived') not null default 'draft',
+  -- Bumped on every write to the project or its rows; see app/httpcache.py
+  -- (existing databases: alter table projects add column version bigint not null default 0 after status;)
+  version bigint not null default 0,
+  -- Live-row summary maintained by app/changes.py; backfill for existing databases below
+  row_count int not null default 0,
+  min_filed_date date,
+  max_filed_date date,
+  last_edited_at timestamp null,
+  last_edited_by char(36),
   created_by char(36) not null,
   created_at timestamp not null default current_timestamp,
   updated_at timestamp not null default current_timestamp on update current_timestamp,
-  constraint fk_projects_created_by foreign key (created_by) references users(id)
+  constraint fk_projects_created_by foreign key (created_by) references users(id),
+  constraint fk_projects_last_edited_by foreign key (last_edited_by) references users(id)
 ) engine=InnoDB;
 
 create index projects_created_by_idx on projects(created_by);
 create index projects_status_idx on projects(status);
+-- Project list order (list_projects, projects page)
+create index projects_updated_idx on projects(updated_at);
+
+-- Who may see (viewer) or change (editor, owner) a project; admins see everything
+create table if not exists project_members (
+  project_id char(36) not null,
+  user_id char(36) not null,
+  role enum('viewer','editor','owner') not null default 'editor',
+  created_at timestamp not null default current_timestamp,
+  primary key (project_id, user_id),
+  constraint fk_members_project foreign key (project_id) references projects(id) on delete cascade,
+  constraint fk_members_user foreign key (user_id) references users(id) on delete cascade
+) engine=InnoDB;
+
+-- A user's projects (project list, search)
+create index project_members_user_idx on project_members(user_id);
+
+-- Existing databases: make each project's creator its owner
+--   insert ignore into project_members (project_id, user_id, role)
+--   select id, created_by, 'owner' from projects;
 
 create table if not exists run_sheet_rows (
   id char(36) primary key,
   project_id char(36) not null,
   row_order int not null,
+  -- Run sheet position (app/ordering.py); lpad(row_order, 10, '0') unless the row was moved
+  sort_key varchar(255) character set ascii collate ascii_bin not null,
   instrument varchar(255) not null,
+  -- Recording reference (app/recording.py): book type (OPR, DR...), volume/page, instrument number
+  book_type varchar(20),
   volume varchar(50),
   page varchar(50),
+  instrument_number varchar(50),
   grantor varchar(255) not null,
   grantee varchar(255) not null,
   exec_date date,
@@ -41,16 +87,296 @@ create table if not exists run_sheet_rows (
   updated_by char(36) not null,
   created_at timestamp not null default current_timestamp,
   updated_at timestamp not null default current_timestamp on update current_timestamp,
+  -- Optimistic concurrency (PATCH /projects/{id}/rows)
+  -- (existing databases: alter table run_sheet_rows add column version int not null default 1 after updated_at;)
+  version int not null default 1,
   is_deleted boolean not null default false,
   deleted_by char(36),
   deleted_at timestamp null,
+  -- 1 while live, NULL once deleted: deleted rows drop out of the unique keys below,
+  -- so deleting a row frees its row_order / sort_key slot
+  is_live tinyint generated always as (if(is_deleted, null, 1)) virtual,
+  -- Duplicate detection block: sha1 of normalized volume|page|instrument|filed date (app/duplicates.py)
+  dup_key char(40) character set ascii,
+  -- volume / page / instrument_number normalized for lookups ('Vol. 0123' -> '123')
+  volume_key varchar(50),
+  page_key varchar(50),
+  instrument_key varchar(50),
   constraint fk_rows_project foreign key (project_id) references projects(id) on delete cascade,
   constraint fk_rows_created_by foreign key (created_by) references users(id),
   constraint fk_rows_updated_by foreign key (updated_by) references users(id),
   constraint fk_rows_deleted_by foreign key (deleted_by) references users(id),
-  unique key uq_project_row_order (project_id, row_order)
+  unique key uq_project_row_order (project_id, row_order, is_live),
+  unique key uq_project_sort_key (project_id, sort_key, is_live)
+) engine=InnoDB;
+
+-- Existing databases:
+--   alter table run_sheet_rows add column sort_key varchar(255) character set ascii collate ascii_bin null after row_order;
+--   update run_sheet_rows set sort_key = lpad(row_order, 10, '0');
+--   alter table run_sheet_rows modify sort_key varchar(255) character set ascii collate ascii_bin not null,
+--     add unique key uq_project_sort_key (project_id, sort_key);
+
+-- Reads filter on is_deleted = false: live rows in sort_key order (row list,
+-- export, chain) and the live filed-date range (project summary). Lookups by
+-- project / row_order use the unique keys above.
+create index rows_project_live_idx on run_sheet_rows(project_id, is_deleted, sort_key);
+create index rows_project_live_filed_idx on run_sheet_rows(project_id, is_deleted, filed_date);
+-- Purge job (app/purge.py)
+create index rows_deleted_at_idx on run_sheet_rows(is_deleted, deleted_at);
+-- Duplicate candidates within a project, and across projects
+create index rows_project_dup_idx on run_sheet_rows(project_id, is_deleted, dup_key);
+create index rows_dup_key_idx on run_sheet_rows(dup_key);
+-- Recording reference lookup across projects (POST /recording-refs/lookup)
+create index rows_recording_ref_idx on run_sheet_rows(volume_key, page_key, book_type);
+create index rows_instrument_key_idx on run_sheet_rows(instrument_key);
+
+-- Existing databases:
+--   alter table run_sheet_rows
+--     add column is_live tinyint generated always as (if(is_deleted, null, 1)) virtual after deleted_at,
+--     drop index uq_project_row_order, add unique key uq_project_row_order (project_id, row_order, is_live),
+--     drop index uq_project_sort_key, add unique key uq_project_sort_key (project_id, sort_key, is_live),
+--     drop index rows_project_idx, drop index rows_project_order_idx, drop index rows_project_filed_idx,
+--     add index rows_project_live_idx (project_id, is_deleted, sort_key),
+--     add index rows_project_live_filed_idx (project_id, is_deleted, filed_date),
+--     add index rows_deleted_at_idx (is_deleted, deleted_at),
+--     algorithm=inplace, lock=none;
+--   -- Rows deleted before deleted_at was set
+--   update run_sheet_rows set deleted_at = updated_at where is_deleted and deleted_at is null;
+
+-- Existing databases (dup_key):
+--   alter table run_sheet_rows add column dup_key char(40) character set ascii after is_live,
+--     add index rows_project_dup_idx (project_id, is_deleted, dup_key),
+--     add index rows_dup_key_idx (dup_key), algorithm=inplace, lock=none;
+--   alter table run_sheet_rows_archive add column dup_key char(40) character set ascii after deleted_at;
+--   then fill it in batches: python -m app.duplicates backfill
+
+-- Existing databases (recording references):
+--   alter table run_sheet_rows
+--     add column book_type varchar(20) after instrument,
+--     add column instrument_number varchar(50) after page,
+--     add column volume_key varchar(50) after dup_key,
+--     add column page_key varchar(50) after volume_key,
+--     add column instrument_key varchar(50) after page_key,
+--     add index rows_recording_ref_idx (volume_key, page_key, book_type),
+--     add index rows_instrument_key_idx (instrument_key), algorithm=inplace, lock=none;
+--   alter table run_sheet_rows_archive
+--     add column book_type varchar(20) after instrument,
+--     add column instrument_number varchar(50) after page,
+--     add column volume_key varchar(50) after dup_key,
+--     add column page_key varchar(50) after volume_key,
+--     add column instrument_key varchar(50) after page_key;
+--   then fill the keys in batches: python -m app.recording backfill
+
+-- Backfill / repair of the project summary columns:
+--   update projects p
+--   left join (
+--     select project_id, count(*) n, min(filed_date) lo, max(filed_date) hi
+--     from run_sheet_rows where is_deleted = false group by project_id
+--   ) s on s.project_id = p.id
+--   left join (
+--     select r.project_id, r.updated_at, r.updated_by
+--     from run_sheet_rows r
+--     join (select project_id, max(updated_at) m from run_sheet_rows group by project_id) x
+--       on x.project_id = r.project_id and x.m = r.updated_at
+--   ) e on e.project_id = p.id
+--   set p.row_count = coalesce(s.n, 0), p.min_filed_date = s.lo, p.max_filed_date = s.hi,
+--       p.last_edited_at = e.updated_at, p.last_edited_by = e.updated_by;
+
+-- Canonical grantor/grantee parties (app/parties.py). normalized is binary-
+-- collated so accented and unaccented spellings stay distinct keys.
+create table if not exists parties (
+  id char(36) primary key,
+  name varchar(255) not null,
+  normalized varchar(255) character set utf8mb4 collate utf8mb4_bin not null,
+  created_at timestamp not null default current_timestamp,
+  unique key uq_parties_normalized (normalized)
+) engine=InnoDB;
+
+-- Trigram index over parties.normalized (fuzzy party lookup)
+create table if not exists party_trigrams (
+  trigram char(3) character set utf8mb4 collate utf8mb4_bin not null,
+  party_id char(36) not null,
+  primary key (trigram, party_id),
+  constraint fk_party_trigrams_party foreign key (party_id) references parties(id) on delete cascade
+) engine=InnoDB;
+
+-- Which parties each row names, and as what
+create table if not exists row_parties (
+  row_id char(36) not null,
+  role enum('grantor','grantee') not null,
+  position int not null,
+  party_id char(36) not null,
+  primary key (row_id, role, position),
+  constraint fk_row_parties_row foreign key (row_id) references run_sheet_rows(id) on delete cascade,
+  constraint fk_row_parties_party foreign key (party_id) references parties(id)
+) engine=InnoDB;
+
+-- A party's instruments across projects
+create index row_parties_party_idx on row_parties(party_id, row_id);
+
+-- Existing databases: link rows written before these tables, in batches:
+--   python -m app.parties backfill
+
+-- Tract keys parsed from legal_description (app/tracts.py), one row per tract.
+-- Values are normalized: section '12', abstract '123', township '4N', survey 'HTC RR CO'.
+create table if not exists row_tracts (
+  row_id char(36) not null,
+  position int not null,
+  survey varchar(100),
+  abstract varchar(20),
+  section varchar(20),
+  township varchar(10),
+  rge varchar(10),
+  block varchar(20),
+  lot varchar(20),
+  acres decimal(12,4),
+  primary key (row_id, position),
+  constraint fk_row_tracts_row foreign key (row_id) references run_sheet_rows(id) on delete cascade
+) engine=InnoDB;
+
+-- Tract lookups (GET /tracts/rows): Texas abstract/section/block, section/block,
+-- block/lot subdivisions, PLSS township/range/section, survey name
+create index row_tracts_abstract_idx on row_tracts(abstract, section, block);
+create index row_tracts_section_idx on row_tracts(section, block);
+create index row_tracts_block_idx on row_tracts(block, lot);
+create index row_tracts_plss_idx on row_tracts(township, rge, section);
+create index row_tracts_survey_idx on row_tracts(survey, section);
+
+-- Existing databases: index rows written before this table, in batches:
+--   python -m app.tracts backfill
+
+-- Rows deleted more than ROW_PURGE_AFTER_DAYS ago, moved here in batches by
+-- app/purge.py. No unique keys and no FKs besides the project: archived rows
+-- are kept for the record, not restored.
+create table if not exists run_sheet_rows_archive (
+  id char(36) primary key,
+  project_id char(36) not null,
+  row_order int not null,
+  sort_key varchar(255) character set ascii collate ascii_bin not null,
+  instrument varchar(255) not null,
+  book_type varchar(20),
+  volume varchar(50),
+  page varchar(50),
+  instrument_number varchar(50),
+  grantor varchar(255) not null,
+  grantee varchar(255) not null,
+  exec_date date,
+  filed_date date,
+  legal_description text,
+  notes text,
+  created_by char(36) not null,
+  updated_by char(36) not null,
+  created_at timestamp not null,
+  updated_at timestamp not null,
+  version int not null,
+  is_deleted boolean not null,
+  deleted_by char(36),
+  deleted_at timestamp null,
+  dup_key char(40) character set ascii,
+  volume_key varchar(50),
+  page_key varchar(50),
+  instrument_key varchar(50),
+  archived_at timestamp not null default current_timestamp,
+  constraint fk_rows_archive_project foreign key (project_id) references projects(id) on delete cascade
+) engine=InnoDB;
+
+create index rows_archive_project_idx on run_sheet_rows_archive(project_id);
+
+-- Party / legal description search (app/search.py)
+create fulltext index rows_fulltext_idx on run_sheet_rows(grantor, grantee, legal_description, notes);
+
+-- Document scans, stored once per content hash under SCAN_STORE_DIR (app/scans.py)
+create table if not exists scans (
+  sha256 char(64) character set ascii primary key,
+  size_bytes bigint not null,
+  content_type varchar(100) not null,
+  filename varchar(255) not null,
+  page_count int,
+  thumb_status enum('pending','done','failed','unsupported') not null default 'pending',
+  created_by char(36) not null,
+  created_at timestamp not null default current_timestamp,
+  constraint fk_scans_created_by foreign key (created_by) references users(id)
+) engine=InnoDB;
+
+-- Which rows cite which scans (many-to-many)
+create table if not exists row_scans (
+  row_id char(36) not null,
+  scan_sha256 char(64) character set ascii not null,
+  label varchar(255) not null,
+  created_by char(36) not null,
+  created_at timestamp not null default current_timestamp,
+  primary key (row_id, scan_sha256),
+  constraint fk_row_scans_row foreign key (row_id) references run_sheet_rows(id) on delete cascade,
+  constraint fk_row_scans_scan foreign key (scan_sha256) references scans(sha256),
+  constraint fk_row_scans_created_by foreign key (created_by) references users(id)
+) engine=InnoDB;
+
+-- Rows citing a scan (access checks on GET /scans/{sha256})
+create index row_scans_scan_idx on row_scans(scan_sha256);
+
+-- Append-only run sheet history (app/history.py). Entries are written in the
+-- same transaction as the row write; row_id has no FK so the log outlives
+-- purged rows.
+create table if not exists row_history (
+  id bigint auto_increment primary key,
+  project_id char(36) not null,
+  row_id char(36) not null,
+  op enum('insert','update','delete','restore') not null,
+  changed_at timestamp(6) not null,
+  changed_by char(36),
+  changes json not null,
+  constraint fk_row_history_project foreign key (project_id) references projects(id) on delete cascade,
+  constraint fk_row_history_changed_by foreign key (changed_by) references users(id)
+) engine=InnoDB;
+
+-- Replay of a project from a snapshot onward; one row's history
+create index row_history_project_idx on row_history(project_id, id);
+create index row_history_row_idx on row_history(row_id, id);
+
+-- Existing databases: history starts at migration. Give current rows a
+-- baseline entry so they show up in reconstructions:
+--   insert into row_history (project_id, row_id, op, changed_at, changed_by, changes)
+--   select project_id, id, 'insert', updated_at, updated_by,
+--     json_object('project_id', project_id, 'row_order', row_order, 'sort_key', sort_key,
+--       'instrument', instrument, 'book_type', book_type, 'volume', volume, 'page', page,
+--       'instrument_number', instrument_number,
+--       'grantor', grantor, 'grantee', grantee, 'exec_date', exec_date, 'filed_date', filed_date,
+--       'legal_description', legal_description, 'notes', notes,
+--       'created_by', created_by, 'updated_by', updated_by, 'created_at', created_at,
+--       'is_deleted', is_deleted, 'deleted_by', deleted_by, 'deleted_at', deleted_at)
+--   from run_sheet_rows order by project_id, sort_key;
+
+-- Whole run sheet as of entry through_id, built from the log every
+-- HISTORY_SNAPSHOT_EVERY entries; stored as zlib-compressed JSON chunks
+create table if not exists history_snapshots (
+  id bigint auto_increment primary key,
+  project_id char(36) not null,
+  through_id bigint not null,
+  through_at timestamp(6) not null,
+  row_count int not null,
+  created_at timestamp not null default current_timestamp,
+  constraint fk_history_snapshots_project foreign key (project_id) references projects(id) on delete cascade
+) engine=InnoDB;
+
+create index history_snapshots_project_idx on history_snapshots(project_id, through_id);
+
+create table if not exists history_snapshot_chunks (
+  snapshot_id bigint not null,
+  chunk int not null,
+  data longblob not null,
+  primary key (snapshot_id, chunk),
+  constraint fk_history_snapshot_chunks_snapshot foreign key (snapshot_id) references history_snapshots(id) on delete cascade
+) engine=InnoDB;
+
+-- When a project moved to each status (GET /projects/{id}/rows/as-of?status=)
+create table if not exists project_status_changes (
+  id bigint auto_increment primary key,
+  project_id char(36) not null,
+  status enum('draft','in_review','delivered','archived') not null,
+  changed_at timestamp(6) not null,
+  changed_by char(36) not null,
+  constraint fk_project_status_changes_project foreign key (project_id) references projects(id) on delete cascade,
+  constraint fk_project_status_changes_changed_by foreign key (changed_by) references users(id)
 ) engine=InnoDB;
 
-create index rows_project_idx on run_sheet_rows(project_id);
-create index rows_project_order_idx on run_sheet_rows(project_id, row_order);
-create index rows_project_filed_idx on run_sheet_rows(project_id, filed_date);
+create index project_status_changes_idx on project_status_changes(project_id, status, changed_at);
@@ -1,3 +1,5 @@
+-- Local admin; log in as boss@local / dev and change it (python -m app.auth set-password boss@local)
 insert into users (id, email, name, global_role, password_hash)
-values ('11111111-1111-1111-1111-111111111111', 'boss@local', 'Boss', 'admin', 'dev')
+values ('11111111-1111-1111-1111-111111111111', 'boss@local', 'Boss', 'admin',
+        'pbkdf2_sha256$260000$jxBCyZtka6h9tv5pV61dnQ==$sLpAinUDV38wCxmY2QshRDD1xuI8GKh/eakqOYZVgpk=')
 on duplicate key update email = values(email);